@@ -0,0 +1,37 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.services.activity_rollup import ALL_KEY, MINUTE, activity_rollups, minute_of
+
+router = APIRouter()
+
+
+@router.get("/activity")
+async def get_activity(
+    ip: str | None = None,
+    user: str | None = None,
+    minutes: int = Query(60, ge=1, le=7 * 24 * 60),
+    until: datetime | None = None
+):
+    # Per-minute series for dashboards, read from the activity rollups;
+    # minutes without activity are returned as zeros
+    if ip and user:
+        raise HTTPException(status_code=400, detail="Pass either ip or user, not both")
+    kind, key = ("ip", ip) if ip else ("user", user) if user else ("all", ALL_KEY)
+
+    end = minute_of(until or datetime.now(timezone.utc))
+    start = end - (minutes - 1) * MINUTE
+    buckets = {bucket["minute"]: bucket for bucket in await activity_rollups.buckets(kind, key, start, end)}
+
+    series = []
+    for offset in range(minutes):
+        minute = start + offset * MINUTE
+        bucket = buckets.get(minute, {})
+        point = {"minute": minute, "total": bucket.get("total", 0), "counts": bucket.get("counts", {})}
+        if kind != "all":
+            point["peers"] = len(bucket.get("peers", []))
+            point["peers_capped"] = bucket.get("peers_overflow", False)
+        series.append(point)
+
+    return {"kind": kind, "key": key, "minutes": minutes, "series": series}
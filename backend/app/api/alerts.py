@@ -1,22 +1,38 @@
-from fastapi import APIRouter, Query
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Query, Response
+from app.api.pagination import NEXT_CURSOR_HEADER, build_query, fetch_page, parse_fields, stream_export
 from app.core.database import alerts_collection
 
 router = APIRouter()
 
+CSV_COLUMNS = ["timestamp", "alert_type", "severity", "ip_address", "username", "risk_score", "description"]
+
+
 @router.get("/alerts")
 async def get_alerts(
+    response: Response,
     severity: str | None = None,
-    limit: int = Query(50, le=200)
+    since: datetime | None = None,
+    until: datetime | None = None,
+    fields: str | None = None,
+    cursor: str | None = None,
+    format: Literal["json", "ndjson", "csv"] = "json",
+    limit: int = Query(50, ge=1, le=200)
 ):
-    query = {}
+    filters = {}
     if severity:
-        query["severity"] = severity
+        filters["severity"] = severity
+
+    query = build_query(filters, since, until, cursor)
+    field_names = parse_fields(fields)
 
-    cursor = alerts_collection.find(query).sort("timestamp", -1).limit(limit)
-    alerts = []
+    if format != "json":
+        return stream_export(alerts_collection, query, field_names, format, CSV_COLUMNS, "alerts")
 
-    async for alert in cursor:
-        alert["_id"] = str(alert["_id"])
-        alerts.append(alert)
+    alerts, next_cursor = await fetch_page(alerts_collection, query, field_names, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
     return alerts
@@ -0,0 +1,70 @@
+import json
+import secrets
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.services import ueba
+from app.services.cluster import TOKEN_HEADER, cluster, decode_event
+from app.services.detection import publish_alerts
+from app.services.feature_store import feature_store
+from app.services.pipeline import detection_pipeline
+from app.ws.alerts import manager
+
+# Node-to-node endpoints for partitioned mode, authenticated by the shared
+# CLUSTER_TOKEN. Mounted without the /api prefix; keep them off the public
+# listener as well.
+router = APIRouter(prefix="/internal/cluster", include_in_schema=False)
+
+
+async def _payload(request: Request) -> dict:
+    if not cluster.enabled:
+        raise HTTPException(status_code=404, detail="Not running in cluster mode")
+    if not cluster.token or not secrets.compare_digest(request.headers.get(TOKEN_HEADER, ""), cluster.token):
+        raise HTTPException(status_code=403, detail="Invalid cluster token")
+    try:
+        return json.loads(await request.body())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid payload: {exc}")
+
+
+@router.post("/capacity")
+async def check_capacity(request: Request):
+    # Asked by the ingesting node before it stores a batch with events owned
+    # here; the hand-off itself is still checked in receive_events
+    events = [{"ip_address": ip} for ip in (await _payload(request)).get("ips", [])]
+    if not detection_pipeline.can_accept(events):
+        detection_pipeline.reject(len(events))
+        raise HTTPException(status_code=503, detail="Detection pipeline is saturated")
+    return {"ok": True}
+
+
+@router.post("/events")
+async def receive_events(request: Request):
+    # Events owned by this node, handed off by the node that ingested them
+    events = [decode_event(event) for event in (await _payload(request)).get("events", [])]
+    if not detection_pipeline.can_accept(events):
+        detection_pipeline.reject(len(events))
+        raise HTTPException(status_code=503, detail="Detection pipeline is saturated")
+    for event in events:
+        detection_pipeline.submit(event)
+    return {"queued": len(events)}
+
+
+@router.post("/fanout")
+async def receive_fanout(request: Request):
+    payload = await _payload(request)
+    alerts = []
+    for record in payload.get("users", []):
+        record = decode_event(record)
+        feature_store.add_user_event(record)
+        if cluster.owns_user(record.get("username")):
+            alert = await ueba.record_user_event(
+                record["username"], record["event_time"], record.get("ip_address"), record.get("event_type")
+            )
+            if alert:
+                alerts.append(alert)
+    # Per-user detections (impossible travel) run on the node owning the user
+    await publish_alerts(alerts)
+    for message in payload.get("broadcast", []):
+        await manager.broadcast(message)
+    return {"users": len(payload.get("users", [])), "broadcast": len(payload.get("broadcast", []))}
@@ -1,133 +1,158 @@
-from datetime import datetime, timedelta, timezone
-from ipaddress import ip_address
-from fastapi import APIRouter, Query, Response
-
-from app.core.database import ueba_incidents_collection, logs_collection
-from app.services.remediation import recommend_actions
-from app.services.threat_intel import lookup_ip
+import hashlib
+from datetime import datetime, timezone
+from typing import Literal
+
+from fastapi import APIRouter, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from bson import ObjectId
+
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.core.config import INCIDENTS_DECAY_STEP_SECONDS
+from app.core.database import ueba_incidents_collection
+from app.services.incident_reports import (
+    EXPORT_BATCH_SIZE,
+    build_report,
+    export_ndjson,
+    export_zip,
+    render_html,
+    render_text,
+)
+from app.services.ueba import decayed_risk
 
 router = APIRouter()
 
+DELTA_SORT = [("updated_at", 1), ("_id", 1)]
+# Sorts after every real id, so a cursor built from `since` alone keeps its
+# strictly-after meaning for incidents updated at exactly that time
+_MAX_OBJECT_ID = ObjectId("f" * 24)
+
+
+def _etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
 
 @router.get("/incidents")
 async def get_incidents(
+    request: Request,
+    response: Response,
+    since: datetime | None = None,
+    cursor: str | None = None,
     limit: int = Query(50, le=200)
 ):
-    cursor = ueba_incidents_collection.find({}).sort("risk_score", -1).limit(limit)
-    incidents = []
+    # Served from the read-model fields maintained by ueba._upsert_incident:
+    # one index probe for the revision, one index walk for the page.
+    latest = await ueba_incidents_collection.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)])
+    revision = latest.get("updated_at") if latest else None
+
+    # Decayed scores are reported as of the current step, so an unchanged
+    # incident set keeps the same ETag until the next step
+    now = datetime.now(timezone.utc)
+    step = INCIDENTS_DECAY_STEP_SECONDS
+    as_of = datetime.fromtimestamp(now.timestamp() // step * step, timezone.utc) if step > 0 else now
+    if since and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    etag = _etag(revision.isoformat() if revision else "-", as_of.isoformat(), limit,
+                 since.isoformat() if since else "", cursor or "")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    delta = since is not None or cursor is not None
+    if cursor:
+        # Delta mode: incidents changed after the (updated_at, _id) of the
+        # last one already seen, oldest change first. Many incidents can
+        # share an updated_at (e.g. after backfill_incident_read_model), so
+        # the time alone cannot mark a position inside a page boundary.
+        updated_at, oid = decode_cursor(cursor)
+        query = {"$or": [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$gt": oid}},
+        ]}
+        rows = ueba_incidents_collection.find(query).sort(DELTA_SORT).limit(limit)
+    elif since:
+        # First delta poll; X-Next-Cursor is the value to pass as cursor=
+        rows = ueba_incidents_collection.find({"updated_at": {"$gt": since}}).sort(DELTA_SORT).limit(limit)
+    else:
+        rows = ueba_incidents_collection.find({}).sort("decay_anchor", -1).limit(limit)
 
-    async for inc in cursor:
+    incidents = []
+    async for inc in rows:
         inc["_id"] = str(inc["_id"])
-
-        last_seen = inc.get("last_seen") or inc.get("timestamp")
-        if last_seen and last_seen.tzinfo is None:
-            last_seen = last_seen.replace(tzinfo=timezone.utc)
-        if last_seen:
-            minutes = (datetime.now(timezone.utc) - last_seen).total_seconds() / 60.0
-            decayed = max(1.0, inc.get("risk_score", 5) - (minutes / 10.0))
-            inc["risk_score_decayed"] = round(decayed, 2)
-
+        decayed = decayed_risk(inc, as_of)
+        if decayed is not None:
+            inc["risk_score_decayed"] = decayed
         incidents.append(inc)
 
+    if delta:
+        if incidents:
+            next_cursor = encode_cursor(incidents[-1], "updated_at")
+        else:
+            next_cursor = cursor or encode_cursor({"updated_at": since, "_id": _MAX_OBJECT_ID}, "updated_at")
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
     return incidents
 
 
+@router.get("/incidents/export")
+async def export_incidents(
+    format: Literal["zip", "ndjson"] = "zip",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    severity: str | None = None,
+    stage: str | None = None
+):
+    # Filters apply to last_seen; reports are streamed as the cursor yields
+    query = {}
+    if since or until:
+        query["last_seen"] = {}
+        if since:
+            query["last_seen"]["$gte"] = since if since.tzinfo else since.replace(tzinfo=timezone.utc)
+        if until:
+            query["last_seen"]["$lt"] = until if until.tzinfo else until.replace(tzinfo=timezone.utc)
+    if severity:
+        query["severity"] = severity
+    if stage:
+        query["kill_chain_stage"] = stage
+
+    cursor = ueba_incidents_collection.find(query).sort("last_seen", -1).batch_size(EXPORT_BATCH_SIZE)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    if format == "ndjson":
+        return StreamingResponse(
+            export_ndjson(cursor),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename=incidents-{stamp}.ndjson"}
+        )
+
+    manifest = {
+        "generated_at": datetime.now(timezone.utc),
+        "filters": {"since": since, "until": until, "severity": severity, "stage": stage},
+    }
+    return StreamingResponse(
+        export_zip(cursor, manifest),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=incidents-{stamp}.zip"}
+    )
+
+
 @router.get("/incidents/{incident_key}/details")
 async def get_incident_details(incident_key: str):
     incident = await ueba_incidents_collection.find_one({"incident_key": incident_key})
     if not incident:
         return {"error": "Incident not found"}
 
-    incident["_id"] = str(incident["_id"])
-
-    last_seen = incident.get("last_seen") or incident.get("timestamp")
-    if last_seen and last_seen.tzinfo is None:
-        last_seen = last_seen.replace(tzinfo=timezone.utc)
-    if not last_seen:
-        return {"incident": incident, "timeline": [], "graph": {"nodes": [], "edges": []}}
-
-    window_start = last_seen - timedelta(minutes=30)
-    ip = incident.get("ip_address")
-
-    cursor = logs_collection.find(
-        {"ip_address": ip, "event_time": {"$gte": window_start}},
-        {"event_time": 1, "event_type": 1, "username": 1, "ip_address": 1, "message": 1}
-    ).sort("event_time", 1).limit(200)
-
-    timeline = []
-    users = set()
-    counts = {"failed": 0, "invalid": 0, "success": 0, "total": 0}
-
-    async for log in cursor:
-        counts["total"] += 1
-        if log.get("event_type") == "ssh_failed_login":
-            counts["failed"] += 1
-        elif log.get("event_type") == "ssh_invalid_user":
-            counts["invalid"] += 1
-        elif log.get("event_type") == "ssh_success_login":
-            counts["success"] += 1
-
-        if log.get("username"):
-            users.add(log["username"])
-
-        timeline.append({
-            "time": log.get("event_time"),
-            "event_type": log.get("event_type"),
-            "username": log.get("username"),
-            "ip_address": log.get("ip_address"),
-            "message": log.get("message")
-        })
-
-    nodes = [{"id": ip, "type": "ip"}]
-    edges = []
-    for user in sorted(users):
-        nodes.append({"id": user, "type": "user"})
-        edges.append({"from": user, "to": ip, "type": "auth"})
-
-    summary = (
-        f"Window 30m: total={counts['total']}, failed={counts['failed']}, "
-        f"invalid={counts['invalid']}, success={counts['success']}."
-    )
-
-    enrichment = {}
-    if ip:
-        addr = ip_address(ip)
-        enrichment = {
-            "ip": ip,
-            "is_private": addr.is_private,
-            "is_reserved": addr.is_reserved,
-            "is_global": addr.is_global
-        }
-
-    threat_intel = {}
-    if ip and enrichment.get("is_private") is False:
-        threat_intel = await lookup_ip(ip)
-
-    recommendations = recommend_actions(
-        incident.get("incident"),
-        counts,
-        enrichment
-    )
-
-    return {
-        "incident": incident,
-        "summary": summary,
-        "counts": counts,
-        "timeline": timeline,
-        "graph": {"nodes": nodes, "edges": edges},
-        "enrichment": enrichment,
-        "threat_intel": threat_intel,
-        "recommendations": recommendations,
-        "kill_chain_stage": incident.get("kill_chain_stage"),
-        "kill_chain_all": [
-            "Reconnaissance",
-            "Discovery",
-            "Credential Access",
-            "Lateral Movement",
-            "Exfiltration",
-            "Impact"
-        ]
-    }
+    return await build_report(incident)
 
 
 @router.get("/incidents/{incident_key}/report")
@@ -136,47 +161,16 @@ async def get_incident_report(incident_key: str, format: str = "txt"):
     if not incident:
         return Response("Incident not found", media_type="text/plain", status_code=404)
 
-    last_seen = incident.get("last_seen") or incident.get("timestamp")
-    if last_seen and last_seen.tzinfo is None:
-        last_seen = last_seen.replace(tzinfo=timezone.utc)
-
-    lines = [
-        "SentinelAI Incident Report",
-        f"Incident Key: {incident_key}",
-        f"Incident: {incident.get('incident', '-')}",
-        f"IP: {incident.get('ip_address', '-')}",
-        f"Severity: {incident.get('severity', '-')}",
-        f"Risk Score: {incident.get('risk_score', '-')}",
-        f"Kill Chain: {incident.get('kill_chain_stage', '-')}",
-        f"Last Seen (UTC): {last_seen.isoformat() if last_seen else '-'}",
-        "",
-        "Summary:",
-        incident.get("description", "-")
-    ]
+    # Same content as /details; threat intel only if it is already cached
+    report = await build_report(incident, live_intel=False)
 
     if format == "html":
-        html = f"""<!doctype html>
-<html>
-<head><meta charset="utf-8"><title>SentinelAI Incident Report</title></head>
-<body style="font-family: Arial, sans-serif;">
-<h1>SentinelAI Incident Report</h1>
-<p><strong>Incident Key:</strong> {incident_key}</p>
-<p><strong>Incident:</strong> {incident.get('incident', '-')}</p>
-<p><strong>IP:</strong> {incident.get('ip_address', '-')}</p>
-<p><strong>Severity:</strong> {incident.get('severity', '-')}</p>
-<p><strong>Risk Score:</strong> {incident.get('risk_score', '-')}</p>
-<p><strong>Kill Chain:</strong> {incident.get('kill_chain_stage', '-')}</p>
-<p><strong>Last Seen (UTC):</strong> {last_seen.isoformat() if last_seen else '-'}</p>
-<h3>Summary</h3>
-<p>{incident.get('description', '-')}</p>
-</body>
-</html>"""
         headers = {
             "Content-Disposition": f"attachment; filename=incident-{incident_key}.html"
         }
-        return Response(html, media_type="text/html", headers=headers)
+        return Response(render_html(report), media_type="text/html", headers=headers)
 
     headers = {
         "Content-Disposition": f"attachment; filename=incident-{incident_key}.txt"
     }
-    return Response("\n".join(lines), media_type="text/plain", headers=headers)
+    return Response(render_text(report), media_type="text/plain", headers=headers)
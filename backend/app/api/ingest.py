@@ -1,34 +1,95 @@
-from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException
-from app.services.parser import parse_auth_log
-from app.schemas.log import RawLogRequest
-from app.services.storage import save_log
-from app.services.detection import process_event
-from app.ml.severity import infer_severity
+import json
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import ValidationError
+from app.services.parser import parse_auth_log, source_timezone
+from app.schemas.log import RawLogRequest, BatchLogRequest
+from app.services.ingestion import PipelineSaturated, ingest_event, ingest_lines
 
 router = APIRouter()
 
+MAX_BATCH_LINES = 5000
+
+
+def _saturated() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Detection pipeline is saturated, retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
+
+def _timezone(tz: str | None):
+    # ?tz= overrides LOG_TIMEZONE for stamps without an offset
+    if not tz:
+        return None
+    try:
+        return source_timezone(tz)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def _batch_lines(body: bytes, content_type: str) -> list[str]:
+    text = body.decode("utf-8", errors="replace")
+
+    if "ndjson" in content_type:
+        lines = []
+        for row in text.splitlines():
+            if not row.strip():
+                continue
+            item = json.loads(row)
+            lines.append(item.get("raw_log", "") if isinstance(item, dict) else str(item))
+        return lines
+
+    if "json" in content_type:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return BatchLogRequest(**data).raw_logs
+        if isinstance(data, list):
+            return [
+                item.get("raw_log", "") if isinstance(item, dict) else str(item)
+                for item in data
+            ]
+        raise ValueError("Expected a JSON array or an object with raw_logs")
+
+    # Plain text: one raw log line per line
+    return [row for row in text.splitlines() if row.strip()]
+
+
 @router.post("/ingest")
-async def ingest_log(payload: RawLogRequest):
-    parsed = parse_auth_log(payload.raw_log)
+async def ingest_log(payload: RawLogRequest, tz: str | None = None):
+    parsed = parse_auth_log(payload.raw_log, _timezone(tz))
 
     if not parsed:
         raise HTTPException(status_code=400, detail="Unrecognized log format")
 
-    now = datetime.now(timezone.utc)
-    parsed["event_time"] = parsed.get("event_time") or now
-    parsed["ingested_at"] = now
-    parsed["timestamp"] = now
-    parsed["severity"] = infer_severity(parsed)
-
-    log_id = await save_log(parsed)
-
-    alert = None
-    if parsed.get("ip_address"):
-        alert = await process_event(parsed)
+    try:
+        log_id, detection = await ingest_event(parsed)
+    except PipelineSaturated:
+        raise _saturated()
 
     return {
         "status": "stored",
         "log_id": log_id,
-        "alert": alert
+        "detection": detection
     }
+
+
+@router.post("/ingest/batch")
+async def ingest_batch(request: Request, tz: str | None = None):
+    zone = _timezone(tz)
+    content_type = request.headers.get("content-type", "").lower()
+    try:
+        lines = _batch_lines(await request.body(), content_type)
+    except (ValueError, TypeError, ValidationError) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid batch payload: {exc}")
+
+    if len(lines) > MAX_BATCH_LINES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large (max {MAX_BATCH_LINES} lines)"
+        )
+
+    try:
+        return await ingest_lines(lines, zone)
+    except PipelineSaturated:
+        raise _saturated()
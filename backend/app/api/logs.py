@@ -1,26 +1,44 @@
-from fastapi import APIRouter, Query
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Query, Response
+from app.api.pagination import NEXT_CURSOR_HEADER, build_query, fetch_page, parse_fields, stream_export
 from app.core.database import logs_collection
+from app.services.log_archive import log_archive
 
 router = APIRouter()
 
+CSV_COLUMNS = ["timestamp", "event_time", "source", "event_type", "severity", "ip_address", "username", "message"]
+
+
 @router.get("/logs")
 async def get_logs(
+    response: Response,
     ip: str | None = None,
     user: str | None = None,
-    limit: int = Query(100, le=500)
+    since: datetime | None = None,
+    until: datetime | None = None,
+    fields: str | None = None,
+    cursor: str | None = None,
+    format: Literal["json", "ndjson", "csv"] = "json",
+    limit: int = Query(100, ge=1, le=500)
 ):
-    query = {}
+    filters = {}
 
     if ip:
-        query["ip_address"] = ip
+        filters["ip_address"] = ip
     if user:
-        query["username"] = user
+        filters["username"] = user
+
+    query = build_query(filters, since, until, cursor)
+    field_names = parse_fields(fields)
 
-    cursor = logs_collection.find(query).sort("timestamp", -1).limit(limit)
-    logs = []
+    if format != "json":
+        # Exports stream every matching row; limit only applies to JSON pages
+        return stream_export(logs_collection, query, field_names, format, CSV_COLUMNS, "logs", log_archive)
 
-    async for log in cursor:
-        log["_id"] = str(log["_id"])
-        logs.append(log)
+    logs, next_cursor = await fetch_page(logs_collection, query, field_names, limit, log_archive)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
     return logs
@@ -0,0 +1,70 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import Gauge, render_metrics
+from app.ml.batcher import scoring_batcher
+from app.services.alert_aggregation import alert_aggregator
+from app.services.cluster import cluster
+from app.services.correlation import correlator
+from app.services.feature_store import feature_store
+from app.services.geoip import geoip
+from app.services.ip_reputation import ip_reputation
+from app.services.log_archive import log_archive
+from app.services.pipeline import detection_pipeline
+from app.services.profile_cache import ip_profiles, user_profiles
+from app.services.syslog_listener import syslog_listener
+from app.services.threat_intel import threat_intel
+from app.ws.alerts import manager
+
+router = APIRouter()
+
+# Gauges are read from the live singletons at scrape time, so they cost
+# nothing between scrapes. Only O(1) sizes are read here; /system/stats
+# keeps the heavier memory estimates.
+Gauge(
+    "sentinel_pipeline_queue_depth",
+    "Events waiting in each detection shard",
+    lambda: {(str(i),): shard.queue.qsize() for i, shard in enumerate(detection_pipeline.shards)},
+    ("shard",),
+)
+Gauge("sentinel_websocket_clients", "Connected alert WebSocket clients", lambda: len(manager.clients))
+Gauge("sentinel_correlator_tracked_ips", "IPs with correlation windows", lambda: len(correlator.activity))
+Gauge(
+    "sentinel_feature_store_entries",
+    "Sliding-window entries in the feature store",
+    lambda: {("ip",): len(feature_store.ips), ("user",): len(feature_store.users)},
+    ("kind",),
+)
+Gauge(
+    "sentinel_profile_cache_entries",
+    "Cached UEBA profiles",
+    lambda: {("ip",): len(ip_profiles.entries), ("user",): len(user_profiles.entries)},
+    ("kind",),
+)
+Gauge("sentinel_alert_aggregates_open", "Alert aggregates tracked in memory", lambda: len(alert_aggregator.entries))
+Gauge(
+    "sentinel_cluster_fanout_pending",
+    "Broadcasts and user-window updates waiting for each peer node",
+    lambda: {(str(index),): peer.pending() for index, peer in cluster.peers.items()},
+    ("peer",),
+)
+Gauge(
+    "sentinel_log_archive_rows",
+    "Logs held in committed cold-tier segments",
+    lambda: log_archive.stats()["rows"],
+)
+Gauge(
+    "sentinel_ip_reputation_ranges",
+    "Address ranges in the local reputation index",
+    lambda: {("4",): len(ip_reputation.snapshot.v4), ("6",): len(ip_reputation.snapshot.v6)},
+    ("version",),
+)
+Gauge("sentinel_geoip_cache_entries", "Cached GeoIP / ASN lookups", lambda: len(geoip.cache))
+Gauge("sentinel_threat_intel_cache_entries", "Cached threat-intel lookups", lambda: len(threat_intel.cache))
+Gauge("sentinel_syslog_pending_lines", "Syslog lines waiting for the next batch", lambda: len(syslog_listener.pending))
+Gauge("sentinel_anomaly_scoring_pending", "Events waiting for the scoring batcher", lambda: len(scoring_batcher.pending))
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,178 @@
+import base64
+import csv
+import io
+import json
+import re
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.services.log_archive import merge_docs, merge_streams
+
+# Shared listing helpers for /api/logs and /api/alerts: keyset pagination on
+# (timestamp, _id) descending, field projection, time ranges and streamed
+# NDJSON/CSV exports. Passing an archive (log_archive) also reads its cold
+# tier with the same query and merges it in order.
+
+SORT = [("timestamp", -1), ("_id", -1)]
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_ROWS = 500
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def encode_cursor(doc: dict, field: str = "timestamp") -> str | None:
+    timestamp = doc.get(field)
+    if not isinstance(timestamp, datetime):
+        return None
+    raw = f"{_utc(timestamp).isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        timestamp, oid = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), ObjectId(oid)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def build_query(filters: dict, since: datetime | None, until: datetime | None, cursor: str | None) -> dict:
+    query = dict(filters)
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = _utc(since)
+        if until:
+            query["timestamp"]["$lt"] = _utc(until)
+    if cursor:
+        # Everything strictly after the last row of the previous page
+        timestamp, oid = decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": oid}},
+        ]
+    return query
+
+
+def parse_fields(fields: str | None) -> list[str] | None:
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    invalid = [name for name in names if not FIELD_NAME.match(name)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid field names: {', '.join(invalid)}")
+    return names
+
+
+def projection(fields: list[str] | None) -> dict | None:
+    # timestamp is always returned: the next cursor is built from it
+    if not fields:
+        return None
+    return {**{name: 1 for name in fields}, "timestamp": 1}
+
+
+def _jsonable(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return _utc(value).isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _lookup(doc: dict, name: str):
+    value = doc
+    for part in name.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_jsonable)
+    if isinstance(value, (ObjectId, datetime)):
+        return _jsonable(value)
+    return value
+
+
+async def fetch_page(collection, query: dict, fields: list[str] | None, limit: int,
+                     archive=None) -> tuple[list[dict], str | None]:
+    cursor = collection.find(query, projection(fields)).sort(SORT).limit(limit)
+    docs = []
+    async for doc in cursor:
+        docs.append(doc)
+    if archive is not None:
+        archive_query = query
+        if len(docs) == limit:
+            # A full page can only change through archived rows that sort
+            # ahead of its last row; usually none, and no segment is read
+            last = docs[-1]
+            archive_query = {"$and": [query, {"$or": [
+                {"timestamp": {"$gt": last["timestamp"]}},
+                {"timestamp": last["timestamp"], "_id": {"$gt": last["_id"]}},
+            ]}]}
+        docs = merge_docs(docs, await archive.find(archive_query, projection(fields), SORT, limit), SORT, limit)
+
+    next_cursor = encode_cursor(docs[-1]) if len(docs) == limit else None
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return docs, next_cursor
+
+
+async def _ndjson_rows(cursor):
+    chunk = []
+    async for doc in cursor:
+        chunk.append(json.dumps(doc, default=_jsonable))
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+async def _csv_rows(cursor, columns: list[str]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    rows = 0
+    async for doc in cursor:
+        writer.writerow([_csv_cell(_lookup(doc, name)) for name in columns])
+        rows += 1
+        if rows >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue()
+
+
+def stream_export(collection, query: dict, fields: list[str] | None, fmt: str,
+                  default_columns: list[str], filename: str, archive=None) -> StreamingResponse:
+    # Rows are written as the Motor cursor yields them, so memory use does not
+    # depend on how many documents match
+    cursor = collection.find(query, projection(fields)).sort(SORT).batch_size(EXPORT_BATCH_SIZE)
+    if archive is not None:
+        cursor = merge_streams(cursor, archive.iter_find(query, projection(fields), SORT), SORT)
+    if fmt == "csv":
+        body = _csv_rows(cursor, fields or default_columns)
+        media_type = "text/csv"
+    else:
+        body = _ndjson_rows(cursor)
+        media_type = "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
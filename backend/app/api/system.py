@@ -0,0 +1,58 @@
+from fastapi import APIRouter
+
+from app.core.indexes import ensure_indexes, explain_query_shapes, verify_indexes
+from app.services.activity_rollup import activity_rollups
+from app.services.alert_aggregation import alert_aggregator
+from app.services.cluster import cluster
+from app.services.correlation import correlator
+from app.services.feature_store import feature_store
+from app.services.geoip import geoip
+from app.services.ip_reputation import ip_reputation
+from app.services.log_archive import log_archive
+from app.services.pipeline import detection_pipeline
+from app.services.syslog_listener import syslog_listener
+from app.services.profile_cache import ip_profiles, user_profiles
+from app.services.threat_intel import threat_intel
+from app.ws.alerts import manager
+
+router = APIRouter()
+
+
+@router.get("/system/stats")
+async def system_stats():
+    return {
+        "pipeline": detection_pipeline.stats(),
+        "syslog": syslog_listener.stats(),
+        "correlator": correlator.stats(),
+        "feature_store": feature_store.stats(),
+        "ip_profiles": ip_profiles.stats(),
+        "user_profiles": user_profiles.stats(),
+        "websocket": manager.stats(),
+        "threat_intel": threat_intel.stats(),
+        "alert_aggregation": alert_aggregator.stats(),
+        "cluster": cluster.stats(),
+        "log_archive": log_archive.stats(),
+        "activity_rollups": activity_rollups.stats(),
+        "ip_reputation": ip_reputation.stats(),
+        "geoip": geoip.stats(),
+    }
+
+
+@router.get("/system/indexes")
+async def system_indexes():
+    return await verify_indexes()
+
+
+@router.post("/system/indexes")
+async def create_system_indexes():
+    # Builds missing indexes; can be slow on a large logs collection
+    return await ensure_indexes()
+
+
+@router.get("/system/explain")
+async def system_explain():
+    shapes = await explain_query_shapes()
+    return {
+        "collection_scans": [s["shape"] for s in shapes if s.get("collection_scan")],
+        "shapes": shapes,
+    }
@@ -1,2 +1,131 @@
+import os
+
 APP_NAME = "SentinelAI"
-APP_VERSION = "1.0.0"
\ No newline at end of file
+APP_VERSION = "1.0.0"
+
+# Anomaly scoring micro-batcher
+ANOMALY_BATCH_MAX_SIZE = int(os.getenv("ANOMALY_BATCH_MAX_SIZE", "64"))
+ANOMALY_BATCH_MAX_WAIT_MS = float(os.getenv("ANOMALY_BATCH_MAX_WAIT_MS", "5"))
+
+# Anomaly model training (runs in a separate process)
+ML_TRAIN_MAX_SAMPLES = int(os.getenv("ML_TRAIN_MAX_SAMPLES", "2000000"))
+ML_TRAIN_N_JOBS = int(os.getenv("ML_TRAIN_N_JOBS", "1"))
+ML_FOREST_MAX_SAMPLES = os.getenv("ML_FOREST_MAX_SAMPLES", "auto")
+ML_MODEL_DIR = os.getenv("ML_MODEL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "ml", "models"))
+ML_MODEL_KEEP = int(os.getenv("ML_MODEL_KEEP", "5"))
+# Periodic retraining; 0 disables it (manual /api/ml/train still works)
+ML_TRAIN_INTERVAL_HOURS = float(os.getenv("ML_TRAIN_INTERVAL_HOURS", "6"))
+
+# /api/incidents: decayed risk is reported in steps of this many seconds so
+# ETags stay stable between steps for idle dashboards
+INCIDENTS_DECAY_STEP_SECONDS = int(os.getenv("INCIDENTS_DECAY_STEP_SECONDS", "60"))
+
+# Threat intel (AbuseIPDB) lookups; THREAT_INTEL_URL can point at a local mock
+THREAT_INTEL_URL = os.getenv("THREAT_INTEL_URL", "https://api.abuseipdb.com/api/v2/check")
+THREAT_INTEL_TTL_SECONDS = float(os.getenv("THREAT_INTEL_TTL_SECONDS", str(6 * 60 * 60)))
+THREAT_INTEL_NEGATIVE_TTL_SECONDS = float(os.getenv("THREAT_INTEL_NEGATIVE_TTL_SECONDS", "300"))
+THREAT_INTEL_CACHE_SIZE = int(os.getenv("THREAT_INTEL_CACHE_SIZE", "10000"))
+THREAT_INTEL_TIMEOUT_SECONDS = float(os.getenv("THREAT_INTEL_TIMEOUT_SECONDS", "10"))
+THREAT_INTEL_INLINE_WAIT_SECONDS = float(os.getenv("THREAT_INTEL_INLINE_WAIT_SECONDS", "2"))
+THREAT_INTEL_MAX_CONNECTIONS = int(os.getenv("THREAT_INTEL_MAX_CONNECTIONS", "10"))
+THREAT_INTEL_BATCH_SIZE = int(os.getenv("THREAT_INTEL_BATCH_SIZE", "10"))
+
+# Alert aggregation: repeats of the same alert type and entity within the
+# suppression window update one alert (count, last_seen) instead of inserting;
+# an aggregate is closed after ALERT_AGGREGATE_MAX_SECONDS so long attacks are
+# re-raised periodically. Updates are broadcast at most once per interval.
+ALERT_SUPPRESSION_SECONDS = float(os.getenv("ALERT_SUPPRESSION_SECONDS", "300"))
+ALERT_AGGREGATE_MAX_SECONDS = float(os.getenv("ALERT_AGGREGATE_MAX_SECONDS", "3600"))
+ALERT_UPDATE_BROADCAST_SECONDS = float(os.getenv("ALERT_UPDATE_BROADCAST_SECONDS", "5"))
+ALERT_AGGREGATION_MAX_KEYS = int(os.getenv("ALERT_AGGREGATION_MAX_KEYS", "100000"))
+
+# Cold tier for aged logs: whole days of logs ingested more than
+# LOG_ARCHIVE_AFTER_DAYS ago are moved from MongoDB into compressed Parquet
+# segments under LOG_ARCHIVE_DIR, partitioned by ingest day and IP bucket.
+# 0 stops archiving; segments already archived are still queried.
+LOG_ARCHIVE_AFTER_DAYS = float(os.getenv("LOG_ARCHIVE_AFTER_DAYS", "30"))
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "archive", "logs"))
+LOG_ARCHIVE_INTERVAL_MINUTES = float(os.getenv("LOG_ARCHIVE_INTERVAL_MINUTES", "60"))
+LOG_ARCHIVE_BATCH_SIZE = int(os.getenv("LOG_ARCHIVE_BATCH_SIZE", "50000"))
+LOG_ARCHIVE_IP_BUCKETS = int(os.getenv("LOG_ARCHIVE_IP_BUCKETS", "16"))
+LOG_ARCHIVE_ROW_GROUP_SIZE = int(os.getenv("LOG_ARCHIVE_ROW_GROUP_SIZE", "16384"))
+LOG_ARCHIVE_COMPRESSION = os.getenv("LOG_ARCHIVE_COMPRESSION", "zstd")
+
+# Per-minute activity rollups (UEBA windows, /api/activity). Buckets are
+# dropped by a TTL index after ACTIVITY_ROLLUP_RETENTION_DAYS; each keeps at
+# most ACTIVITY_ROLLUP_MAX_PEERS distinct usernames / IPs.
+ACTIVITY_ROLLUP_RETENTION_DAYS = float(os.getenv("ACTIVITY_ROLLUP_RETENTION_DAYS", "7"))
+ACTIVITY_ROLLUP_MAX_PEERS = int(os.getenv("ACTIVITY_ROLLUP_MAX_PEERS", "100"))
+
+# Local IP reputation lists (CIDR blocklists under REPUTATION_DIR/block,
+# allowlists under REPUTATION_DIR/allow), re-read when their files change.
+# Matches shift calculate_risk by the REPUTATION_*_RISK points.
+REPUTATION_DIR = os.getenv("REPUTATION_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "reputation"))
+REPUTATION_RELOAD_SECONDS = float(os.getenv("REPUTATION_RELOAD_SECONDS", "30"))
+REPUTATION_BLOCK_RISK = int(os.getenv("REPUTATION_BLOCK_RISK", "2"))
+REPUTATION_ALLOW_RISK = int(os.getenv("REPUTATION_ALLOW_RISK", "-3"))
+
+# GeoIP / ASN enrichment from memory-mapped MaxMind-format databases (missing
+# files disable the corresponding fields). Files are re-opened when replaced.
+GEOIP_CITY_DB = os.getenv("GEOIP_CITY_DB", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "geoip", "GeoLite2-City.mmdb"))
+GEOIP_ASN_DB = os.getenv("GEOIP_ASN_DB", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "geoip", "GeoLite2-ASN.mmdb"))
+GEOIP_CACHE_SIZE = int(os.getenv("GEOIP_CACHE_SIZE", "100000"))
+GEOIP_RELOAD_SECONDS = float(os.getenv("GEOIP_RELOAD_SECONDS", "300"))
+
+# Impossible travel: consecutive successful logins of one user whose
+# locations (less both accuracy radii) are at least IMPOSSIBLE_TRAVEL_MIN_KM
+# apart and would need more than IMPOSSIBLE_TRAVEL_MAX_KMH to cover
+IMPOSSIBLE_TRAVEL_MAX_KMH = float(os.getenv("IMPOSSIBLE_TRAVEL_MAX_KMH", "900"))
+IMPOSSIBLE_TRAVEL_MIN_KM = float(os.getenv("IMPOSSIBLE_TRAVEL_MIN_KM", "500"))
+
+# UEBA write-behind profile cache
+PROFILE_CACHE_MAX_SIZE = int(os.getenv("PROFILE_CACHE_MAX_SIZE", "50000"))
+PROFILE_FLUSH_INTERVAL_SECONDS = float(os.getenv("PROFILE_FLUSH_INTERVAL_SECONDS", "2"))
+
+# WebSocket alert fan-out: per-client queue size and what to do when full
+# (drop_oldest, drop_newest or disconnect)
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")
+
+# Asynchronous detection pipeline: worker shards (by IP), total queued
+# events before ingest answers 503, and events handled per worker pass
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", "4"))
+DETECTION_QUEUE_SIZE = int(os.getenv("DETECTION_QUEUE_SIZE", "10000"))
+DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", "100"))
+
+# Partitioned multi-process mode. CLUSTER_NODES lists every node's base URL
+# (same order on all nodes) and CLUSTER_NODE_ID is this node's position in
+# it; each IP's detection runs on the node owning it on the hash ring.
+# Empty CLUSTER_NODES means the usual single-process mode. CLUSTER_TOKEN is
+# the shared secret for node-to-node calls and is required in cluster mode.
+CLUSTER_NODES = [url.strip().rstrip("/") for url in os.getenv("CLUSTER_NODES", "").split(",") if url.strip()]
+CLUSTER_NODE_ID = int(os.getenv("CLUSTER_NODE_ID", "0"))
+CLUSTER_TOKEN = os.getenv("CLUSTER_TOKEN", "")
+CLUSTER_VNODES = int(os.getenv("CLUSTER_VNODES", "128"))
+CLUSTER_FANOUT_MS = float(os.getenv("CLUSTER_FANOUT_MS", "20"))
+CLUSTER_FANOUT_MAX_PENDING = int(os.getenv("CLUSTER_FANOUT_MAX_PENDING", "50000"))
+CLUSTER_TIMEOUT_SECONDS = float(os.getenv("CLUSTER_TIMEOUT_SECONDS", "5"))
+# Nodes other than node 0 do not train; they reload the promoted model
+# every ML_MODEL_POLL_SECONDS (ML_MODEL_DIR must be shared between nodes)
+ML_MODEL_POLL_SECONDS = float(os.getenv("ML_MODEL_POLL_SECONDS", "60"))
+
+# Time zone of log timestamps that carry none (RFC3164 headers, ISO stamps
+# without an offset), as an IANA name such as Europe/Berlin. The importer
+# can override it per run (--timezone) and /api/ingest per request (?tz=).
+LOG_TIMEZONE = os.getenv("LOG_TIMEZONE", "UTC")
+
+# Native syslog listener (UDP, TCP with RFC 6587 framing, optional TLS).
+# Senders are not authenticated, so it is opt-in and loopback-only unless
+# SYSLOG_HOST is set (e.g. 0.0.0.0 behind a firewall)
+SYSLOG_ENABLED = os.getenv("SYSLOG_ENABLED", "0") == "1"
+SYSLOG_HOST = os.getenv("SYSLOG_HOST", "127.0.0.1")
+SYSLOG_UDP_PORT = int(os.getenv("SYSLOG_UDP_PORT", "5514"))
+SYSLOG_TCP_PORT = int(os.getenv("SYSLOG_TCP_PORT", "5514"))
+SYSLOG_TLS_PORT = int(os.getenv("SYSLOG_TLS_PORT", "6514"))
+SYSLOG_TLS_CERT = os.getenv("SYSLOG_TLS_CERT")
+SYSLOG_TLS_KEY = os.getenv("SYSLOG_TLS_KEY")
+SYSLOG_RCVBUF_BYTES = int(os.getenv("SYSLOG_RCVBUF_BYTES", str(4 * 1024 * 1024)))
+SYSLOG_MAX_MESSAGE_BYTES = int(os.getenv("SYSLOG_MAX_MESSAGE_BYTES", "65536"))
+SYSLOG_BATCH_SIZE = int(os.getenv("SYSLOG_BATCH_SIZE", "500"))
+SYSLOG_FLUSH_MS = float(os.getenv("SYSLOG_FLUSH_MS", "50"))
+SYSLOG_MAX_PENDING = int(os.getenv("SYSLOG_MAX_PENDING", "20000"))
@@ -1,9 +1,14 @@
+import os
+
 from motor.motor_asyncio import AsyncIOMotorClient
 
-MONGO_URL = "mongodb://127.0.0.1:27017"
+from app.core.metrics import mongo_command_metrics
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://127.0.0.1:27017")
+MONGO_DB = os.getenv("MONGO_DB", "sentinelai")
 
-client = AsyncIOMotorClient(MONGO_URL)
-db = client["sentinelai"]
+client = AsyncIOMotorClient(MONGO_URL, tz_aware=True, event_listeners=[mongo_command_metrics])
+db = client[MONGO_DB]
 
 logs_collection = db["logs"]
 alerts_collection = db["alerts"]
@@ -11,3 +16,4 @@ ueba_profiles_collection = db["ueba_profiles"]
 ueba_sessions_collection = db["ueba_sessions"]
 ueba_user_profiles_collection = db["ueba_user_profiles"]
 ueba_incidents_collection = db["ueba_incidents"]
+activity_rollups_collection = db["activity_rollups"]
@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.core.config import ACTIVITY_ROLLUP_RETENTION_DAYS
+from app.core.database import db
+
+# Every index the hot query paths rely on, per collection. Created (or
+# verified) at startup by ensure_indexes.
+INDEXES = {
+    "logs": [
+        # incident timelines
+        IndexModel([("ip_address", ASCENDING), ("event_time", DESCENDING)], name="ip_event_time"),
+        # training scans and feature store warm-up
+        IndexModel([("event_time", DESCENDING)], name="event_time"),
+        # /api/logs keyset pages and exports, optionally filtered by ip or user;
+        # timestamp_id also serves the log archiver's scan of aged logs
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+        IndexModel([("ip_address", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="ip_timestamp_id"),
+        IndexModel([("username", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="user_timestamp_id"),
+    ],
+    "alerts": [
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+        IndexModel([("severity", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="severity_timestamp_id"),
+        IndexModel([("alert_type", ASCENDING), ("ip_address", ASCENDING), ("timestamp", DESCENDING)],
+                   name="type_ip_timestamp"),
+        # alert_aggregation restoring open aggregates after a restart
+        IndexModel([("aggregation_key", ASCENDING), ("last_seen", DESCENDING)], name="aggregation_key_last_seen"),
+    ],
+    "ueba_incidents": [
+        IndexModel([("incident_key", ASCENDING)], name="incident_key", unique=True),
+        # /api/incidents ordering by decayed risk, and its ETag / delta probes
+        IndexModel([("decay_anchor", DESCENDING)], name="decay_anchor"),
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at_id"),
+        # /api/incidents/export time-range scans
+        IndexModel([("last_seen", DESCENDING)], name="last_seen"),
+    ],
+    "ueba_profiles": [
+        IndexModel([("ip_address", ASCENDING)], name="ip_address", unique=True),
+    ],
+    "ueba_user_profiles": [
+        IndexModel([("username", ASCENDING)], name="username", unique=True),
+    ],
+    "activity_rollups": [
+        # $inc upserts on ingest, UEBA windows and /api/activity ranges
+        IndexModel([("kind", ASCENDING), ("key", ASCENDING), ("minute", ASCENDING)],
+                   name="kind_key_minute", unique=True),
+        IndexModel([("minute", ASCENDING)], name="minute_ttl",
+                   expireAfterSeconds=int(ACTIVITY_ROLLUP_RETENTION_DAYS * 24 * 60 * 60)),
+    ],
+    "ueba_sessions": [
+        IndexModel([("ip_address", ASCENDING), ("start", DESCENDING)], name="ip_start"),
+    ],
+}
+
+def query_shapes() -> dict:
+    # Representative filter/sort for each registered access path
+    now = datetime.now(timezone.utc)
+    ip = "203.0.113.1"
+    user = "root"
+    return {
+        "ueba.window_counts": ("activity_rollups", {
+            "kind": "ip", "key": ip, "minute": {"$gte": now - timedelta(minutes=10)}
+        }, [("minute", ASCENDING)]),
+        "ueba.user_multi_source": ("activity_rollups", {
+            "kind": "user", "key": user, "minute": {"$gte": now - timedelta(minutes=10)}
+        }, [("minute", ASCENDING)]),
+        "activity.series": ("activity_rollups", {
+            "kind": "all", "key": "*", "minute": {"$gte": now - timedelta(hours=24), "$lte": now}
+        }, [("minute", ASCENDING)]),
+        "incidents.timeline": ("logs", {
+            "ip_address": ip, "event_time": {"$gte": now - timedelta(minutes=30)}
+        }, [("event_time", ASCENDING)]),
+        "training.scan": ("logs", {
+            "event_time": {"$gte": now - timedelta(days=7)}
+        }, None),
+        "archive.scan": ("logs", {
+            "timestamp": {"$lt": now - timedelta(days=30)}
+        }, [("timestamp", ASCENDING), ("_id", ASCENDING)]),
+        "api.logs": ("logs", {}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        "api.logs_range": ("logs", {
+            "timestamp": {"$gte": now - timedelta(days=1), "$lt": now}
+        }, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        "api.logs_by_ip": ("logs", {"ip_address": ip}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        "api.logs_by_user": ("logs", {"username": user}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        "api.alerts": ("alerts", {}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        "api.alerts_by_severity": ("alerts", {"severity": "high"}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        "detection.bruteforce_dedupe": ("alerts", {
+            "alert_type": "ssh_bruteforce", "ip_address": ip,
+            "timestamp": {"$gte": now - timedelta(minutes=2)}
+        }, None),
+        "alerts.open_aggregates": ("alerts", {
+            "aggregation_key": {"$in": [f"correlated_incident|Brute Force Attack|{ip}", f"anomaly_detected|{ip}"]},
+            "last_seen": {"$gte": now - timedelta(minutes=5)}
+        }, [("last_seen", DESCENDING)]),
+        "incidents.by_key": ("ueba_incidents", {"incident_key": f"UEBA: Persistent Brute Force:{ip}"}, None),
+        "incidents.by_decayed_risk": ("ueba_incidents", {}, [("decay_anchor", DESCENDING)]),
+        "incidents.revision": ("ueba_incidents", {}, [("updated_at", DESCENDING)]),
+        "incidents.export": ("ueba_incidents", {
+            "last_seen": {"$gte": now - timedelta(days=1)}, "severity": "high"
+        }, [("last_seen", DESCENDING)]),
+        "incidents.since": ("ueba_incidents", {
+            "updated_at": {"$gt": now - timedelta(minutes=1)}
+        }, [("updated_at", ASCENDING), ("_id", ASCENDING)]),
+        "incidents.cursor": ("ueba_incidents", {"$or": [
+            {"updated_at": {"$gt": now - timedelta(minutes=1)}},
+            {"updated_at": now - timedelta(minutes=1), "_id": {"$gt": ObjectId("0" * 24)}},
+        ]}, [("updated_at", ASCENDING), ("_id", ASCENDING)]),
+        "ueba.ip_profile": ("ueba_profiles", {"ip_address": ip}, None),
+        "ueba.user_profile": ("ueba_user_profiles", {"username": user}, None),
+    }
+
+
+def _same_keys(existing: dict, model: IndexModel) -> bool:
+    return list(existing.get("key", [])) == list(model.document["key"].items())
+
+
+def _same_shape(existing: dict, model: IndexModel) -> bool:
+    return _same_keys(existing, model) and bool(existing.get("unique")) == bool(model.document.get("unique"))
+
+
+def _ttl_changed(existing: dict, model: IndexModel) -> bool:
+    # Both TTL indexes with different expiries: fixable in place with collMod
+    current, declared = existing.get("expireAfterSeconds"), model.document.get("expireAfterSeconds")
+    return current is not None and declared is not None and current != declared
+
+
+def _check(existing: dict, collection_name: str, model: IndexModel) -> dict:
+    name = model.document["name"]
+    entry = {"collection": collection_name, "index": name}
+    current = existing.get(name)
+    if current is None:
+        entry["status"] = "missing"
+    elif not _same_shape(current, model):
+        entry["status"] = "conflict"
+        entry["error"] = f"existing index {name} has a different definition"
+    elif current.get("expireAfterSeconds") != model.document.get("expireAfterSeconds"):
+        entry["status"] = "conflict"
+        entry["error"] = (
+            f"existing index {name} has expireAfterSeconds={current.get('expireAfterSeconds')}, "
+            f"declared {model.document.get('expireAfterSeconds')}"
+        )
+    else:
+        entry["status"] = "present"
+    return entry
+
+
+async def verify_indexes() -> list[dict]:
+    # Read-only: compares index_information() with INDEXES
+    report = []
+    for collection_name, models in INDEXES.items():
+        existing = await db[collection_name].index_information()
+        report.extend(_check(existing, collection_name, model) for model in models)
+    return report
+
+
+async def ensure_indexes() -> list[dict]:
+    report = []
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+
+        for model in models:
+            entry = _check(existing, collection_name, model)
+            current = existing.get(model.document["name"])
+            if entry["status"] == "conflict" and _same_shape(current, model) and _ttl_changed(current, model):
+                # e.g. ACTIVITY_ROLLUP_RETENTION_DAYS changed since the index was built
+                try:
+                    await db.command("collMod", collection_name, index={
+                        "name": model.document["name"], "expireAfterSeconds": model.document["expireAfterSeconds"]
+                    })
+                    entry["status"] = "updated"
+                    del entry["error"]
+                except OperationFailure as exc:
+                    entry["status"] = "failed"
+                    entry["error"] = str(exc)
+                report.append(entry)
+                continue
+            if entry["status"] != "missing":
+                report.append(entry)
+                continue
+
+            try:
+                await collection.create_indexes([model])
+                entry["status"] = "created"
+            except OperationFailure as exc:
+                # e.g. duplicate keys blocking a unique index
+                entry["status"] = "failed"
+                entry["error"] = str(exc)
+            report.append(entry)
+
+    return report
+
+
+def _plan_stages(node, stages: list):
+    if isinstance(node, dict):
+        stage = node.get("stage")
+        if stage:
+            stages.append({"stage": stage, "index": node.get("indexName")})
+        for value in node.values():
+            _plan_stages(value, stages)
+    elif isinstance(node, list):
+        for value in node:
+            _plan_stages(value, stages)
+    return stages
+
+
+async def explain_query_shapes() -> list[dict]:
+    results = []
+    for name, (collection_name, query, sort) in query_shapes().items():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        entry = {"shape": name, "collection": collection_name}
+        try:
+            plan = await cursor.limit(1).explain()
+        except Exception as exc:
+            entry["error"] = str(exc)
+            results.append(entry)
+            continue
+
+        stages = _plan_stages(plan.get("queryPlanner", {}).get("winningPlan", {}), [])
+        entry["stages"] = [s["stage"] for s in stages]
+        entry["indexes"] = sorted({s["index"] for s in stages if s["index"]})
+        entry["collection_scan"] = any(s["stage"] == "COLLSCAN" for s in stages)
+        results.append(entry)
+    return results
@@ -0,0 +1,247 @@
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pymongo import monitoring
+
+# Minimal Prometheus-style metrics: fixed-bucket histograms, counters and
+# gauges read at scrape time. Recording is a bisect plus two additions
+# under an uncontended lock, cheap enough to stay on in production.
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+RATIO_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "total", "count", "lock")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+
+class _CounterChild:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        ...
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _RecordedMetric(_Metric):
+    # Metrics recorded into per-label-set children
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        super().__init__(name, documentation, labelnames)
+
+    @abstractmethod
+    def _new_child(self):
+        ...
+
+    def labels(self, *values):
+        # Callers on hot paths bind their children once at import time
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+
+class Histogram(_RecordedMetric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for values, child in list(self.children.items()):
+            with child.lock:
+                counts = list(child.counts)
+                total, count = child.total, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _label_text(self.labelnames + ("le",), values + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter(_RecordedMetric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for values, child in list(self.children.items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, values)} {child.value}")
+        return lines
+
+
+class Gauge(_Metric):
+    # Value read from a callback at scrape time; the callback returns a number
+    # or, for labelled gauges, a {label_values_tuple: number} dict
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback, labelnames: tuple = ()):
+        self.callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        try:
+            value = self.callback()
+        except Exception:
+            return lines
+        if isinstance(value, dict):
+            for values, number in value.items():
+                values = values if isinstance(values, tuple) else (values,)
+                lines.append(f"{self.name}{_label_text(self.labelnames, values)} {float(number)}")
+        else:
+            lines.append(f"{self.name} {float(value)}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in list(REGISTRY):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Shared metrics -------------------------------------------------------------
+
+STAGE_LATENCY = Histogram(
+    "sentinel_stage_seconds",
+    "Latency of ingest and detection stages",
+    ("stage",),
+)
+EVENTS_TOTAL = Counter("sentinel_events_total", "Events by pipeline outcome", ("outcome",))
+ALERTS_TOTAL = Counter("sentinel_alerts_total", "Alerts raised by detectors (before aggregation) by type", ("alert_type",))
+MONGO_OPS = Counter("sentinel_mongo_ops_total", "MongoDB commands by collection and operation",
+                    ("collection", "op", "status"))
+MONGO_LATENCY = Histogram("sentinel_mongo_op_seconds", "MongoDB command latency", ("collection", "op"))
+MONGO_OPS_PER_EVENT = Histogram("sentinel_mongo_ops_per_event",
+                                "MongoDB commands per event, observed once per ingest or detection batch",
+                                ("stage",), RATIO_BUCKETS)
+
+# Commands issued while a batch is being handled, counted by
+# MongoCommandMetrics. Motor runs each driver call in a copy of the calling
+# task's context, so the driver threads see the tally of the batch that
+# issued the command.
+_batch_ops: ContextVar[list | None] = ContextVar("batch_ops", default=None)
+
+
+def stage(name: str) -> _HistogramChild:
+    return STAGE_LATENCY.labels(name)
+
+
+def ops_per_event(name: str) -> _HistogramChild:
+    return MONGO_OPS_PER_EVENT.labels(name)
+
+
+@contextmanager
+def count_mongo_ops(histogram: _HistogramChild, events: int):
+    tally = [0]
+    token = _batch_ops.set(tally)
+    try:
+        yield
+    finally:
+        _batch_ops.reset(token)
+        if events:
+            histogram.observe(tally[0] / events)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    # Registered on the Motor client; runs on the driver's threads.
+    # started() remembers the collection of each in-flight request so the
+    # completion events can be labelled.
+    def __init__(self):
+        self.inflight: dict[int, tuple[str, str]] = {}
+
+    def started(self, event):
+        command = event.command
+        target = command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = command.get("collection")
+        if isinstance(target, str):
+            self.inflight[event.request_id] = (target, event.command_name)
+            tally = _batch_ops.get()
+            if tally is not None:
+                tally[0] += 1
+
+    def _finish(self, event, status: str):
+        labels = self.inflight.pop(event.request_id, None)
+        if labels is None:
+            return
+        MONGO_OPS.labels(*labels, status).inc()
+        MONGO_LATENCY.labels(*labels).observe(event.duration_micros / 1_000_000.0)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+mongo_command_metrics = MongoCommandMetrics()
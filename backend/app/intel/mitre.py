@@ -8,6 +8,11 @@ MITRE_MAP = {
         "technique": "T1087",
         "name": "Account Discovery",
         "tactic": "Discovery"
+    },
+    "Impossible Travel": {
+        "technique": "T1078",
+        "name": "Valid Accounts",
+        "tactic": "Initial Access"
     }
 }
 
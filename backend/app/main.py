@@ -1,14 +1,33 @@
 import asyncio
+from datetime import timedelta
 from fastapi import FastAPI, WebSocketDisconnect
 from app.api.ingest import router as ingest_router
 from app.api.alerts import router as alerts_router
 from app.api.logs import router as logs_router
 from app.api.ml import router as ml_router, run_training
 from app.api.incidents import router as incidents_router
+from app.api.system import router as system_router
+from app.api.metrics import router as metrics_router
+from app.api.cluster import router as cluster_router
+from app.api.activity import router as activity_router
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import WebSocket 
 from app.ws.alerts import manager
-from app.ml.anomaly import anomaly_model
+from app.core.indexes import ensure_indexes
+from app.services.model_training import model_trainer
+from app.services.feature_store import feature_store
+from app.services.profile_cache import flush_profiles, run_profile_flusher
+from app.services.ueba import WINDOW_MINUTES, backfill_incident_read_model
+from app.services.activity_rollup import activity_rollups
+from app.services.alert_aggregation import run_alert_update_broadcaster
+from app.services.pipeline import detection_pipeline
+from app.services.syslog_listener import syslog_listener
+from app.services.threat_intel import threat_intel
+from app.services.cluster import cluster
+from app.services.log_archive import log_archive, run_log_archiver
+from app.services.ip_reputation import ip_reputation, run_reputation_reloader
+from app.services.geoip import geoip, run_geoip_reloader
+from app.core.config import ML_MODEL_POLL_SECONDS, ML_TRAIN_INTERVAL_HOURS, SYSLOG_ENABLED
 
 app = FastAPI(title="SentinelAI SOC Backend")
 
@@ -17,6 +36,11 @@ app.include_router(alerts_router, prefix="/api")
 app.include_router(logs_router, prefix="/api")
 app.include_router(ml_router, prefix="/api")
 app.include_router(incidents_router, prefix="/api")
+app.include_router(system_router, prefix="/api")
+app.include_router(activity_router, prefix="/api")
+# Unprefixed so Prometheus can use its default scrape path
+app.include_router(metrics_router)
+app.include_router(cluster_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,25 +48,102 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 async def _periodic_ml_train():
+    # First run happens right after startup; training is off-loop, so startup
+    # no longer waits for it and the bundled/last model serves meanwhile
     while True:
         try:
             await run_training(7, 1000)
         except Exception as exc:
             print(f"[ml] periodic training failed: {exc}")
-        await asyncio.sleep(6 * 60 * 60)
+        await asyncio.sleep(ML_TRAIN_INTERVAL_HOURS * 60 * 60)
+
+
+async def _follow_promoted_model():
+    # Partitioned mode: only node 0 trains, the others reload what it promotes
+    while True:
+        await asyncio.sleep(ML_MODEL_POLL_SECONDS)
+        try:
+            await model_trainer.follow()
+        except Exception as exc:
+            print(f"[ml] reloading promoted model failed: {exc}")
 
 
 @app.on_event("startup")
 async def startup_event():
-    if not anomaly_model.trained:
+    try:
+        for entry in await ensure_indexes():
+            if entry["status"] in ("failed", "conflict"):
+                print(f"[db] index {entry['collection']}.{entry['index']} {entry['status']}: {entry['error']}")
+            elif entry["status"] == "updated":
+                print(f"[db] index {entry['collection']}.{entry['index']} TTL updated")
+    except Exception as exc:
+        print(f"[db] index bootstrap failed: {exc}")
+
+    try:
+        backfilled = await backfill_incident_read_model()
+        if backfilled:
+            print(f"[ueba] backfilled read-model fields on {backfilled} incidents")
+    except Exception as exc:
+        print(f"[ueba] incident backfill failed: {exc}")
+
+    if cluster.is_coordinator:
         try:
-            await run_training(7, 1000)
+            rebuilt = await activity_rollups.backfill(timedelta(minutes=2 * WINDOW_MINUTES))
+            if rebuilt:
+                print(f"[rollups] built activity rollups from {rebuilt} recent logs")
         except Exception as exc:
-            print(f"[ml] initial training failed: {exc}")
-    asyncio.create_task(_periodic_ml_train())
+            print(f"[rollups] backfill failed: {exc}")
+
+    try:
+        loaded = await feature_store.warm(owns_ip=cluster.owns_ip)
+        print(f"[features] warmed sliding windows from {loaded} recent logs")
+    except Exception as exc:
+        print(f"[features] warm-up failed: {exc}")
+
+    detection_pipeline.start()
+    threat_intel.start()
+    cluster.start()
+    if cluster.enabled:
+        print(f"[cluster] node {cluster.node_id} of {len(cluster.nodes)}")
+    if SYSLOG_ENABLED:
+        try:
+            await syslog_listener.start()
+            print(f"[syslog] listening {syslog_listener.stats()}")
+        except OSError as exc:
+            print(f"[syslog] listener failed to start: {exc}")
+    if not cluster.is_coordinator:
+        asyncio.create_task(_follow_promoted_model())
+    elif ML_TRAIN_INTERVAL_HOURS > 0:
+        asyncio.create_task(_periodic_ml_train())
+    asyncio.create_task(run_profile_flusher())
+    if ip_reputation.snapshot.lists:
+        print(f"[reputation] {len(ip_reputation.snapshot.lists)} lists, {ip_reputation.snapshot.entries} entries")
+    if ip_reputation.reload_seconds > 0:
+        asyncio.create_task(run_reputation_reloader())
+    if geoip.enabled:
+        print(f"[geoip] {geoip.stats()['databases']}")
+    if geoip.reload_seconds > 0:
+        asyncio.create_task(run_geoip_reloader())
+    asyncio.create_task(run_alert_update_broadcaster())
+    # One archiver per deployment; other nodes read the shared LOG_ARCHIVE_DIR
+    if log_archive.after is not None and cluster.is_coordinator:
+        asyncio.create_task(run_log_archiver())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if SYSLOG_ENABLED:
+        await syslog_listener.stop()
+    await detection_pipeline.stop()
+    await cluster.close()
+    model_trainer.shutdown()
+    await threat_intel.close()
+    written = await flush_profiles()
+    print(f"[ueba] flushed {written} profiles on shutdown")
 
 
 @app.websocket("/ws/alerts")
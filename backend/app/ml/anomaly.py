@@ -1,10 +1,13 @@
-from datetime import datetime, timezone
+import json
+import os
 from pathlib import Path
 
 import joblib
 import numpy as np
 from sklearn.ensemble import IsolationForest
 
+from app.core.config import ML_MODEL_DIR, ML_MODEL_KEEP
+
 FEATURE_NAMES = [
     "hour",
     "hour_sin",
@@ -23,64 +26,143 @@ FEATURE_NAMES = [
     "ip_is_private",
     "ip_is_reserved",
     "ip_is_global",
+    "ip_blocklisted",
+    "ip_allowlisted",
 ]
 
+# Bundled model, used until a training run has produced a versioned artifact
 MODEL_PATH = Path(__file__).resolve().parent / "anomaly_model.joblib"
+CURRENT_POINTER = Path(ML_MODEL_DIR) / "current.json"
+
+
+class _LoadedModel:
+    # Immutable snapshot of everything describing the serving model. It is
+    # replaced as a whole, so readers never see a new forest with old metadata.
+    __slots__ = ("model", "trained", "model_version", "last_trained_at", "last_train_samples", "path",
+                 "feature_names")
+
+    def __init__(self, model, trained=False, model_version=None, last_trained_at=None,
+                 last_train_samples=0, path=None, feature_names=None):
+        self.model = model
+        self.trained = trained
+        self.model_version = model_version
+        self.last_trained_at = last_trained_at
+        self.last_train_samples = last_train_samples
+        self.path = path
+        # Models trained before a feature was added keep scoring on the
+        # columns they were fitted with
+        self.feature_names = list(feature_names or FEATURE_NAMES)
 
 
 class AnomalyModel:
     def __init__(self):
-        self.model = IsolationForest(contamination=0.05, random_state=42)
-        self.trained = False
-        self.model_version = None
-        self.last_trained_at = None
-        self.last_train_samples = 0
+        self._active = _LoadedModel(IsolationForest(contamination=0.05, random_state=42))
         self.load()
 
-    def vectorize(self, feature_dicts):
+    @property
+    def model(self):
+        return self._active.model
+
+    @property
+    def trained(self) -> bool:
+        return self._active.trained
+
+    @property
+    def model_version(self):
+        return self._active.model_version
+
+    @property
+    def last_trained_at(self):
+        return self._active.last_trained_at
+
+    @property
+    def last_train_samples(self) -> int:
+        return self._active.last_train_samples
+
+    @property
+    def artifact_path(self):
+        return self._active.path
+
+    @property
+    def feature_names(self) -> list[str]:
+        return self._active.feature_names
+
+    @staticmethod
+    def vectorize(feature_dicts, feature_names=FEATURE_NAMES):
         return np.array([
-            [float(d.get(name, 0) or 0) for name in FEATURE_NAMES]
+            [float(d.get(name, 0) or 0) for name in feature_names]
             for d in feature_dicts
         ])
 
-    def train(self, feature_dicts: list[dict]):
-        if not feature_dicts:
-            return
-        X = self.vectorize(feature_dicts)
-        self.model.fit(X)
-        now = datetime.now(timezone.utc).isoformat()
-        self.trained = True
-        self.model_version = now
-        self.last_trained_at = now
-        self.last_train_samples = len(feature_dicts)
-        self.save()
-
     def predict(self, feature_dict: dict) -> tuple[bool, float]:
-        X = self.vectorize([feature_dict])
-        pred = self.model.predict(X)[0] == -1
-        score = float(self.model.decision_function(X)[0])
-        return pred, score
-
-    def save(self):
-        data = {
-            "model": self.model,
-            "trained": self.trained,
-            "model_version": self.model_version,
-            "last_trained_at": self.last_trained_at,
-            "last_train_samples": self.last_train_samples,
-            "feature_names": FEATURE_NAMES,
-        }
-        joblib.dump(data, MODEL_PATH)
+        return self.predict_batch([feature_dict])[0]
+
+    def predict_batch(self, feature_dicts: list[dict]) -> list[tuple[bool, float]]:
+        # IsolationForest.predict is just decision_function < 0, so one pass
+        # over the forest gives both the flag and the score.
+        active = self._active
+        X = self.vectorize(feature_dicts, active.feature_names)
+        scores = active.model.decision_function(X)
+        return [(bool(score < 0), float(score)) for score in scores]
+
+    @staticmethod
+    def read_artifact(path) -> _LoadedModel:
+        data = joblib.load(path)
+        feature_names = data.get("feature_names", FEATURE_NAMES)
+        unknown = set(feature_names) - set(FEATURE_NAMES)
+        if unknown:
+            raise ValueError(f"{path} uses unknown features: {sorted(unknown)}")
+        return _LoadedModel(
+            data["model"],
+            trained=bool(data.get("trained", False)),
+            model_version=data.get("model_version", None),
+            last_trained_at=data.get("last_trained_at", None),
+            last_train_samples=int(data.get("last_train_samples", 0) or 0),
+            path=str(path),
+            feature_names=feature_names,
+        )
+
+    def swap(self, loaded: _LoadedModel):
+        # Single reference assignment: in-flight predict_batch calls finish on
+        # the snapshot they started with
+        self._active = loaded
+
+    def promote(self, path: str):
+        # Point future restarts at the artifact that is now serving
+        CURRENT_POINTER.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CURRENT_POINTER.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"path": os.path.basename(path), "model_version": self.model_version}))
+        os.replace(tmp, CURRENT_POINTER)
+        self.prune()
+
+    def prune(self):
+        artifacts = sorted(CURRENT_POINTER.parent.glob("anomaly_model-*.joblib"))
+        serving = Path(self.artifact_path).name if self.artifact_path else None
+        for stale in artifacts[:-ML_MODEL_KEEP] if ML_MODEL_KEEP > 0 else []:
+            if stale.name != serving:
+                stale.unlink(missing_ok=True)
+
+    @staticmethod
+    def promoted_path() -> Path | None:
+        if not CURRENT_POINTER.exists():
+            return None
+        try:
+            return CURRENT_POINTER.parent / json.loads(CURRENT_POINTER.read_text())["path"]
+        except (ValueError, KeyError) as exc:
+            print(f"[ml] ignoring unreadable model pointer: {exc}")
+            return None
 
     def load(self):
-        if not MODEL_PATH.exists():
-            return
-        data = joblib.load(MODEL_PATH)
-        self.model = data.get("model", self.model)
-        self.trained = bool(data.get("trained", False))
-        self.model_version = data.get("model_version", None)
-        self.last_trained_at = data.get("last_trained_at", None)
-        self.last_train_samples = int(data.get("last_train_samples", 0) or 0)
+        candidates = [path for path in (self.promoted_path(), MODEL_PATH) if path is not None]
+
+        for path in candidates:
+            if not path.exists():
+                continue
+            try:
+                self.swap(self.read_artifact(path))
+                return
+            except Exception as exc:
+                print(f"[ml] failed to load {path}: {exc}")
 
 
 anomaly_model = AnomalyModel()
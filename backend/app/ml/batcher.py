@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from app.core.config import ANOMALY_BATCH_MAX_SIZE, ANOMALY_BATCH_MAX_WAIT_MS
+from app.core.metrics import stage
+from app.ml.anomaly import anomaly_model
+
+
+_SCORE_BATCH = stage("anomaly_score_batch")
+
+
+class ScoringBatcher:
+    def __init__(self, model, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.pending: list[tuple[dict, asyncio.Future, float]] = []
+        self._timer: asyncio.TimerHandle | None = None
+
+        self.batches = 0
+        self.scored = 0
+        self.failed = 0
+        self.flush_on_size = 0
+        self.flush_on_deadline = 0
+        self.largest_batch = 0
+        self.total_wait = 0.0
+        self.total_score_time = 0.0
+
+    def submit(self, features: dict) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((features, future, time.perf_counter()))
+
+        if len(self.pending) >= self.max_batch_size:
+            self.flush_on_size += 1
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._on_deadline)
+        return future
+
+    async def score(self, features: dict) -> tuple[bool, float]:
+        return await self.submit(features)
+
+    def _on_deadline(self):
+        self._timer = None
+        if self.pending:
+            self.flush_on_deadline += 1
+            self.flush()
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self.pending = self.pending, []
+        batch = [item for item in batch if not item[1].done()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        try:
+            results = self.model.predict_batch([features for features, _, _ in batch])
+        except Exception as exc:
+            self.failed += len(batch)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finished = time.perf_counter()
+
+        self.batches += 1
+        self.scored += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self.total_score_time += finished - started
+        _SCORE_BATCH.observe(finished - started)
+        for (_, future, queued_at), result in zip(batch, results):
+            self.total_wait += started - queued_at
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "pending": len(self.pending),
+            "batches": self.batches,
+            "scored": self.scored,
+            "failed": self.failed,
+            "flush_on_size": self.flush_on_size,
+            "flush_on_deadline": self.flush_on_deadline,
+            "largest_batch": self.largest_batch,
+            "avg_batch_size": round(self.scored / self.batches, 2) if self.batches else 0.0,
+            "avg_queue_wait_ms": round(1000.0 * self.total_wait / self.scored, 3) if self.scored else 0.0,
+            "avg_batch_score_ms": round(1000.0 * self.total_score_time / self.batches, 3) if self.batches else 0.0,
+        }
+
+
+scoring_batcher = ScoringBatcher(
+    anomaly_model,
+    max_batch_size=ANOMALY_BATCH_MAX_SIZE,
+    max_wait_ms=ANOMALY_BATCH_MAX_WAIT_MS,
+)
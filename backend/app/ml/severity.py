@@ -1,9 +1,16 @@
 def infer_severity(event: dict) -> str:
     event_type = event.get("event_type")
 
-    if event_type in {"ssh_failed_login", "ssh_invalid_user"}:
+    if event_type in {
+        "ssh_failed_login",
+        "ssh_invalid_user",
+        "pam_auth_failure",
+        "sudo_auth_failure",
+        "win_failed_login",
+        "win_account_lockout",
+    }:
         return "medium"
-    if event_type == "ssh_success_login":
+    if event_type in {"ssh_success_login", "sudo_command", "win_success_login"}:
         return "low"
 
     return "info"
@@ -0,0 +1,60 @@
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+# Runs inside the training process pool. Kept free of app imports so the
+# spawned worker does not load the live model or open database clients.
+
+
+def forest_max_samples(value: str):
+    # IsolationForest accepts "auto", an absolute count or a fraction
+    if value == "auto":
+        return value
+    return float(value) if "." in value else int(value)
+
+
+def fit_artifact(X: np.ndarray, feature_names: list[str], model_dir: str,
+                 n_jobs: int = 1, max_samples: str = "auto") -> dict:
+    started = time.perf_counter()
+    model = IsolationForest(
+        contamination=0.05,
+        random_state=42,
+        n_jobs=n_jobs,
+        max_samples=forest_max_samples(max_samples),
+    )
+    model.fit(X)
+    fit_seconds = time.perf_counter() - started
+
+    now = datetime.now(timezone.utc)
+    version = now.isoformat()
+    data = {
+        "model": model,
+        "trained": True,
+        "model_version": version,
+        "last_trained_at": version,
+        "last_train_samples": len(X),
+        "feature_names": feature_names,
+        "params": {"n_jobs": n_jobs, "max_samples": max_samples},
+    }
+
+    # Write under a temporary name first so a crash never leaves a
+    # half-written artifact behind a valid file name
+    directory = Path(model_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"anomaly_model-{now.strftime('%Y%m%dT%H%M%S%fZ')}.joblib"
+    tmp = path.with_suffix(".tmp")
+    joblib.dump(data, tmp)
+    os.replace(tmp, path)
+
+    return {
+        "path": str(path),
+        "model_version": version,
+        "samples": len(X),
+        "fit_seconds": fit_seconds,
+        "save_seconds": time.perf_counter() - started - fit_seconds,
+    }
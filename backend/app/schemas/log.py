@@ -13,4 +13,7 @@ class LogSchema(BaseModel):
     metadata: dict | None = None
 
 class RawLogRequest(BaseModel):
-    raw_log: str
\ No newline at end of file
+    raw_log: str
+
+class BatchLogRequest(BaseModel):
+    raw_logs: list[str]
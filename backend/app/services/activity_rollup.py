@@ -0,0 +1,166 @@
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from app.core.config import ACTIVITY_ROLLUP_MAX_PEERS
+from app.core.database import activity_rollups_collection, logs_collection
+from app.core.metrics import stage
+
+# Per-minute activity buckets, maintained with one $inc upsert per touched
+# bucket as logs are stored. Each stored log counts towards three buckets:
+#   ip    key=ip_address, peers = usernames seen from it
+#   user  key=username,   peers = IPs it was seen from
+#   all   key="*",        no peers (dashboard totals)
+# A window read is then a few small documents instead of a scan of the raw
+# logs, whatever the attack volume.
+
+MINUTE = timedelta(minutes=1)
+ALL_KEY = "*"
+# Recently written buckets whose peer sets we track, to cap their size
+OPEN_BUCKETS = 50_000
+_UNSAFE_KEY = re.compile(r"[.$]")
+
+_ROLLUP_WRITE = stage("rollup_write")
+
+
+def minute_of(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(second=0, microsecond=0)
+
+
+def _counter_name(event_type: str | None) -> str:
+    # Event types become field names under counts.
+    return _UNSAFE_KEY.sub("_", event_type or "unknown")
+
+
+class ActivityRollups:
+    def __init__(self, max_peers: int = 100):
+        self.max_peers = max_peers
+        # (kind, key, minute) -> peers this process has added to the bucket
+        self.peers: OrderedDict[tuple, set] = OrderedDict()
+        self.writes = 0
+        self.buckets_written = 0
+        self.overflowed = 0
+
+    def _updates(self, logs: list[dict]) -> list[UpdateOne]:
+        buckets: dict[tuple, dict] = {}
+        for log in logs:
+            event_time = log.get("event_time") or log.get("timestamp")
+            if event_time is None:
+                continue
+            minute = minute_of(event_time)
+            counter = _counter_name(log.get("event_type"))
+            ip = log.get("ip_address")
+            username = log.get("username")
+            for kind, key, peer in (("ip", ip, username), ("user", username, ip), ("all", ALL_KEY, None)):
+                if not key:
+                    continue
+                bucket = buckets.setdefault((kind, key, minute), {"counts": {}, "peers": set()})
+                bucket["counts"][counter] = bucket["counts"].get(counter, 0) + 1
+                if peer:
+                    bucket["peers"].add(peer)
+
+        updates = []
+        for (kind, key, minute), bucket in buckets.items():
+            inc = {f"counts.{name}": count for name, count in bucket["counts"].items()}
+            inc["total"] = sum(bucket["counts"].values())
+            update = {"$inc": inc}
+            if bucket["peers"]:
+                new_peers, overflow = self._admit((kind, key, minute), bucket["peers"])
+                if new_peers:
+                    update["$addToSet"] = {"peers": {"$each": sorted(new_peers)}}
+                if overflow:
+                    update["$set"] = {"peers_overflow": True}
+            updates.append(UpdateOne({"kind": kind, "key": key, "minute": minute}, update, upsert=True))
+        return updates
+
+    def _admit(self, bucket_id: tuple, peers: set) -> tuple[set, bool]:
+        # An IP spraying usernames would otherwise grow its bucket without
+        # bound; past max_peers only counts are kept and the bucket is flagged
+        known = self.peers.get(bucket_id)
+        if known is None:
+            known = self.peers[bucket_id] = set()
+            if len(self.peers) > OPEN_BUCKETS:
+                self.peers.popitem(last=False)
+        else:
+            self.peers.move_to_end(bucket_id)
+        new_peers = peers - known
+        room = self.max_peers - len(known)
+        overflow = len(new_peers) > room
+        if overflow:
+            self.overflowed += 1
+            new_peers = set(sorted(new_peers)[:max(0, room)])
+        known |= new_peers
+        return new_peers, overflow
+
+    async def record(self, logs: list[dict]):
+        updates = self._updates(logs)
+        if not updates:
+            return
+        started = time.perf_counter()
+        await activity_rollups_collection.bulk_write(updates, ordered=False)
+        _ROLLUP_WRITE.observe(time.perf_counter() - started)
+        self.writes += 1
+        self.buckets_written += len(updates)
+
+    async def buckets(self, kind: str, key: str, since: datetime, until: datetime | None = None) -> list[dict]:
+        query = {"kind": kind, "key": key, "minute": {"$gte": minute_of(since)}}
+        if until is not None:
+            query["minute"]["$lte"] = minute_of(until)
+        cursor = activity_rollups_collection.find(query, {"_id": 0, "kind": 0, "key": 0}).sort("minute", 1)
+        return await cursor.to_list(None)
+
+    async def window_counts(self, kind: str, key: str, since: datetime) -> dict:
+        # Whole minutes: the first bucket is counted in full, so a window
+        # reaches back up to one minute further than since
+        totals = {"total": 0}
+        for bucket in await self.buckets(kind, key, since):
+            totals["total"] += bucket.get("total", 0)
+            for name, count in bucket.get("counts", {}).items():
+                totals[name] = totals.get(name, 0) + count
+        return totals
+
+    async def distinct_peers(self, kind: str, key: str, since: datetime) -> set:
+        peers = set()
+        for bucket in await self.buckets(kind, key, since):
+            peers.update(bucket.get("peers", ()))
+        return peers
+
+    async def backfill(self, window: timedelta, batch_size: int = 5000) -> int:
+        # First start with rollups: rebuild the recent buckets from raw logs
+        # so UEBA windows are not empty while they fill up
+        if await activity_rollups_collection.find_one({}, {"_id": 1}):
+            return 0
+        since = datetime.now(timezone.utc) - window
+        cursor = logs_collection.find(
+            {"event_time": {"$gte": since}},
+            {"_id": 0, "event_time": 1, "event_type": 1, "ip_address": 1, "username": 1}
+        ).batch_size(batch_size)
+        loaded = 0
+        batch = []
+        async for log in cursor:
+            batch.append(log)
+            if len(batch) >= batch_size:
+                await self.record(batch)
+                loaded += len(batch)
+                batch = []
+        if batch:
+            await self.record(batch)
+            loaded += len(batch)
+        return loaded
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "buckets_written": self.buckets_written,
+            "open_buckets": len(self.peers),
+            "peer_sets_capped": self.overflowed,
+            "max_peers": self.max_peers,
+        }
+
+
+activity_rollups = ActivityRollups(max_peers=ACTIVITY_ROLLUP_MAX_PEERS)
@@ -0,0 +1,254 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from pymongo import DESCENDING, UpdateOne
+
+from app.core.config import (
+    ALERT_AGGREGATE_MAX_SECONDS,
+    ALERT_AGGREGATION_MAX_KEYS,
+    ALERT_SUPPRESSION_SECONDS,
+    ALERT_UPDATE_BROADCAST_SECONDS,
+)
+from app.core.database import alerts_collection
+from app.core.metrics import Counter, stage
+from app.services.cluster import cluster
+
+# Fields that identify "the same alert" per type; other types use the IP
+KEY_FIELDS = {
+    "correlated_incident": ("incident", "ip_address"),
+    "ueba_incident": ("incident", "ip_address"),
+}
+DEFAULT_KEY_FIELDS = ("ip_address",)
+
+# A new IP is only news once a day
+SUPPRESSION_SECONDS = {
+    "ueba_rare_entity": 24 * 60 * 60,
+}
+
+SEVERITY_RANK = {"low": 1, "medium": 2, "high": 3, "critical": 4}
+
+_ALERTS_WRITE = stage("alerts_write")
+_BROADCAST = stage("broadcast")
+ALERTS_SUPPRESSED = Counter(
+    "sentinel_alerts_suppressed_total",
+    "Alerts folded into an existing aggregate instead of inserted",
+    ("alert_type",),
+)
+
+
+def aggregation_key(alert: dict) -> str:
+    alert_type = alert.get("alert_type") or "alert"
+    fields = KEY_FIELDS.get(alert_type, DEFAULT_KEY_FIELDS)
+    return "|".join([alert_type] + [str(alert.get(field) or "") for field in fields])
+
+
+def _window(alert_type: str) -> timedelta:
+    return timedelta(seconds=SUPPRESSION_SECONDS.get(alert_type, ALERT_SUPPRESSION_SECONDS))
+
+
+class _Aggregate:
+    # Only what later updates need; the alert document itself is not kept
+    __slots__ = ("alert_id", "key", "first_seen", "last_seen", "count", "risk_score", "severity",
+                 "written_count", "last_broadcast")
+
+    def __init__(self, alert: dict):
+        self.alert_id = alert.get("_id")
+        self.key = alert["aggregation_key"]
+        self.first_seen = alert["timestamp"]
+        self.last_seen = alert.get("last_seen") or alert["timestamp"]
+        self.count = alert.get("count", 1)
+        self.risk_score = alert.get("risk_score")
+        self.severity = alert.get("severity")
+        self.written_count = self.count
+        self.last_broadcast = time.monotonic()
+
+    def accepts(self, alert: dict) -> bool:
+        seen = alert["timestamp"]
+        return (seen - self.last_seen <= _window(alert.get("alert_type"))
+                and seen - self.first_seen <= timedelta(seconds=ALERT_AGGREGATE_MAX_SECONDS))
+
+    def merge(self, alert: dict):
+        self.count += 1
+        self.last_seen = max(self.last_seen, alert["timestamp"])
+        risk = alert.get("risk_score")
+        if risk is not None and (self.risk_score is None or risk > self.risk_score):
+            self.risk_score = risk
+        if SEVERITY_RANK.get(alert.get("severity"), 0) > SEVERITY_RANK.get(self.severity, 0):
+            self.severity = alert.get("severity")
+
+    def changes(self) -> dict:
+        update = {"$inc": {"count": self.count - self.written_count}, "$max": {"last_seen": self.last_seen}}
+        if self.risk_score is not None:
+            update["$max"]["risk_score"] = self.risk_score
+        if self.severity is not None:
+            update["$set"] = {"severity": self.severity}
+        return update
+
+    def update_message(self) -> dict:
+        return {
+            "type": "alert_update",
+            "data": {
+                "_id": str(self.alert_id),
+                "aggregation_key": self.key,
+                "count": self.count,
+                "last_seen": self.last_seen,
+                "risk_score": self.risk_score,
+                "severity": self.severity,
+            }
+        }
+
+
+class AlertAggregator:
+    # Folds repeated alerts (same type and entity, within the suppression
+    # window) into one document. New aggregates are inserted and broadcast at
+    # once; repeats become one bulk update per batch, and their WebSocket
+    # updates go out at most once per broadcast interval per aggregate.
+    def __init__(self, max_keys: int = 100_000, broadcast_interval: float = 5.0):
+        self.max_keys = max(1, max_keys)
+        self.broadcast_interval = broadcast_interval
+        self.entries: OrderedDict[str, _Aggregate] = OrderedDict()
+        self.unbroadcast: dict[str, _Aggregate] = {}
+
+        self.created = 0
+        self.suppressed = 0
+        self.restored = 0
+        self.evicted = 0
+        self.updates_broadcast = 0
+
+    async def _restore(self, alerts: list[dict]):
+        # Aggregates created before a restart (or evicted) are picked up from
+        # Mongo, one query per batch for all keys not in memory
+        oldest = {}
+        for alert in alerts:
+            key = alert["aggregation_key"]
+            if key not in self.entries:
+                since = alert["timestamp"] - _window(alert.get("alert_type"))
+                oldest[key] = min(oldest.get(key, since), since)
+        if not oldest:
+            return
+
+        cursor = alerts_collection.find(
+            {"aggregation_key": {"$in": list(oldest)}, "last_seen": {"$gte": min(oldest.values())}},
+        ).sort("last_seen", DESCENDING)
+        async for doc in cursor:
+            key = doc["aggregation_key"]
+            if key in self.entries or doc["last_seen"] < oldest[key]:
+                continue
+            self.entries[key] = _Aggregate(doc)
+            self.restored += 1
+        self._evict()
+
+    def _evict(self):
+        while len(self.entries) > self.max_keys:
+            key, _ = self.entries.popitem(last=False)
+            self.unbroadcast.pop(key, None)
+            self.evicted += 1
+
+    async def publish(self, alerts: list[dict]):
+        for alert in alerts:
+            alert["aggregation_key"] = aggregation_key(alert)
+        await self._restore(alerts)
+
+        created: list[tuple[_Aggregate, dict]] = []
+        touched: dict[str, _Aggregate] = {}
+        for alert in alerts:
+            key = alert["aggregation_key"]
+            entry = self.entries.get(key)
+            if entry is not None and entry.accepts(alert):
+                entry.merge(alert)
+                self.entries.move_to_end(key)
+                ALERTS_SUPPRESSED.labels(alert.get("alert_type")).inc()
+                self.suppressed += 1
+                if entry.alert_id is not None:
+                    touched[key] = entry
+                continue
+
+            entry = _Aggregate(alert)
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            self.unbroadcast.pop(key, None)
+            created.append((entry, alert))
+
+        # Repeats of an aggregate opened in this same batch are folded into
+        # the document before it is inserted
+        for entry, alert in created:
+            alert.update({"count": entry.count, "last_seen": entry.last_seen,
+                          "risk_score": entry.risk_score, "severity": entry.severity})
+            entry.written_count = entry.count
+
+        started = time.perf_counter()
+        if created:
+            try:
+                await alerts_collection.insert_many([alert for _, alert in created])
+            except Exception:
+                # Forget the unwritten aggregates so the next repeat opens them again
+                for entry, _ in created:
+                    if self.entries.get(entry.key) is entry:
+                        del self.entries[entry.key]
+                raise
+            for entry, alert in created:
+                entry.alert_id = alert["_id"]
+            self.created += len(created)
+        if touched:
+            await alerts_collection.bulk_write(
+                [UpdateOne({"_id": entry.alert_id}, entry.changes()) for entry in touched.values()],
+                ordered=False,
+            )
+            for entry in touched.values():
+                entry.written_count = entry.count
+        written = time.perf_counter()
+        _ALERTS_WRITE.observe(written - started)
+        self._evict()
+
+        for _, alert in created:
+            alert["_id"] = str(alert["_id"])
+            await cluster.broadcast({"type": "new_alert", "data": alert})
+
+        now = time.monotonic()
+        for key, entry in touched.items():
+            if now - entry.last_broadcast >= self.broadcast_interval:
+                await self._broadcast_update(key, entry, now)
+            else:
+                self.unbroadcast[key] = entry
+        _BROADCAST.observe(time.perf_counter() - written)
+
+    async def _broadcast_update(self, key: str, entry: _Aggregate, now: float):
+        self.unbroadcast.pop(key, None)
+        entry.last_broadcast = now
+        self.updates_broadcast += 1
+        await cluster.broadcast(entry.update_message())
+
+    async def flush_updates(self) -> int:
+        # Sends the updates held back by the rate limit once it allows
+        now = time.monotonic()
+        due = [(key, entry) for key, entry in self.unbroadcast.items()
+               if now - entry.last_broadcast >= self.broadcast_interval]
+        for key, entry in due:
+            await self._broadcast_update(key, entry, now)
+        return len(due)
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self.entries),
+            "max_keys": self.max_keys,
+            "created": self.created,
+            "suppressed": self.suppressed,
+            "restored": self.restored,
+            "evicted": self.evicted,
+            "updates_broadcast": self.updates_broadcast,
+            "updates_pending": len(self.unbroadcast),
+        }
+
+
+alert_aggregator = AlertAggregator(ALERT_AGGREGATION_MAX_KEYS, ALERT_UPDATE_BROADCAST_SECONDS)
+
+
+async def run_alert_update_broadcaster():
+    while True:
+        await asyncio.sleep(max(0.5, ALERT_UPDATE_BROADCAST_SECONDS / 2))
+        try:
+            await alert_aggregator.flush_updates()
+        except Exception as exc:
+            print(f"[alerts] update broadcast failed: {exc}")
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import json
+from bisect import bisect
+from datetime import datetime
+
+import httpx
+
+from app.core.config import (
+    CLUSTER_FANOUT_MAX_PENDING,
+    CLUSTER_FANOUT_MS,
+    CLUSTER_NODE_ID,
+    CLUSTER_NODES,
+    CLUSTER_TIMEOUT_SECONDS,
+    CLUSTER_TOKEN,
+    CLUSTER_VNODES,
+)
+from app.ws.alerts import manager
+
+TOKEN_HEADER = "X-Cluster-Token"
+EVENT_TIME_FIELDS = ("event_time", "ingested_at", "timestamp")
+USER_FIELDS = ("username", "ip_address", "event_type", "event_time")
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    # Consistent hashing over node URLs with virtual nodes, so adding or
+    # removing a node only moves the keys that node gains or loses
+    def __init__(self, nodes: list[str], vnodes: int = 128):
+        points = sorted(
+            (_hash(f"{node}#{replica}"), index)
+            for index, node in enumerate(nodes)
+            for replica in range(max(1, vnodes))
+        )
+        self.hashes = [point for point, _ in points]
+        self.owners = [owner for _, owner in points]
+
+    def owner(self, key: str) -> int:
+        return self.owners[bisect(self.hashes, _hash(key)) % len(self.hashes)]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode(payload: dict) -> bytes:
+    return json.dumps(payload, default=_json_default).encode()
+
+
+def decode_event(event: dict) -> dict:
+    for field in EVENT_TIME_FIELDS:
+        value = event.get(field)
+        if isinstance(value, str):
+            event[field] = datetime.fromisoformat(value)
+    return event
+
+
+class _Peer:
+    def __init__(self, url: str):
+        self.url = url
+        self.broadcasts: list[dict] = []
+        self.users: list[dict] = []
+        self.counters = {
+            "capacity_rejected": 0,
+            "capacity_failed": 0,
+            "forwarded": 0,
+            "forward_rejected": 0,
+            "forward_failed": 0,
+            "fanout_batches": 0,
+            "fanout_failed": 0,
+            "fanout_dropped": 0,
+        }
+
+    def pending(self) -> int:
+        return len(self.broadcasts) + len(self.users)
+
+
+class Cluster:
+    # Partitioned mode. Every IP has one owning node on the hash ring, which
+    # runs all per-IP detection state (correlator, feature windows, UEBA IP
+    # profile and incidents, alert aggregation). Ingest on any node stores
+    # the logs and hands each event to its owner. Alert broadcasts and
+    # per-user window updates are fanned out to the other nodes in batches;
+    # user profiles are written only by the node owning the username.
+    def __init__(self, nodes: list[str], node_id: int = 0, token: str = "", vnodes: int = 128,
+                 fanout_ms: float = 20.0, max_pending: int = 50_000, timeout: float = 5.0):
+        self.nodes = nodes
+        self.node_id = node_id
+        self.enabled = len(nodes) > 1
+        if self.enabled and not 0 <= node_id < len(nodes):
+            raise ValueError(f"CLUSTER_NODE_ID {node_id} is not a position in CLUSTER_NODES")
+        if self.enabled and not token:
+            # The internal endpoints queue detections and publish alerts
+            raise ValueError("CLUSTER_TOKEN must be set when CLUSTER_NODES lists more than one node")
+        self.token = token
+        self.ring = HashRing(nodes, vnodes) if self.enabled else None
+        self.peers = {index: _Peer(url) for index, url in enumerate(nodes) if index != node_id} if self.enabled else {}
+        self.fanout_delay = max(0.0, fanout_ms) / 1000.0
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+
+        self._client = None
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+
+    @property
+    def is_coordinator(self) -> bool:
+        return self.node_id == 0
+
+    def owner(self, key: str) -> int:
+        return self.ring.owner(key) if self.enabled else self.node_id
+
+    def owns_ip(self, ip: str | None) -> bool:
+        return not self.enabled or not ip or self.owner(ip) == self.node_id
+
+    def owns_user(self, username: str | None) -> bool:
+        # Separate key space so a user and an IP with the same text do not
+        # always land together
+        return not self.enabled or not username or self.owner(f"user:{username}") == self.node_id
+
+    def split(self, events: list[dict]) -> tuple[list[dict], dict[int, list[dict]]]:
+        local = []
+        remote: dict[int, list[dict]] = {}
+        for event in events:
+            owner = self.owner(event["ip_address"])
+            if owner == self.node_id:
+                local.append(event)
+            else:
+                remote.setdefault(owner, []).append(event)
+        return local, remote
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    def _headers(self) -> dict:
+        return {"Content-Type": "application/json", TOKEN_HEADER: self.token}
+
+    # Detection hand-off -------------------------------------------------------
+
+    async def has_capacity(self, node: int, events: list[dict]) -> bool:
+        # Asked before ingest persists a batch, like the local queue check, so
+        # a batch an owner cannot take is rejected without being stored
+        peer = self.peers[node]
+        payload = {"ips": [event["ip_address"] for event in events]}
+        try:
+            response = await self._http().post(
+                f"{peer.url}/internal/cluster/capacity", content=encode(payload), headers=self._headers()
+            )
+        except httpx.HTTPError as exc:
+            peer.counters["capacity_failed"] += len(events)
+            print(f"[cluster] capacity check on {peer.url} failed: {exc!r}")
+            return False
+        if response.status_code != 200:
+            peer.counters["capacity_rejected"] += len(events)
+            return False
+        return True
+
+    async def forward(self, node: int, events: list[dict], attempts: int = 2) -> int:
+        # Awaited by ingest, so a request is answered only once its events are
+        # queued on their owners: the same guarantee (and the same per-IP
+        # ordering) as the single-process pipeline. Transport errors are
+        # retried; the owner queues a batch whole or not at all.
+        peer = self.peers[node]
+        payload = encode({"events": [{k: v for k, v in event.items() if k != "_id"} for event in events]})
+        for attempt in range(attempts):
+            try:
+                response = await self._http().post(
+                    f"{peer.url}/internal/cluster/events", content=payload, headers=self._headers()
+                )
+            except httpx.HTTPError as exc:
+                print(f"[cluster] forward to {peer.url} failed (attempt {attempt + 1}): {exc!r}")
+                continue
+            if response.status_code != 200:
+                peer.counters["forward_rejected"] += len(events)
+                return 0
+            peer.counters["forwarded"] += len(events)
+            return int(response.json().get("queued", 0))
+        peer.counters["forward_failed"] += len(events)
+        return 0
+
+    # Fan-out --------------------------------------------------------------------
+
+    def _queue(self, attribute: str, item: dict):
+        for peer in self.peers.values():
+            if peer.pending() >= self.max_pending:
+                peer.counters["fanout_dropped"] += 1
+                continue
+            getattr(peer, attribute).append(item)
+        self._wakeup.set()
+
+    async def broadcast(self, message: dict):
+        # Every node's WebSocket clients see every alert
+        await manager.broadcast(message)
+        if self.enabled:
+            self._queue("broadcasts", message)
+
+    def replicate_user(self, event: dict):
+        # Per-user feature windows are needed wherever that user's next event
+        # is scored, i.e. on any node
+        if self.enabled and event.get("username"):
+            self._queue("users", {field: event.get(field) for field in USER_FIELDS})
+
+    async def _flush(self, peer: _Peer):
+        if not peer.pending():
+            return
+        payload = {"broadcast": peer.broadcasts, "users": peer.users}
+        peer.broadcasts, peer.users = [], []
+        try:
+            response = await self._http().post(
+                f"{peer.url}/internal/cluster/fanout", content=encode(payload), headers=self._headers()
+            )
+            response.raise_for_status()
+            peer.counters["fanout_batches"] += 1
+        except httpx.HTTPError as exc:
+            # Best effort, like a WebSocket frame to a slow client
+            peer.counters["fanout_failed"] += len(payload["broadcast"]) + len(payload["users"])
+            print(f"[cluster] fan-out to {peer.url} failed: {exc!r}")
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await asyncio.sleep(self.fanout_delay)
+            await asyncio.gather(*(self._flush(peer) for peer in self.peers.values()))
+
+    async def drain(self):
+        await asyncio.gather(*(self._flush(peer) for peer in self.peers.values()))
+
+    def start(self):
+        if self.enabled and (self._worker is None or self._worker.done()):
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        await self.drain()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "node_id": self.node_id,
+            "nodes": self.nodes,
+            "coordinator": self.is_coordinator,
+            "peers": [
+                {"node_id": index, "url": peer.url, "fanout_pending": peer.pending(), **peer.counters}
+                for index, peer in self.peers.items()
+            ],
+        }
+
+
+cluster = Cluster(
+    CLUSTER_NODES,
+    node_id=CLUSTER_NODE_ID,
+    token=CLUSTER_TOKEN,
+    vnodes=CLUSTER_VNODES,
+    fanout_ms=CLUSTER_FANOUT_MS,
+    max_pending=CLUSTER_FANOUT_MAX_PENDING,
+    timeout=CLUSTER_TIMEOUT_SECONDS,
+)
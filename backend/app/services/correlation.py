@@ -1,29 +1,88 @@
-from collections import defaultdict
-from datetime import datetime, timedelta, timezone
+import sys
+import time
+from collections import OrderedDict, deque
+
+WINDOW_SECONDS = 120
+BUCKET_SECONDS = 5
+MAX_TRACKED_IPS = 50_000
+
+
+class _IpWindow:
+    __slots__ = ("buckets", "totals")
 
-class CorrelationEngine:
     def __init__(self):
-        self.activity = defaultdict(list)
+        # deque of [bucket_id, {event_type: count}], oldest first
+        self.buckets = deque()
+        self.totals = {}
+
+
+class CorrelationEngine:
+    def __init__(self, max_tracked: int = MAX_TRACKED_IPS):
+        self.max_tracked = max_tracked
+        self.activity: OrderedDict[str, _IpWindow] = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+
+    def _bucket(self) -> int:
+        return int(time.time() // BUCKET_SECONDS)
+
+    def _expire(self, window: _IpWindow, bucket: int):
+        oldest = bucket - WINDOW_SECONDS // BUCKET_SECONDS
+        while window.buckets and window.buckets[0][0] <= oldest:
+            _, counts = window.buckets.popleft()
+            for event_type, count in counts.items():
+                remaining = window.totals[event_type] - count
+                if remaining:
+                    window.totals[event_type] = remaining
+                else:
+                    del window.totals[event_type]
+
+    def _prune_idle(self, bucket: int):
+        # Least recently active IPs sit at the front; drop the ones whose
+        # window has fully expired, and anything beyond the global cap.
+        while self.activity:
+            ip, window = next(iter(self.activity.items()))
+            self._expire(window, bucket)
+            if not window.buckets:
+                self.expired += 1
+            elif len(self.activity) > self.max_tracked:
+                self.evicted += 1
+            else:
+                break
+            del self.activity[ip]
 
     def add_event(self, event):
         ip = event["ip_address"]
-        self.activity[ip].append({
-            "type": event["event_type"],
-            "time": datetime.now(timezone.utc)
-        })
+        event_type = event["event_type"]
+        bucket = self._bucket()
 
-    def evaluate(self, ip):
-        now = datetime.now(timezone.utc)
-        recent = [
-            e for e in self.activity[ip]
-            if now - e["time"] < timedelta(minutes=2)
-        ]
+        window = self.activity.get(ip)
+        if window is None:
+            window = _IpWindow()
+            self.activity[ip] = window
+        else:
+            self.activity.move_to_end(ip)
+            self._expire(window, bucket)
+
+        if window.buckets and window.buckets[-1][0] == bucket:
+            counts = window.buckets[-1][1]
+        else:
+            counts = {}
+            window.buckets.append([bucket, counts])
+        counts[event_type] = counts.get(event_type, 0) + 1
+        window.totals[event_type] = window.totals.get(event_type, 0) + 1
 
-        types = [e["type"] for e in recent]
+        self._prune_idle(bucket)
+
+    def evaluate(self, ip):
+        window = self.activity.get(ip)
+        if window is None:
+            return None
+        self._expire(window, self._bucket())
 
         # Correlation rules (simple but realistic)
-        failed_count = types.count("ssh_failed_login")
-        invalid_count = types.count("ssh_invalid_user")
+        failed_count = window.totals.get("ssh_failed_login", 0)
+        invalid_count = window.totals.get("ssh_invalid_user", 0)
 
         if failed_count >= 5:
             return {
@@ -41,5 +100,22 @@ class CorrelationEngine:
 
         return None
 
+    def stats(self) -> dict:
+        buckets = 0
+        memory = sys.getsizeof(self.activity)
+        for ip, window in self.activity.items():
+            buckets += len(window.buckets)
+            memory += sys.getsizeof(ip) + sys.getsizeof(window)
+            memory += sys.getsizeof(window.buckets) + sys.getsizeof(window.totals)
+            memory += sum(sys.getsizeof(counts) + 64 for _, counts in window.buckets)
+        return {
+            "tracked_ips": len(self.activity),
+            "max_tracked_ips": self.max_tracked,
+            "buckets": buckets,
+            "evicted_lru": self.evicted,
+            "expired_idle": self.expired,
+            "approx_bytes": memory,
+        }
+
 
 correlator = CorrelationEngine()
@@ -1,61 +1,103 @@
+import asyncio
+import time
 from datetime import datetime, timedelta, timezone
 
 from app.core.database import alerts_collection, logs_collection
+from app.core.metrics import ALERTS_TOTAL, stage
+from app.services.alert_aggregation import alert_aggregator
 from app.intel.mitre import get_mitre
-from app.services.anomaly import detect_anomaly
+from app.services.anomaly import submit_anomaly
+from app.services.cluster import cluster
 from app.ml.anomaly import anomaly_model
 from app.services.correlation import correlator
+from app.services.feature_store import feature_store
 from app.services.scoring import calculate_risk
-from app.ws.alerts import manager
 from app.services import ueba
 
 FAILED_THRESHOLD = 5
 WINDOW_MINUTES = 2
 
+_UEBA_RECORD = stage("ueba_record")
+_CORRELATOR = stage("correlator")
+_FEATURE_STORE = stage("feature_store")
+_UEBA_EVALUATE = stage("ueba_evaluate")
+_ANOMALY_WAIT = stage("anomaly_wait")
+
 
 async def broadcast_alert(alert_dict: dict):
-    await manager.broadcast({
+    await cluster.broadcast({
         "type": "new_alert",
         "data": alert_dict
     })
 
 
-async def process_event(event: dict):
-    rare_alert = await ueba.record_event(event)
+async def publish_alerts(alerts: list[dict]):
+    # Repeats of an open alert (same type and entity) update it in place
+    if not alerts:
+        return
+    for alert in alerts:
+        ALERTS_TOTAL.labels(alert.get("alert_type")).inc()
+    await alert_aggregator.publish(alerts)
+
+
+def _anomaly_alert(event: dict, anomaly_score: float) -> dict:
+    return {
+        "alert_type": "anomaly_detected",
+        "ip_address": event["ip_address"],
+        "severity": "high",
+        "description": "Abnormal activity detected from IP",
+        "anomaly_score": anomaly_score,
+        "ml_model": "isolation_forest",
+        "ml_version": anomaly_model.model_version,
+        "timestamp": datetime.now(timezone.utc)
+    }
+
+
+async def _resolve_anomaly(event: dict, pending: asyncio.Future | None) -> list[dict]:
+    if pending is None:
+        return []
+    started = time.perf_counter()
+    try:
+        is_anomaly, anomaly_score = await pending
+    except Exception as exc:
+        print(f"[ml] anomaly scoring failed: {exc}")
+        return []
+    finally:
+        _ANOMALY_WAIT.observe(time.perf_counter() - started)
+    return [_anomaly_alert(event, anomaly_score)] if is_anomaly else []
+
+
+async def _evaluate_event(event: dict) -> tuple[list[dict], dict | None, asyncio.Future | None]:
+    alerts = []
+    started = time.perf_counter()
+    profile_alerts = await ueba.record_event(event)
+    recorded = time.perf_counter()
+    _UEBA_RECORD.observe(recorded - started)
+
     correlator.add_event(event)
     result = correlator.evaluate(event["ip_address"])
+    correlated = time.perf_counter()
+    feature_store.add_event(event)
+    cluster.replicate_user(event)
+    _CORRELATOR.observe(correlated - recorded)
+    _FEATURE_STORE.observe(time.perf_counter() - correlated)
 
-    # Anomaly check
-    is_anomaly, anomaly_score = await detect_anomaly(event)
-    if is_anomaly:
-        now = datetime.now(timezone.utc)
-        alert = {
-            "alert_type": "anomaly_detected",
-            "ip_address": event["ip_address"],
-            "severity": "high",
-            "description": "Abnormal activity detected from IP",
-            "anomaly_score": anomaly_score,
-            "ml_model": "isolation_forest",
-            "ml_version": anomaly_model.model_version,
-            "timestamp": now
-        }
-
-        await alerts_collection.insert_one(alert)
-        await broadcast_alert(alert)
+    # Anomaly check: scored by the micro-batcher while the rest of the
+    # detectors run, resolved by the caller.
+    pending_anomaly = submit_anomaly(event)
 
-    if rare_alert:
-        await alerts_collection.insert_one(rare_alert)
-        await broadcast_alert(rare_alert)
+    alerts.extend(profile_alerts)
 
+    started = time.perf_counter()
     ueba_alert = await ueba.evaluate(event)
+    _UEBA_EVALUATE.observe(time.perf_counter() - started)
     if ueba_alert:
-        await alerts_collection.insert_one(ueba_alert)
-        await broadcast_alert(ueba_alert)
+        alerts.append(ueba_alert)
 
     if result:
         now = datetime.now(timezone.utc)
         event_count = result.get("count", 1)
-        risk = calculate_risk(result["incident"], event_count)
+        risk = calculate_risk(result["incident"], event_count, event.get("reputation"))
         mitre = get_mitre(result["incident"])
         severity = "high" if risk >= 8 else "medium" if risk >= 5 else "low"
 
@@ -70,11 +112,41 @@ async def process_event(event: dict):
             "description": f"{result['incident']} from {event['ip_address']}",
             "timestamp": now
         }
+        if event.get("reputation"):
+            alert["reputation"] = event["reputation"]
+        alerts.append(alert)
 
-        await alerts_collection.insert_one(alert)
-        await broadcast_alert(alert)
+        return alerts, alert, pending_anomaly
 
-        return alert
+    return alerts, None, pending_anomaly
+
+
+async def process_event(event: dict):
+    alerts, alert, pending_anomaly = await _evaluate_event(event)
+    alerts = await _resolve_anomaly(event, pending_anomaly) + alerts
+    await publish_alerts(alerts)
+    return alert
+
+
+async def process_events(events: list[dict]) -> list[dict | None]:
+    # Events are evaluated in order so per-IP state stays consistent, but
+    # anomaly scores are awaited together (one vectorized batch) and all
+    # alerts raised by the batch are written with a single insert_many.
+    results = []
+    pending = []
+    scoring = []
+    for event in events:
+        alerts, alert, pending_anomaly = await _evaluate_event(event)
+        pending.extend(alerts)
+        results.append(alert)
+        if pending_anomaly is not None:
+            scoring.append((event, pending_anomaly))
+
+    for event, pending_anomaly in scoring:
+        pending.extend(await _resolve_anomaly(event, pending_anomaly))
+
+    await publish_alerts(pending)
+    return results
 
 
 async def check_ssh_bruteforce(ip_address: str):
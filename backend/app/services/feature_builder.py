@@ -0,0 +1,226 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.core.database import logs_collection
+from app.ml.anomaly import FEATURE_NAMES
+from app.services.log_archive import log_archive, merge_streams
+from app.services.anomaly import (
+    WINDOW_1H,
+    WINDOW_24H,
+    WINDOW_2M,
+    WINDOW_5M,
+    hour_features,
+    ip_features,
+)
+from app.services.feature_store import IP_RING, USER_DAY_RING, USER_HOUR_RING, USER_SHORT_RING
+
+# Offline counterpart of anomaly.live_features over one sorted scan of the
+# training window. Windows match what the feature store answers at serving
+# time: a sample sees the logs up to and including itself, back to the start
+# of the ring bucket holding (event_time - window). Counts are sorted-array
+# searches; distinct counts take one sliding pass per feature.
+
+SCAN_BATCH_SIZE = 10_000
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+HOUR_US = 3_600_000_000
+# The longest window plus its ring bucket
+LOOKBACK = WINDOW_24H + timedelta(seconds=USER_DAY_RING[0])
+
+FAILED = 1
+SUCCESS = 2
+
+
+def _micros(delta: timedelta) -> int:
+    return delta // MICROSECOND
+
+
+class TrainingWindow:
+    # Column store for the scanned logs, sorted by event_time. Strings are
+    # factorized to int codes; -1 marks a missing/empty value, which the
+    # feature store does not track either.
+    def __init__(self):
+        self.times: list[int] = []
+        self.ips: list[int] = []
+        self.users: list[int] = []
+        self.types: list[int] = []
+        self.ip_codes: dict[str, int] = {}
+        self.user_codes: dict[str, int] = {}
+
+    def add(self, log: dict):
+        event_time = log["event_time"]
+        if event_time.tzinfo is None:
+            event_time = event_time.replace(tzinfo=timezone.utc)
+        ip = log.get("ip_address")
+        username = log.get("username")
+        event_type = log.get("event_type")
+
+        self.times.append((event_time - EPOCH) // MICROSECOND)
+        self.ips.append(self.ip_codes.setdefault(ip, len(self.ip_codes)) if ip else -1)
+        self.users.append(self.user_codes.setdefault(username, len(self.user_codes)) if username else -1)
+        self.types.append(
+            FAILED if event_type == "ssh_failed_login"
+            else SUCCESS if event_type == "ssh_success_login"
+            else 0
+        )
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+async def load_training_window(since: datetime, window: TrainingWindow | None = None,
+                               limit: int | None = None) -> TrainingWindow:
+    # Reaches back LOOKBACK before the first sample and stops at the limit-th
+    # sample, since no window extends past the sample it belongs to.
+    # Logs older than the archive age come from the cold tier, merged in
+    # event_time order with the MongoDB scan.
+    window = window if window is not None else TrainingWindow()
+    query = {"event_time": {"$gte": since - LOOKBACK}}
+    fields = {"_id": 0, "event_time": 1, "event_type": 1, "ip_address": 1, "username": 1}
+    sort = [("event_time", 1)]
+    cursor = logs_collection.find(query, fields).sort(sort).batch_size(SCAN_BATCH_SIZE)
+    stream = merge_streams(cursor, log_archive.iter_find(query, fields, sort), sort)
+
+    first_sample = (since - EPOCH) // MICROSECOND
+    samples = 0
+    try:
+        async for log in stream:
+            window.add(log)
+            if limit is not None and window.times[-1] >= first_sample:
+                samples += 1
+                if samples >= limit:
+                    break
+    finally:
+        await stream.aclose()
+        await cursor.close()
+    return window
+
+
+def _window_starts(times, bucket_seconds: int, window: timedelta):
+    # First row a ring with this bucket size still counts for a query at each
+    # row: it keeps whole buckets, back to the one holding (event_time - window)
+    bucket = bucket_seconds * 1_000_000
+    oldest = (times - _micros(window)) // bucket * bucket
+    return np.searchsorted(times, oldest, side="left")
+
+
+def _row_keys(groups, mask, stride: int):
+    # (group, row) packed into one int64 for the rows in mask, sorted by
+    # group then row (= time order)
+    rows = np.nonzero(mask)[0]
+    return np.sort(groups[rows] * stride + rows)
+
+
+def _window_counts(keys, query_groups, query_starts, query_rows, stride: int):
+    # Rows of the query's group from its window start up to the query row
+    last = np.searchsorted(keys, query_groups * stride + query_rows, side="right")
+    first = np.searchsorted(keys, query_groups * stride + query_starts, side="left")
+    return last - first
+
+
+def _window_distinct(groups, values, starts, query_rows):
+    # Distinct values (>= 0) among the rows of each query row's group from its
+    # window start up to the row itself: one pass in (group, time) order,
+    # keeping per-value counts for the current group's window
+    result = np.zeros(len(query_rows))
+    slots = np.full(len(groups), -1, dtype=np.int64)
+    slots[query_rows] = np.arange(len(query_rows))
+    order = np.nonzero(groups >= 0)[0]
+    order = order[np.argsort(groups[order], kind="stable")].tolist()
+    group_of, value_of, start_of, slot_of = groups.tolist(), values.tolist(), starts.tolist(), slots.tolist()
+
+    current = None
+    head = 0
+    counts = {}
+    for position, row in enumerate(order):
+        if group_of[row] != current:
+            current, head, counts = group_of[row], position, {}
+        value = value_of[row]
+        if value >= 0:
+            counts[value] = counts.get(value, 0) + 1
+        while order[head] < start_of[row]:
+            old = value_of[order[head]]
+            if old >= 0:
+                if counts[old] == 1:
+                    del counts[old]
+                else:
+                    counts[old] -= 1
+            head += 1
+        if slot_of[row] >= 0:
+            result[slot_of[row]] = len(counts)
+    return result
+
+
+def build_feature_matrix(window: TrainingWindow, since: datetime, limit: int | None = None) -> np.ndarray:
+    times = np.asarray(window.times, dtype=np.int64)
+    ips = np.asarray(window.ips, dtype=np.int64)
+    users = np.asarray(window.users, dtype=np.int64)
+    types = np.asarray(window.types, dtype=np.int8)
+
+    start = int(np.searchsorted(times, (since - EPOCH) // MICROSECOND, side="left"))
+    stop = len(times) if limit is None else min(len(times), start + limit)
+    sample = slice(start, stop)
+    n = stop - start
+    if not n:
+        return np.empty((0, len(FEATURE_NAMES)))
+
+    stride = len(times) + 1
+    failed = types == FAILED
+    success = types == SUCCESS
+
+    columns = {name: np.zeros(n, dtype=np.float64) for name in FEATURE_NAMES}
+    sample_times = times[sample]
+    sample_ips = ips[sample]
+    sample_users = users[sample]
+
+    hours = (sample_times // HOUR_US) % 24
+    for hour in np.unique(hours):
+        mask = hours == hour
+        for name, value in hour_features(int(hour)).items():
+            columns[name][mask] = value
+
+    has_ip = sample_ips >= 0
+    if window.ip_codes:
+        ip_rows = [ip_features(ip) for ip in window.ip_codes]
+        for name in ip_rows[0]:
+            ip_table = np.array([float(row[name]) for row in ip_rows])
+            columns[name][has_ip] = ip_table[sample_ips[has_ip]]
+
+    # Per-IP windows (one ring of IP_RING buckets)
+    q = np.nonzero(has_ip)[0]
+    rows = start + q
+    groups = ips[rows]
+    starts = _window_starts(times, IP_RING[0], WINDOW_2M)[rows]
+    in_group = ips >= 0
+    columns["failed_attempts_2m"][q] = _window_counts(_row_keys(ips, in_group & failed, stride), groups, starts, rows, stride)
+    columns["success_attempts_2m"][q] = _window_counts(_row_keys(ips, in_group & success, stride), groups, starts, rows, stride)
+    columns["event_rate_2m"][q] = _window_counts(_row_keys(ips, in_group, stride), groups, starts, rows, stride)
+    columns["unique_users_5m"][q] = _window_distinct(ips, users, _window_starts(times, IP_RING[0], WINDOW_5M), rows)
+
+    # Per-user windows (short, hour and day rings)
+    q = np.nonzero(sample_users >= 0)[0]
+    rows = start + q
+    groups = users[rows]
+    in_group = users >= 0
+    columns["unique_ips_5m"][q] = _window_distinct(users, ips, _window_starts(times, USER_SHORT_RING[0], WINDOW_5M), rows)
+
+    hour_starts = _window_starts(times, USER_HOUR_RING[0], WINDOW_1H)
+    starts = hour_starts[rows]
+    columns["user_unique_ips_1h"][q] = _window_distinct(users, ips, hour_starts, rows)
+    columns["user_event_rate_1h"][q] = _window_counts(_row_keys(users, in_group, stride), groups, starts, rows, stride)
+    columns["user_failed_1h"][q] = _window_counts(_row_keys(users, in_group & failed, stride), groups, starts, rows, stride)
+    columns["user_success_1h"][q] = _window_counts(_row_keys(users, in_group & success, stride), groups, starts, rows, stride)
+
+    starts = _window_starts(times, USER_DAY_RING[0], WINDOW_24H)[rows]
+    rate_24h = _window_counts(_row_keys(users, in_group, stride), groups, starts, rows, stride)
+    failed_24h = _window_counts(_row_keys(users, in_group & failed, stride), groups, starts, rows, stride)
+    columns["user_event_rate_24h"][q] = rate_24h
+    columns["user_failed_ratio_24h"][q] = failed_24h / np.maximum(1, rate_24h)
+
+    return np.column_stack([columns[name] for name in FEATURE_NAMES])
+
+
+async def build_training_features(since: datetime, limit: int | None = None) -> np.ndarray:
+    window = await load_training_window(since, limit=limit)
+    return build_feature_matrix(window, since, limit)
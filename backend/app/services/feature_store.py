@@ -0,0 +1,225 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from app.core.database import logs_collection
+
+MAX_ENTITIES = 100_000
+WARM_WINDOW = timedelta(hours=24)
+
+# (bucket_seconds, window_seconds) per ring. Windows are answered at bucket
+# granularity: a 2m query over 5s buckets covers at most 5s of extra history.
+IP_RING = (5, 5 * 60)
+USER_SHORT_RING = (10, 5 * 60)
+USER_HOUR_RING = (60, 60 * 60)
+USER_DAY_RING = (15 * 60, 24 * 60 * 60)
+
+
+def _ts(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class BucketRing:
+    def __init__(self, bucket_seconds: int, window_seconds: int, track_peers: bool = True):
+        self.bucket_seconds = bucket_seconds
+        self.slots = window_seconds // bucket_seconds + 1
+        self.track_peers = track_peers
+        self.ids = [-1] * self.slots
+        self.counts: list[dict | None] = [None] * self.slots
+        self.peers: list[set | None] = [None] * self.slots
+
+    def add(self, ts: float, event_type: str | None, peer: str | None):
+        bucket = int(ts // self.bucket_seconds)
+        index = bucket % self.slots
+        current = self.ids[index]
+        if current > bucket:
+            # Older than anything this ring still covers
+            return
+        if current != bucket:
+            self.ids[index] = bucket
+            self.counts[index] = {"total": 0}
+            self.peers[index] = set() if self.track_peers else None
+
+        counts = self.counts[index]
+        counts["total"] += 1
+        if event_type:
+            counts[event_type] = counts.get(event_type, 0) + 1
+        if peer and self.track_peers:
+            self.peers[index].add(peer)
+
+    def query(self, ts: float, window_seconds: int, distinct: bool = False) -> tuple[dict, set]:
+        oldest = int((ts - window_seconds) // self.bucket_seconds)
+        totals = {"total": 0}
+        peers = set()
+        for index, bucket in enumerate(self.ids):
+            if bucket < oldest:
+                continue
+            for key, value in self.counts[index].items():
+                totals[key] = totals.get(key, 0) + value
+            if distinct and self.peers[index]:
+                peers |= self.peers[index]
+        return totals, peers
+
+    def approx_bytes(self) -> int:
+        size = self.slots * 24
+        for index, bucket in enumerate(self.ids):
+            if bucket < 0:
+                continue
+            size += 64 + 48 * len(self.counts[index])
+            if self.peers[index]:
+                size += 64 + 56 * len(self.peers[index])
+        return size
+
+
+class _IpWindows:
+    __slots__ = ("ring", "last_ts")
+
+    def __init__(self):
+        self.ring = BucketRing(*IP_RING)
+        self.last_ts = 0.0
+
+
+class _UserWindows:
+    __slots__ = ("short", "hour", "day", "last_ts")
+
+    def __init__(self):
+        self.short = BucketRing(*USER_SHORT_RING)
+        self.hour = BucketRing(*USER_HOUR_RING)
+        self.day = BucketRing(*USER_DAY_RING, track_peers=False)
+        self.last_ts = 0.0
+
+
+class FeatureStore:
+    def __init__(self, max_entities: int = MAX_ENTITIES):
+        self.max_entities = max_entities
+        self.ips: OrderedDict[str, _IpWindows] = OrderedDict()
+        self.users: OrderedDict[str, _UserWindows] = OrderedDict()
+        self.warmed = False
+        self.evicted = 0
+
+    def _touch(self, table: OrderedDict, key: str, factory, ts: float, horizon: int):
+        entry = table.get(key)
+        if entry is None:
+            entry = factory()
+            table[key] = entry
+        else:
+            table.move_to_end(key)
+        entry.last_ts = max(entry.last_ts, ts)
+
+        # Front of the table is least recently updated: drop idle or excess entries
+        while table:
+            oldest_key, oldest = next(iter(table.items()))
+            if oldest is entry:
+                break
+            if len(table) <= self.max_entities and oldest.last_ts >= ts - horizon:
+                break
+            table.popitem(last=False)
+            self.evicted += 1
+        return entry
+
+    def add_event(self, event: dict):
+        self.add_ip_event(event)
+        self.add_user_event(event)
+
+    def add_ip_event(self, event: dict):
+        ip = event.get("ip_address")
+        if ip:
+            ts = _ts(event.get("event_time") or datetime.now(timezone.utc))
+            windows = self._touch(self.ips, ip, _IpWindows, ts, IP_RING[1])
+            windows.ring.add(ts, event.get("event_type"), event.get("username"))
+
+    def add_user_event(self, event: dict):
+        username = event.get("username")
+        if username:
+            ip = event.get("ip_address")
+            event_type = event.get("event_type")
+            ts = _ts(event.get("event_time") or datetime.now(timezone.utc))
+            windows = self._touch(self.users, username, _UserWindows, ts, USER_DAY_RING[1])
+            windows.short.add(ts, event_type, ip)
+            windows.hour.add(ts, event_type, ip)
+            windows.day.add(ts, event_type, None)
+
+    def window_features(self, event: dict) -> dict:
+        ts = _ts(event.get("event_time") or datetime.now(timezone.utc))
+        ip = event.get("ip_address")
+        username = event.get("username")
+
+        features = {
+            "failed_attempts_2m": 0,
+            "success_attempts_2m": 0,
+            "event_rate_2m": 0,
+            "unique_users_5m": 0,
+            "unique_ips_5m": 0,
+            "user_event_rate_1h": 0,
+            "user_failed_1h": 0,
+            "user_success_1h": 0,
+            "user_unique_ips_1h": 0,
+            "user_event_rate_24h": 0,
+            "user_failed_ratio_24h": 0,
+        }
+
+        ip_windows = self.ips.get(ip) if ip else None
+        if ip_windows:
+            counts, _ = ip_windows.ring.query(ts, 2 * 60)
+            _, users = ip_windows.ring.query(ts, 5 * 60, distinct=True)
+            features["failed_attempts_2m"] = counts.get("ssh_failed_login", 0)
+            features["success_attempts_2m"] = counts.get("ssh_success_login", 0)
+            features["event_rate_2m"] = counts["total"]
+            features["unique_users_5m"] = len(users)
+
+        user_windows = self.users.get(username) if username else None
+        if user_windows:
+            _, ips_5m = user_windows.short.query(ts, 5 * 60, distinct=True)
+            counts_1h, ips_1h = user_windows.hour.query(ts, 60 * 60, distinct=True)
+            counts_24h, _ = user_windows.day.query(ts, 24 * 60 * 60)
+            features["unique_ips_5m"] = len(ips_5m)
+            features["user_event_rate_1h"] = counts_1h["total"]
+            features["user_failed_1h"] = counts_1h.get("ssh_failed_login", 0)
+            features["user_success_1h"] = counts_1h.get("ssh_success_login", 0)
+            features["user_unique_ips_1h"] = len(ips_1h)
+            features["user_event_rate_24h"] = counts_24h["total"]
+            features["user_failed_ratio_24h"] = (
+                counts_24h.get("ssh_failed_login", 0) / max(1, counts_24h["total"])
+            )
+
+        return features
+
+    async def warm(self, window: timedelta = WARM_WINDOW, owns_ip=None) -> int:
+        # owns_ip: in partitioned mode only the owned IPs' windows are built;
+        # user windows always see every event
+        since = datetime.now(timezone.utc) - window
+        cursor = logs_collection.find(
+            {"event_time": {"$gte": since}},
+            {"event_time": 1, "event_type": 1, "ip_address": 1, "username": 1, "_id": 0}
+        ).sort("event_time", 1)
+
+        loaded = 0
+        async for log in cursor:
+            if not log.get("event_time"):
+                continue
+            if owns_ip is None or owns_ip(log.get("ip_address")):
+                self.add_event(log)
+            else:
+                self.add_user_event(log)
+            loaded += 1
+
+        self.warmed = True
+        return loaded
+
+    def stats(self) -> dict:
+        memory = sum(w.ring.approx_bytes() for w in self.ips.values())
+        memory += sum(
+            w.short.approx_bytes() + w.hour.approx_bytes() + w.day.approx_bytes()
+            for w in self.users.values()
+        )
+        return {
+            "tracked_ips": len(self.ips),
+            "tracked_users": len(self.users),
+            "evicted": self.evicted,
+            "approx_bytes": memory,
+            "warmed": self.warmed,
+        }
+
+
+feature_store = FeatureStore()
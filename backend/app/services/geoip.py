@@ -0,0 +1,168 @@
+import asyncio
+import math
+import os
+from collections import OrderedDict
+
+import maxminddb
+
+from app.core.config import GEOIP_ASN_DB, GEOIP_CACHE_SIZE, GEOIP_CITY_DB, GEOIP_RELOAD_SECONDS
+
+# GeoIP / ASN enrichment from MaxMind-format (.mmdb) files, e.g. GeoLite2-City
+# and GeoLite2-ASN. The files are memory-mapped: pages are shared with every
+# other process mapping them (cluster nodes, training workers) instead of
+# being copied onto each heap. Either file may be missing; its fields are
+# then simply absent.
+
+EARTH_RADIUS_KM = 6371.0
+_MISSING = object()
+
+
+def distance_km(a: dict, b: dict) -> float:
+    # Great-circle distance between two lookups carrying latitude/longitude
+    lat1, lon1 = math.radians(a["latitude"]), math.radians(a["longitude"])
+    lat2, lon2 = math.radians(b["latitude"]), math.radians(b["longitude"])
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+class _Database:
+    __slots__ = ("path", "reader", "mtime_ns")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.reader = None
+        self.mtime_ns = None
+
+    def refresh(self) -> bool:
+        # (Re)open when the file appears or is replaced; lookups in flight
+        # keep the reader they started with
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns if self.path else None
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns == self.mtime_ns:
+            return False
+        self.mtime_ns = mtime_ns
+        if mtime_ns is None:
+            self.reader = None
+            return True
+        try:
+            # MODE_AUTO is the C extension's mmap reader when built, else the
+            # pure-Python mmap reader; both map the file rather than read it
+            self.reader = maxminddb.open_database(self.path, maxminddb.MODE_AUTO)
+        except Exception as exc:
+            print(f"[geoip] failed to open {self.path}: {exc!r}")
+            self.reader = None
+        return True
+
+    def get(self, ip: str) -> dict | None:
+        reader = self.reader
+        if reader is None:
+            return None
+        try:
+            record = reader.get(ip)
+        except ValueError:
+            # Invalid address, or IPv6 in an IPv4-only database
+            return None
+        return record if isinstance(record, dict) else None
+
+    def database_type(self) -> str | None:
+        return self.reader.metadata().database_type if self.reader is not None else None
+
+
+class GeoIp:
+    def __init__(self, city_path: str, asn_path: str, cache_size: int = 100_000, reload_seconds: float = 300):
+        self.city = _Database(city_path)
+        self.asn = _Database(asn_path)
+        self.cache_size = cache_size
+        self.reload_seconds = reload_seconds
+        self.cache: OrderedDict[str, dict | None] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.refresh()
+
+    @property
+    def enabled(self) -> bool:
+        return self.city.reader is not None or self.asn.reader is not None
+
+    def refresh(self) -> bool:
+        changed = self.city.refresh()
+        changed = self.asn.refresh() or changed
+        if changed:
+            self.cache.clear()
+        return changed
+
+    def _resolve(self, ip: str) -> dict | None:
+        result = {}
+        city = self.city.get(ip)
+        if city:
+            country = city.get("country") or city.get("registered_country") or {}
+            location = city.get("location") or {}
+            result["country"] = country.get("iso_code")
+            result["city"] = (city.get("city") or {}).get("names", {}).get("en")
+            result["latitude"] = location.get("latitude")
+            result["longitude"] = location.get("longitude")
+            result["accuracy_km"] = location.get("accuracy_radius")
+        asn = self.asn.get(ip)
+        if asn:
+            result["asn"] = asn.get("autonomous_system_number")
+            result["as_org"] = asn.get("autonomous_system_organization")
+        return {key: value for key, value in result.items() if value is not None} or None
+
+    def lookup(self, ip: str | None) -> dict | None:
+        # Cached per IP, misses included. Callers must not mutate the result.
+        if not ip or not self.enabled:
+            return None
+        cached = self.cache.get(ip, _MISSING)
+        if cached is not _MISSING:
+            self.cache.move_to_end(ip)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        result = self._resolve(ip)
+        self.cache[ip] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def network_key(self, ip: str) -> str:
+        # Addresses of one NAT / VPN / mobile pool share an ASN; without ASN
+        # data every address is its own source
+        geo = self.lookup(ip)
+        if geo and geo.get("asn"):
+            return f"AS{geo['asn']}"
+        return ip
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            try:
+                # A stat per file; opening only maps the file, so this stays
+                # on the loop and the cache is never cleared mid-lookup
+                if self.refresh():
+                    self.reloads += 1
+                    print(f"[geoip] reloaded databases: {self.stats()['databases']}")
+            except Exception as exc:
+                print(f"[geoip] reload check failed: {exc!r}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "databases": {
+                "city": {"path": self.city.path, "type": self.city.database_type()},
+                "asn": {"path": self.asn.path, "type": self.asn.database_type()},
+            },
+            "cached": len(self.cache),
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+        }
+
+
+geoip = GeoIp(GEOIP_CITY_DB, GEOIP_ASN_DB, cache_size=GEOIP_CACHE_SIZE, reload_seconds=GEOIP_RELOAD_SECONDS)
+
+
+async def run_geoip_reloader():
+    await geoip.run()
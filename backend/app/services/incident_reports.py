@@ -0,0 +1,287 @@
+import asyncio
+import html
+import json
+import re
+import zipfile
+from datetime import datetime, timedelta, timezone
+from ipaddress import ip_address
+
+from app.core.database import logs_collection
+from app.services.geoip import geoip
+from app.services.ip_reputation import ip_reputation
+from app.services.log_archive import log_archive, merge_docs
+from app.services.remediation import recommend_actions
+from app.services.threat_intel import lookup_ip, threat_intel
+
+TIMELINE_WINDOW = timedelta(minutes=30)
+TIMELINE_LIMIT = 200
+
+KILL_CHAIN_ALL = [
+    "Reconnaissance",
+    "Discovery",
+    "Credential Access",
+    "Lateral Movement",
+    "Exfiltration",
+    "Impact"
+]
+
+
+def incident_last_seen(incident: dict) -> datetime | None:
+    last_seen = incident.get("last_seen") or incident.get("timestamp")
+    if last_seen and last_seen.tzinfo is None:
+        last_seen = last_seen.replace(tzinfo=timezone.utc)
+    return last_seen
+
+
+def _enrichment(ip: str | None) -> dict:
+    if not ip:
+        return {}
+    try:
+        addr = ip_address(ip)
+    except ValueError:
+        return {"ip": ip}
+    return {
+        "ip": ip,
+        "is_private": addr.is_private,
+        "is_reserved": addr.is_reserved,
+        "is_global": addr.is_global,
+        "reputation": ip_reputation.lookup(ip),
+        "geo": geoip.lookup(ip)
+    }
+
+
+async def build_report(incident: dict, live_intel: bool = True) -> dict:
+    # Everything /details shows for one incident. Bulk exports pass
+    # live_intel=False and only include threat intel that is already cached.
+    incident["_id"] = str(incident["_id"])
+
+    last_seen = incident_last_seen(incident)
+    if not last_seen:
+        return {"incident": incident, "timeline": [], "graph": {"nodes": [], "edges": []}}
+
+    window_start = last_seen - TIMELINE_WINDOW
+    ip = incident.get("ip_address")
+
+    query = {"ip_address": ip, "event_time": {"$gte": window_start}}
+    fields = {"event_time": 1, "event_type": 1, "username": 1, "ip_address": 1, "message": 1}
+    sort = [("event_time", 1)]
+    logs = await logs_collection.find(query, fields).sort(sort).limit(TIMELINE_LIMIT).to_list(None)
+    # Older incidents may have their logs in the cold tier
+    logs = merge_docs(logs, await log_archive.find(query, fields, sort, TIMELINE_LIMIT), sort, TIMELINE_LIMIT)
+
+    timeline = []
+    users = set()
+    counts = {"failed": 0, "invalid": 0, "success": 0, "total": 0}
+
+    for log in logs:
+        counts["total"] += 1
+        if log.get("event_type") == "ssh_failed_login":
+            counts["failed"] += 1
+        elif log.get("event_type") == "ssh_invalid_user":
+            counts["invalid"] += 1
+        elif log.get("event_type") == "ssh_success_login":
+            counts["success"] += 1
+
+        if log.get("username"):
+            users.add(log["username"])
+
+        timeline.append({
+            "time": log.get("event_time"),
+            "event_type": log.get("event_type"),
+            "username": log.get("username"),
+            "ip_address": log.get("ip_address"),
+            "message": log.get("message")
+        })
+
+    nodes = [{"id": ip, "type": "ip"}]
+    edges = []
+    for user in sorted(users):
+        nodes.append({"id": user, "type": "user"})
+        edges.append({"from": user, "to": ip, "type": "auth"})
+
+    summary = (
+        f"Window 30m: total={counts['total']}, failed={counts['failed']}, "
+        f"invalid={counts['invalid']}, success={counts['success']}."
+    )
+
+    enrichment = _enrichment(ip)
+
+    intel = {}
+    if ip and enrichment.get("is_private") is False:
+        intel = await lookup_ip(ip) if live_intel else (threat_intel.cached(ip) or {})
+
+    recommendations = recommend_actions(
+        incident.get("incident"),
+        counts,
+        enrichment
+    )
+
+    return {
+        "incident": incident,
+        "summary": summary,
+        "counts": counts,
+        "timeline": timeline,
+        "graph": {"nodes": nodes, "edges": edges},
+        "enrichment": enrichment,
+        "threat_intel": intel,
+        "recommendations": recommendations,
+        "kill_chain_stage": incident.get("kill_chain_stage"),
+        "kill_chain_all": KILL_CHAIN_ALL
+    }
+
+
+def _header_fields(report: dict) -> list[tuple[str, str]]:
+    incident = report["incident"]
+    last_seen = incident_last_seen(incident)
+    return [
+        ("Incident Key", incident.get("incident_key", "-")),
+        ("Incident", incident.get("incident", "-")),
+        ("IP", incident.get("ip_address", "-")),
+        ("Severity", incident.get("severity", "-")),
+        ("Risk Score", incident.get("risk_score", "-")),
+        ("Kill Chain", incident.get("kill_chain_stage", "-")),
+        ("Last Seen (UTC)", last_seen.isoformat() if last_seen else "-"),
+    ]
+
+
+def _time(value) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value or "-")
+
+
+def render_text(report: dict) -> str:
+    lines = ["SentinelAI Incident Report"]
+    lines += [f"{label}: {value}" for label, value in _header_fields(report)]
+    lines += ["", "Summary:", report["incident"].get("description", "-")]
+
+    if report.get("summary"):
+        lines += ["", report["summary"]]
+    if report.get("recommendations"):
+        lines += ["", "Recommendations:"]
+        lines += [f"- {action}" for action in report["recommendations"]]
+    if report.get("timeline"):
+        lines += ["", "Timeline:"]
+        lines += [
+            f"{_time(entry['time'])}  {entry.get('event_type') or '-'}  "
+            f"{entry.get('username') or '-'}  {entry.get('message') or ''}"
+            for entry in report["timeline"]
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def _esc(value) -> str:
+    return html.escape(str(value))
+
+
+def render_html(report: dict) -> str:
+    fields = "\n".join(
+        f"<p><strong>{_esc(label)}:</strong> {_esc(value)}</p>" for label, value in _header_fields(report)
+    )
+    parts = [f"""<!doctype html>
+<html>
+<head><meta charset="utf-8"><title>SentinelAI Incident Report</title></head>
+<body style="font-family: Arial, sans-serif;">
+<h1>SentinelAI Incident Report</h1>
+{fields}
+<h3>Summary</h3>
+<p>{_esc(report["incident"].get("description", "-"))}</p>"""]
+
+    if report.get("summary"):
+        parts.append(f"<p>{_esc(report['summary'])}</p>")
+    if report.get("recommendations"):
+        items = "".join(f"<li>{_esc(action)}</li>" for action in report["recommendations"])
+        parts.append(f"<h3>Recommendations</h3>\n<ul>{items}</ul>")
+    if report.get("timeline"):
+        rows = "".join(
+            f"<tr><td>{_esc(_time(entry['time']))}</td><td>{_esc(entry.get('event_type') or '-')}</td>"
+            f"<td>{_esc(entry.get('username') or '-')}</td><td>{_esc(entry.get('message') or '')}</td></tr>"
+            for entry in report["timeline"]
+        )
+        parts.append(f"<h3>Timeline</h3>\n<table>{rows}</table>")
+    parts.append("</body>\n</html>")
+    return "\n".join(parts)
+
+
+# Bulk export ---------------------------------------------------------------
+
+EXPORT_BATCH_SIZE = 100
+EXPORT_CONCURRENCY = 16
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _file_name(key: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", key).strip("_") or "incident"
+
+
+async def iter_reports(cursor):
+    # Reports are built a few at a time as the incident cursor advances, so
+    # only EXPORT_CONCURRENCY reports are held in memory at once
+    chunk = []
+    async for incident in cursor:
+        chunk.append(incident)
+        if len(chunk) >= EXPORT_CONCURRENCY:
+            for report in await asyncio.gather(*(build_report(inc, live_intel=False) for inc in chunk)):
+                yield report
+            chunk = []
+    if chunk:
+        for report in await asyncio.gather(*(build_report(inc, live_intel=False) for inc in chunk)):
+            yield report
+
+
+async def export_ndjson(cursor):
+    async for report in iter_reports(cursor):
+        yield json.dumps(report, default=_json_default) + "\n"
+
+
+class _ZipSink:
+    # Write-only file object for zipfile. It has no seek, so zipfile writes
+    # data descriptors and never rewinds; drain() hands out the bytes written
+    # since the last call.
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+async def export_zip(cursor, manifest: dict):
+    # One .txt and one .json per incident, streamed entry by entry. Only
+    # zipfile's central directory records (well under 1KB per entry) are kept
+    # until the archive is closed.
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED)
+    names = set()
+    count = 0
+
+    async for report in iter_reports(cursor):
+        name = _file_name(report["incident"].get("incident_key") or report["incident"]["_id"])
+        if name in names:
+            name = f"{name}-{report['incident']['_id']}"
+        names.add(name)
+
+        archive.writestr(f"incidents/{name}.txt", render_text(report))
+        archive.writestr(f"incidents/{name}.json", json.dumps(report, default=_json_default, indent=2))
+        count += 1
+        yield sink.drain()
+
+    archive.writestr("manifest.json", json.dumps({**manifest, "incidents": count}, default=_json_default, indent=2))
+    archive.close()
+    yield sink.drain()
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from datetime import datetime, timezone, tzinfo
+
+from app.core.metrics import EVENTS_TOTAL, count_mongo_ops, ops_per_event, stage
+from app.ml.severity import infer_severity
+from app.services.cluster import cluster
+from app.services.geoip import geoip
+from app.services.ip_reputation import ip_reputation
+from app.services.parser import parse_auth_logs
+from app.services.pipeline import detection_pipeline
+from app.services.storage import save_log, save_logs
+
+
+_PARSE = stage("parse")
+_STORE = stage("store")
+_STORE_OPS = ops_per_event("store")
+_UNRECOGNIZED = EVENTS_TOTAL.labels("unrecognized")
+_HANDOFF_FAILED = EVENTS_TOTAL.labels("handoff_failed")
+
+
+class PipelineSaturated(Exception):
+    pass
+
+
+def prepare_event(parsed: dict, now: datetime) -> dict:
+    parsed["event_time"] = parsed.get("event_time") or now
+    parsed["ingested_at"] = now
+    parsed["timestamp"] = now
+    parsed["severity"] = infer_severity(parsed)
+    reputation = ip_reputation.lookup(parsed.get("ip_address"))
+    if reputation:
+        parsed["reputation"] = reputation
+    geo = geoip.lookup(parsed.get("ip_address"))
+    if geo:
+        # The cached lookup is shared; each document gets its own copy
+        parsed["geo"] = dict(geo)
+    return parsed
+
+
+async def ensure_capacity(events: list[dict]):
+    # Checked before persisting so a rejected batch is never stored: the local
+    # queues for locally owned events, each owner's queues for the rest
+    local, remote = cluster.split([event for event in events if event.get("ip_address")])
+    if not detection_pipeline.can_accept(local):
+        detection_pipeline.reject(len(events))
+        raise PipelineSaturated()
+    if remote:
+        accepted = await asyncio.gather(*(cluster.has_capacity(node, batch) for node, batch in remote.items()))
+        if not all(accepted):
+            detection_pipeline.reject(len(events))
+            raise PipelineSaturated()
+
+
+async def queue_detection(events: list[dict]) -> tuple[int, int]:
+    # Returns (queued, failed). Runs after the logs are stored, so a failed
+    # hand-off is reported rather than raised: a retry would store the batch
+    # again and detect it twice.
+    local, remote = cluster.split([event for event in events if event.get("ip_address")])
+    for event in local:
+        detection_pipeline.submit(event)
+    if not remote:
+        return len(local), 0
+    forwarded = await asyncio.gather(*(cluster.forward(node, batch) for node, batch in remote.items()))
+    failed = sum(len(batch) - queued for queued, batch in zip(forwarded, remote.values()))
+    if failed:
+        # An owner filled up or became unreachable after the capacity check
+        _HANDOFF_FAILED.inc(failed)
+        print(f"[ingest] {failed} stored events were not handed off for detection")
+    return len(local) + sum(forwarded), failed
+
+
+async def ingest_event(parsed: dict) -> tuple[str, str]:
+    event = prepare_event(parsed, datetime.now(timezone.utc))
+    await ensure_capacity([event])
+    started = time.perf_counter()
+    with count_mongo_ops(_STORE_OPS, 1):
+        log_id = await save_log(event)
+    _STORE.observe(time.perf_counter() - started)
+    queued, failed = await queue_detection([event])
+    return log_id, "queued" if queued else "failed" if failed else "skipped"
+
+
+def parse_lines(lines: list[str], now: datetime, tz: tzinfo | None = None) -> tuple[list[dict], list[dict]]:
+    started = time.perf_counter()
+    results = []
+    events = []
+    for index, parsed in enumerate(parse_auth_logs(lines, tz)):
+        if not parsed:
+            results.append({"index": index, "status": "unrecognized", "log_id": None})
+            continue
+        events.append(prepare_event(parsed, now))
+        results.append({"index": index, "status": "stored", "log_id": None})
+    _PARSE.observe(time.perf_counter() - started)
+    _UNRECOGNIZED.inc(len(results) - len(events))
+    return events, results
+
+
+async def store_lines(lines: list[str], tz: tzinfo | None = None) -> int:
+    # Storage only (bulk imports of history): no detection hand-off
+    events, _ = parse_lines(lines, datetime.now(timezone.utc), tz)
+    return len(await save_logs(events))
+
+
+async def ingest_lines(lines: list[str], tz: tzinfo | None = None) -> dict:
+    # Shared by the HTTP batch endpoint and the syslog listener: one parse
+    # pass, one insert_many, then hand-off to the detection pipeline
+    events, results = parse_lines(lines, datetime.now(timezone.utc), tz)
+
+    await ensure_capacity(events)
+    started = time.perf_counter()
+    with count_mongo_ops(_STORE_OPS, len(events)):
+        log_ids = await save_logs(events)
+    _STORE.observe(time.perf_counter() - started)
+    stored = [r for r in results if r["status"] == "stored"]
+    for result, log_id in zip(stored, log_ids):
+        result["log_id"] = log_id
+    queued, failed = await queue_detection(events)
+
+    return {
+        "received": len(lines),
+        "stored": len(log_ids),
+        "unrecognized": len(lines) - len(log_ids),
+        "queued_for_detection": queued,
+        "detection_failed": failed,
+        "results": results
+    }
@@ -0,0 +1,275 @@
+import asyncio
+import csv
+import time
+from array import array
+from bisect import bisect_right
+from ipaddress import ip_address, ip_network
+from pathlib import Path
+
+from app.core.config import REPUTATION_DIR, REPUTATION_RELOAD_SECONDS
+
+# Local IP reputation from CIDR lists on disk:
+#   REPUTATION_DIR/block/<name>.{txt,csv,...}   e.g. tor_exits, scanners
+#   REPUTATION_DIR/allow/<name>.{txt,csv,...}   e.g. corp_vpn
+# Each file is one list named after its stem. Plain files hold one IP or CIDR
+# per line (anything after it, or after '#', is ignored); CSV files use the
+# first column and may have a header row.
+#
+# All lists are flattened into one sorted array of disjoint address ranges
+# per IP version, each carrying a bitmask of the lists covering it, so a
+# lookup is one bisect. An allowlist match wins over any blocklist match.
+
+KINDS = ("block", "allow")
+MAX_LISTS = 64
+
+
+def _network(token: str):
+    try:
+        return ip_network(token.strip(), strict=False)
+    except ValueError:
+        return None
+
+
+def _plain_tokens(handle):
+    for line in handle:
+        fields = line.split("#", 1)[0].split()
+        yield fields[0] if fields else ""
+
+
+def _read_list(path: Path) -> tuple[list, int]:
+    networks = []
+    invalid = 0
+    is_csv = path.suffix.lower() == ".csv"
+    with open(path, newline="", encoding="utf-8", errors="replace") as handle:
+        tokens = (row[0] if row else "" for row in csv.reader(handle)) if is_csv else _plain_tokens(handle)
+        for index, token in enumerate(tokens):
+            if not token.strip() or token.lstrip().startswith("#"):
+                continue
+            network = _network(token)
+            if network is None:
+                # A CSV header is not an error
+                if not (is_csv and index == 0):
+                    invalid += 1
+                continue
+            networks.append(network)
+    return networks, invalid
+
+
+def _merge(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    # Overlapping and adjacent ranges of one list collapse into one
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _flatten(per_list: list[list[tuple[int, int]]]) -> tuple[list[int], list[int], list[int]]:
+    # Sweep over every list's range boundaries; each bit is added once and
+    # removed once per range since a list's own ranges no longer overlap
+    events: dict[int, int] = {}
+    adds: dict[int, int] = {}
+    for bit_index, ranges in enumerate(per_list):
+        bit = 1 << bit_index
+        for start, end in ranges:
+            adds[start] = adds.get(start, 0) | bit
+            events[end + 1] = events.get(end + 1, 0) | bit
+    starts, ends, masks = [], [], []
+    mask = 0
+    points = sorted(set(adds) | set(events))
+    for position, following in zip(points, points[1:] + [None]):
+        mask = (mask & ~events.get(position, 0)) | adds.get(position, 0)
+        if not mask or following is None:
+            continue
+        if masks and masks[-1] == mask and ends[-1] + 1 == position:
+            ends[-1] = following - 1
+        else:
+            starts.append(position)
+            ends.append(following - 1)
+            masks.append(mask)
+    return starts, ends, masks
+
+
+class _Table:
+    # Disjoint [start, end] ranges of one IP version, sorted by start
+    __slots__ = ("starts", "ends", "masks")
+
+    def __init__(self, starts, ends, masks, typecode: str | None):
+        if typecode:
+            self.starts = array(typecode, starts)
+            self.ends = array(typecode, ends)
+        else:
+            # IPv6 addresses do not fit a machine word
+            self.starts = starts
+            self.ends = ends
+        self.masks = array("Q", masks)
+
+    def find(self, value: int) -> int:
+        index = bisect_right(self.starts, value) - 1
+        if index >= 0 and value <= self.ends[index]:
+            return self.masks[index]
+        return 0
+
+    def __len__(self):
+        return len(self.starts)
+
+
+class _Snapshot:
+    # Immutable index built from one read of the list files; replaced as a
+    # whole on reload so lookups never see a half-built index
+    __slots__ = ("lists", "allow_mask", "v4", "v6", "entries", "invalid", "loaded_at", "build_seconds", "_verdicts")
+
+    def __init__(self, lists: list[tuple[str, str]], networks: list[list], invalid: int):
+        self.lists = lists
+        self.allow_mask = sum(1 << i for i, (kind, _) in enumerate(lists) if kind == "allow")
+        self.entries = sum(len(nets) for nets in networks)
+        self.invalid = invalid
+        started = time.perf_counter()
+        tables = {}
+        for version, typecode in ((4, "L"), (6, None)):
+            per_list = [
+                _merge([(int(net.network_address), int(net.broadcast_address)) for net in nets if net.version == version])
+                for nets in networks
+            ]
+            tables[version] = _Table(*_flatten(per_list), typecode)
+        self.v4 = tables[4]
+        self.v6 = tables[6]
+        self.build_seconds = time.perf_counter() - started
+        self.loaded_at = time.time()
+        self._verdicts: dict[int, tuple[str, tuple]] = {}
+
+    def _verdict(self, mask: int) -> tuple[str, tuple]:
+        verdict = self._verdicts.get(mask)
+        if verdict is None:
+            names = tuple(name for i, (_, name) in enumerate(self.lists) if mask >> i & 1)
+            verdict = ("allow" if mask & self.allow_mask else "block", names)
+            self._verdicts[mask] = verdict
+        return verdict
+
+    def lookup(self, ip: str | None) -> dict | None:
+        if not ip or not self.lists:
+            return None
+        try:
+            addr = ip_address(ip)
+        except ValueError:
+            return None
+        if addr.version == 6 and addr.ipv4_mapped:
+            addr = addr.ipv4_mapped
+        table = self.v4 if addr.version == 4 else self.v6
+        mask = table.find(int(addr))
+        if not mask:
+            return None
+        verdict, names = self._verdict(mask)
+        return {"verdict": verdict, "lists": list(names)}
+
+
+class IpReputation:
+    def __init__(self, directory: str, reload_seconds: float):
+        self.directory = Path(directory)
+        self.reload_seconds = reload_seconds
+        self.snapshot = _Snapshot([], [], 0)
+        self.signature = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error = None
+        self.lookups = 0
+        self.hits = 0
+        self.load()
+
+    def _files(self) -> list[tuple[str, Path]]:
+        files = []
+        for kind in KINDS:
+            folder = self.directory / kind
+            if not folder.is_dir():
+                continue
+            for path in sorted(folder.iterdir()):
+                if path.is_file() and not path.name.startswith("."):
+                    files.append((kind, path))
+        return files
+
+    def _signature(self) -> tuple:
+        signature = []
+        for kind, path in self._files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            signature.append((kind, path.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _build(self) -> _Snapshot:
+        files = self._files()
+        if len(files) > MAX_LISTS:
+            raise ValueError(f"{len(files)} reputation lists, at most {MAX_LISTS} are supported")
+        lists, networks, invalid = [], [], 0
+        for kind, path in files:
+            nets, bad = _read_list(path)
+            lists.append((kind, path.stem))
+            networks.append(nets)
+            invalid += bad
+        return _Snapshot(lists, networks, invalid)
+
+    def load(self) -> bool:
+        # Blocking; used at startup and by the reloader (in a thread)
+        signature = self._signature()
+        if signature == self.signature:
+            return False
+        try:
+            snapshot = self._build()
+        except Exception as exc:
+            # Keep serving the previous lists; retried once the files change
+            self.reload_errors += 1
+            self.last_error = repr(exc)
+            self.signature = signature
+            print(f"[reputation] reload failed, keeping previous lists: {exc!r}")
+            return False
+        self.snapshot = snapshot
+        self.signature = signature
+        self.reloads += 1
+        self.last_error = None
+        return True
+
+    def lookup(self, ip: str | None) -> dict | None:
+        self.lookups += 1
+        result = self.snapshot.lookup(ip)
+        if result is not None:
+            self.hits += 1
+        return result
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            try:
+                if await asyncio.to_thread(self.load):
+                    snapshot = self.snapshot
+                    print(f"[reputation] reloaded {len(snapshot.lists)} lists, {snapshot.entries} entries")
+            except Exception as exc:
+                print(f"[reputation] reload check failed: {exc!r}")
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "directory": str(self.directory),
+            "lists": [{"kind": kind, "name": name} for kind, name in snapshot.lists],
+            "entries": snapshot.entries,
+            "invalid_lines": snapshot.invalid,
+            "ranges_v4": len(snapshot.v4),
+            "ranges_v6": len(snapshot.v6),
+            "build_seconds": round(snapshot.build_seconds, 4),
+            "loaded_at": snapshot.loaded_at,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+            "lookups": self.lookups,
+            "hits": self.hits,
+        }
+
+
+ip_reputation = IpReputation(REPUTATION_DIR, REPUTATION_RELOAD_SECONDS)
+
+
+async def run_reputation_reloader():
+    await ip_reputation.run()
@@ -0,0 +1,551 @@
+import asyncio
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from functools import reduce
+from operator import and_, or_
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.core.config import (
+    LOG_ARCHIVE_AFTER_DAYS,
+    LOG_ARCHIVE_BATCH_SIZE,
+    LOG_ARCHIVE_COMPRESSION,
+    LOG_ARCHIVE_DIR,
+    LOG_ARCHIVE_INTERVAL_MINUTES,
+    LOG_ARCHIVE_IP_BUCKETS,
+    LOG_ARCHIVE_ROW_GROUP_SIZE,
+)
+from app.core.database import logs_collection
+from app.core.metrics import Counter, stage
+
+# Cold tier for logs_collection. Whole days of logs ingested before the
+# archive age are written to Parquet segments (day=<ingest day>/bucket=<ip
+# hash>/), listed in manifest.json with their time ranges, and only then
+# deleted from MongoDB. Readers take the Mongo filters the hot paths already
+# build, skip segments by time range and IP bucket, let row-group statistics
+# skip the rest, and merge the result with the hot cursor.
+
+TIME_TYPE = pa.timestamp("us", tz="UTC")
+SCHEMA = pa.schema([
+    ("_id", pa.string()),
+    ("timestamp", TIME_TYPE),
+    ("event_time", TIME_TYPE),
+    ("ingested_at", TIME_TYPE),
+    ("ip_address", pa.string()),
+    ("username", pa.string()),
+    ("event_type", pa.string()),
+    ("severity", pa.string()),
+    ("source", pa.string()),
+    ("message", pa.string()),
+    # Any other parser fields (service, logon_type, ...) as a JSON object
+    ("extra", pa.string()),
+])
+COLUMNS = [name for name in SCHEMA.names if name != "extra"]
+TIME_FIELDS = {"timestamp", "event_time", "ingested_at"}
+# Fields whose per-segment range is kept in the manifest
+RANGE_FIELDS = ("timestamp", "event_time")
+MANIFEST = "manifest.json"
+
+# The feature store and anomaly features look back 24h; those windows must
+# always be served by the hot tier
+MIN_AGE = timedelta(days=2)
+DELETE_CHUNK = 5000
+READ_CHUNK_ROWS = 5000
+
+LOGS_ARCHIVED = Counter("sentinel_logs_archived_total", "Logs moved from MongoDB to the cold tier").labels()
+_ARCHIVE_READ = stage("archive_read")
+
+
+def _utc(value: datetime | None) -> datetime | None:
+    if value is None:
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def ip_bucket(ip: str | None, buckets: int) -> int:
+    return zlib.crc32((ip or "").encode()) % buckets
+
+
+# Mongo filter -> Arrow expression ---------------------------------------------
+
+def _value(field: str, value):
+    if isinstance(value, ObjectId):
+        # Hex strings of ObjectIds sort in the same order as the ids
+        return str(value)
+    if field in TIME_FIELDS and isinstance(value, datetime):
+        return pa.scalar(_utc(value), type=TIME_TYPE)
+    return value
+
+
+_OPERATORS = {
+    "$eq": lambda column, value: column == value,
+    "$ne": lambda column, value: column != value,
+    "$gt": lambda column, value: column > value,
+    "$gte": lambda column, value: column >= value,
+    "$lt": lambda column, value: column < value,
+    "$lte": lambda column, value: column <= value,
+    "$in": lambda column, value: column.isin(value),
+}
+
+
+def to_expression(query: dict):
+    # Covers what the log queries use: equality, ranges, $in, $and and $or
+    parts = []
+    for field, condition in query.items():
+        if field in ("$and", "$or"):
+            branches = [to_expression(branch) for branch in condition]
+            if any(branch is None for branch in branches):
+                if field == "$or":
+                    continue
+                branches = [branch for branch in branches if branch is not None]
+            if branches:
+                parts.append(reduce(and_ if field == "$and" else or_, branches))
+            continue
+        if field not in SCHEMA.names:
+            raise ValueError(f"archived logs cannot be filtered on {field}")
+        column = ds.field(field)
+        if isinstance(condition, dict):
+            for operator, value in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"archived logs do not support {operator}")
+                if operator == "$in":
+                    value = [_value(field, item) for item in value]
+                else:
+                    value = _value(field, value)
+                parts.append(_OPERATORS[operator](column, value))
+        else:
+            parts.append(column == _value(field, condition))
+    return reduce(and_, parts) if parts else None
+
+
+def _bounds(query: dict, field: str) -> tuple[datetime | None, datetime | None]:
+    # Inclusive [lower, upper] a matching row's field must fall in; None is
+    # unbounded. Only used to skip segments, so over-approximating is fine.
+    lower = upper = None
+    condition = query.get(field)
+    if isinstance(condition, datetime):
+        lower = upper = _utc(condition)
+    elif isinstance(condition, dict):
+        for operator in ("$gt", "$gte", "$eq"):
+            if isinstance(condition.get(operator), datetime):
+                lower = _utc(condition[operator])
+        for operator in ("$lt", "$lte", "$eq"):
+            if isinstance(condition.get(operator), datetime):
+                upper = _utc(condition[operator])
+    for branch_query in query.get("$and", []):
+        branch_lower, branch_upper = _bounds(branch_query, field)
+        if branch_lower and (lower is None or branch_lower > lower):
+            lower = branch_lower
+        if branch_upper and (upper is None or branch_upper < upper):
+            upper = branch_upper
+    if query.get("$or"):
+        # The union of the branches, intersected with the rest of the query
+        branches = [_bounds(branch_query, field) for branch_query in query["$or"]]
+        if all(branch_lower for branch_lower, _ in branches):
+            branch_lower = min(branch_lower for branch_lower, _ in branches)
+            lower = branch_lower if lower is None else max(lower, branch_lower)
+        if all(branch_upper for _, branch_upper in branches):
+            branch_upper = max(branch_upper for _, branch_upper in branches)
+            upper = branch_upper if upper is None else min(upper, branch_upper)
+    return lower, upper
+
+
+# Hot/cold merging -------------------------------------------------------------
+
+def _sort_key(sort: list[tuple[str, int]]):
+    fields = [field for field, _ in sort]
+    return lambda doc: tuple(doc.get(field) for field in fields)
+
+
+def merge_docs(first: list[dict], second: list[dict], sort: list[tuple[str, int]], limit: int | None = None) -> list[dict]:
+    # Both lists already sorted by sort (one direction for every field)
+    if not second:
+        return first[:limit] if limit is not None else first
+    merged = sorted(first + second, key=_sort_key(sort), reverse=sort[0][1] < 0)
+    return merged[:limit] if limit is not None else merged
+
+
+async def merge_streams(first, second, sort: list[tuple[str, int]]):
+    # Two async iterators, each sorted by sort, as one sorted stream
+    key = _sort_key(sort)
+    descending = sort[0][1] < 0
+    first, second = aiter(first), aiter(second)
+    a = await anext(first, None)
+    b = await anext(second, None)
+    while a is not None and b is not None:
+        if (key(b) > key(a)) if descending else (key(b) < key(a)):
+            yield b
+            b = await anext(second, None)
+        else:
+            yield a
+            a = await anext(first, None)
+    while a is not None:
+        yield a
+        a = await anext(first, None)
+    while b is not None:
+        yield b
+        b = await anext(second, None)
+
+
+# Segments ---------------------------------------------------------------------
+
+class _Segment:
+    __slots__ = ("path", "day", "bucket", "rows", "bytes", "ranges", "state")
+
+    def __init__(self, path: str, day: str, bucket: int, rows: int, size: int, ranges: dict, state: str):
+        self.path = path
+        self.day = day
+        self.bucket = bucket
+        self.rows = rows
+        self.bytes = size
+        self.ranges = ranges
+        self.state = state
+
+    @classmethod
+    def from_json(cls, entry: dict) -> "_Segment":
+        ranges = {
+            field: tuple(datetime.fromisoformat(value) if value else None for value in entry["ranges"].get(field, (None, None)))
+            for field in RANGE_FIELDS
+        }
+        return cls(entry["path"], entry["day"], entry["bucket"], entry["rows"], entry["bytes"], ranges, entry["state"])
+
+    def to_json(self) -> dict:
+        return {
+            "path": self.path,
+            "day": self.day,
+            "bucket": self.bucket,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "ranges": {
+                field: [value.isoformat() if value else None for value in bounds]
+                for field, bounds in self.ranges.items()
+            },
+            "state": self.state,
+        }
+
+    def overlaps(self, field: str, lower: datetime | None, upper: datetime | None) -> bool:
+        low, high = self.ranges.get(field, (None, None))
+        if low is None or high is None:
+            # Segment holds no values for the field
+            return lower is None and upper is None
+        return (lower is None or high >= lower) and (upper is None or low <= upper)
+
+
+def _row(doc: dict) -> dict:
+    row = {name: doc.get(name) for name in COLUMNS}
+    row["_id"] = str(doc["_id"])
+    for field in TIME_FIELDS:
+        row[field] = _utc(row[field]) if isinstance(row[field], datetime) else None
+    extra = {key: value for key, value in doc.items() if key not in SCHEMA.names}
+    row["extra"] = json.dumps(extra, default=str) if extra else None
+    return row
+
+
+def _doc(row: dict, extra_fields: set | None) -> dict:
+    # Stored logs always carry the fixed columns (None included), as the
+    # parser and prepare_event set all of them
+    extra = row.pop("extra", None)
+    doc = row
+    if "_id" in doc:
+        try:
+            doc["_id"] = ObjectId(doc["_id"])
+        except InvalidId:
+            pass
+    if extra:
+        for key, value in json.loads(extra).items():
+            if extra_fields is None or key in extra_fields:
+                doc[key] = value
+    return doc
+
+
+def _columns(projection: dict | None) -> tuple[list[str], set | None]:
+    # Arrow columns to read and the extra (JSON) fields to keep; None keeps all
+    if not projection:
+        return SCHEMA.names, None
+    included = [name.split(".")[0] for name, flag in projection.items() if flag and name != "_id"]
+    columns = [name for name in COLUMNS if name in included]
+    if projection.get("_id", 1):
+        columns.insert(0, "_id")
+    extra_fields = {name for name in included if name not in SCHEMA.names}
+    if extra_fields:
+        columns.append("extra")
+    return columns, extra_fields
+
+
+class LogArchive:
+    def __init__(self, root: str, after_days: float = 30, buckets: int = 16, batch_size: int = 50_000,
+                 row_group_size: int = 16384, compression: str = "zstd"):
+        self.root = Path(root)
+        self.after = timedelta(days=after_days) if after_days > 0 else None
+        if self.after is not None and self.after < MIN_AGE:
+            print(f"[archive] LOG_ARCHIVE_AFTER_DAYS raised to {MIN_AGE.days}: detection windows read the last 24h")
+            self.after = MIN_AGE
+        self.buckets = max(1, buckets)
+        self.batch_size = max(1, batch_size)
+        self.row_group_size = row_group_size
+        self.compression = compression
+
+        self.segments: list[_Segment] = []
+        self._manifest_mtime = None
+        self._lock = asyncio.Lock()
+
+        self.runs = 0
+        self.archived = 0
+        self.reads = 0
+        self.segments_read = 0
+        self.last_run = None
+
+    # Manifest -----------------------------------------------------------------
+
+    def _refresh(self):
+        # Picks up segments another node archived into a shared directory
+        try:
+            mtime = (self.root / MANIFEST).stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        manifest = json.loads((self.root / MANIFEST).read_text())
+        if manifest.get("ip_buckets", self.buckets) != self.buckets:
+            print(f"[archive] keeping {manifest['ip_buckets']} IP buckets from the existing archive")
+            self.buckets = manifest["ip_buckets"]
+        self.segments = [_Segment.from_json(entry) for entry in manifest["segments"]]
+        self._manifest_mtime = mtime
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        manifest = {"version": 1, "ip_buckets": self.buckets, "segments": [s.to_json() for s in self.segments]}
+        tmp = self.root / f"{MANIFEST}.tmp"
+        tmp.write_text(json.dumps(manifest))
+        os.replace(tmp, self.root / MANIFEST)
+        self._manifest_mtime = (self.root / MANIFEST).stat().st_mtime_ns
+
+    # Writing ------------------------------------------------------------------
+
+    def _write(self, docs: list[dict], run_id: str) -> list[_Segment]:
+        groups: dict[tuple[str, int], list[dict]] = {}
+        for doc in docs:
+            day = _utc(doc["timestamp"]).date().isoformat()
+            groups.setdefault((day, ip_bucket(doc.get("ip_address"), self.buckets)), []).append(_row(doc))
+
+        segments = []
+        for (day, bucket), rows in groups.items():
+            table = pa.Table.from_pylist(rows, schema=SCHEMA).sort_by([("timestamp", "ascending"), ("_id", "ascending")])
+            relative = f"day={day}/bucket={bucket:02d}/part-{run_id}.parquet"
+            path = self.root / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            pq.write_table(table, path.with_suffix(".tmp"), compression=self.compression,
+                           row_group_size=self.row_group_size)
+            os.replace(path.with_suffix(".tmp"), path)
+
+            ranges = {}
+            for field in RANGE_FIELDS:
+                values = [row[field] for row in rows if row[field] is not None]
+                ranges[field] = (min(values), max(values)) if values else (None, None)
+            segments.append(_Segment(relative, day, bucket, len(rows), path.stat().st_size, ranges, "pending"))
+        return segments
+
+    async def _delete_hot(self, ids: list):
+        for start in range(0, len(ids), DELETE_CHUNK):
+            await logs_collection.delete_many({"_id": {"$in": ids[start:start + DELETE_CHUNK]}})
+
+    def _archived_ids(self, segment: _Segment) -> list:
+        ids = pq.read_table(self.root / segment.path, columns=["_id"]).column("_id").to_pylist()
+        return [ObjectId(value) for value in ids]
+
+    def _orphans(self) -> list[Path]:
+        known = {segment.path for segment in self.segments}
+        return [
+            path for path in self.root.glob("day=*/bucket=*/*")
+            if path.suffix == ".tmp" or path.relative_to(self.root).as_posix() not in known
+        ]
+
+    async def _recover(self):
+        # Segments written but not yet deleted from MongoDB when the last run
+        # stopped: finish the delete. Files missing from the manifest never
+        # had their rows deleted, so they are dropped and archived again.
+        pending = [segment for segment in self.segments if segment.state == "pending"]
+        for segment in pending:
+            await self._delete_hot(await asyncio.to_thread(self._archived_ids, segment))
+            segment.state = "committed"
+        if pending:
+            await asyncio.to_thread(self._save)
+        if not self.root.exists():
+            return
+        for path in await asyncio.to_thread(self._orphans):
+            path.unlink(missing_ok=True)
+
+    def cutoff(self, now: datetime | None = None) -> datetime | None:
+        # Whole ingest days only, so a day partition is written once rather
+        # than in a slice per run
+        if self.after is None:
+            return None
+        day = ((now or datetime.now(timezone.utc)) - self.after).date()
+        return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+    async def run(self) -> int:
+        if self._lock.locked():
+            return 0
+        async with self._lock:
+            await asyncio.to_thread(self._refresh)
+            await self._recover()
+            cutoff = self.cutoff()
+            if cutoff is None:
+                return 0
+
+            started = time.perf_counter()
+            moved = 0
+            while True:
+                docs = await logs_collection.find({"timestamp": {"$lt": cutoff}}).sort(
+                    [("timestamp", 1), ("_id", 1)]
+                ).limit(self.batch_size).to_list(None)
+                if not docs:
+                    break
+                run_id = f"{int(time.time() * 1000)}-{moved}"
+                written = await asyncio.to_thread(self._write, docs, run_id)
+
+                # pending -> rows deleted from MongoDB -> committed; readers
+                # only see committed segments, so rows are never counted twice
+                self.segments.extend(written)
+                await asyncio.to_thread(self._save)
+                await self._delete_hot([doc["_id"] for doc in docs])
+                for segment in written:
+                    segment.state = "committed"
+                await asyncio.to_thread(self._save)
+
+                moved += len(docs)
+                LOGS_ARCHIVED.inc(len(docs))
+                if len(docs) < self.batch_size:
+                    break
+
+            self.runs += 1
+            self.archived += moved
+            self.last_run = {
+                "at": datetime.now(timezone.utc).isoformat(),
+                "cutoff": cutoff.isoformat(),
+                "archived": moved,
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+            return moved
+
+    # Reading ------------------------------------------------------------------
+
+    def matching(self, query: dict) -> list[_Segment]:
+        self._refresh()
+        ip = query.get("ip_address")
+        bucket = ip_bucket(ip, self.buckets) if isinstance(ip, str) else None
+        bounds = {field: _bounds(query, field) for field in RANGE_FIELDS}
+        return [
+            segment for segment in self.segments
+            if segment.state == "committed"
+            and (bucket is None or segment.bucket == bucket)
+            and all(segment.overlaps(field, *bounds[field]) for field in RANGE_FIELDS if any(bounds[field]))
+        ]
+
+    def _groups(self, segments: list[_Segment], sort: list[tuple[str, int]] | None) -> list[list[_Segment]]:
+        # Sorted by ingest time, days come out in order and a limited read can
+        # stop early; any other order needs every matching segment at once
+        if not sort or sort[0][0] != "timestamp":
+            return [segments]
+        days: dict[str, list[_Segment]] = {}
+        for segment in segments:
+            days.setdefault(segment.day, []).append(segment)
+        return [days[day] for day in sorted(days, reverse=sort[0][1] < 0)]
+
+    def _read(self, segments: list[_Segment], expression, columns: list[str], sort) -> pa.Table:
+        started = time.perf_counter()
+        read_columns = columns + [field for field, _ in sort or [] if field not in columns]
+        dataset = ds.dataset([str(self.root / s.path) for s in segments], schema=SCHEMA, format="parquet")
+        table = dataset.to_table(columns=read_columns, filter=expression)
+        if sort:
+            table = table.sort_by([(field, "descending" if direction < 0 else "ascending") for field, direction in sort])
+        self.reads += 1
+        self.segments_read += len(segments)
+        _ARCHIVE_READ.observe(time.perf_counter() - started)
+        return table.select(columns)
+
+    def _find(self, segments, query, projection, sort, limit) -> list[dict]:
+        expression = to_expression(query)
+        columns, extra_fields = _columns(projection)
+        docs = []
+        for group in self._groups(segments, sort):
+            remaining = None if limit is None else limit - len(docs)
+            table = self._read(group, expression, columns, sort)
+            if remaining is not None:
+                table = table.slice(0, remaining)
+            docs.extend(_doc(row, extra_fields) for row in table.to_pylist())
+            if limit is not None and len(docs) >= limit:
+                break
+        return docs
+
+    async def find(self, query: dict, projection: dict | None = None, sort: list[tuple[str, int]] | None = None,
+                   limit: int | None = None) -> list[dict]:
+        segments = await asyncio.to_thread(self.matching, query)
+        if not segments:
+            return []
+        return await asyncio.to_thread(self._find, segments, query, projection, sort, limit)
+
+    async def iter_find(self, query: dict, projection: dict | None = None, sort: list[tuple[str, int]] | None = None):
+        # Streams in sort order; memory is bounded by one ingest day of
+        # matching rows when sorted by timestamp, by the whole match otherwise
+        segments = await asyncio.to_thread(self.matching, query)
+        if not segments:
+            return
+        expression = to_expression(query)
+        columns, extra_fields = _columns(projection)
+        for group in self._groups(segments, sort):
+            table = await asyncio.to_thread(self._read, group, expression, columns, sort)
+            for batch in table.to_batches(max_chunksize=READ_CHUNK_ROWS):
+                for row in batch.to_pylist():
+                    yield _doc(row, extra_fields)
+
+    def stats(self) -> dict:
+        self._refresh()
+        committed = [segment for segment in self.segments if segment.state == "committed"]
+        days = sorted({segment.day for segment in committed})
+        return {
+            "enabled": self.after is not None,
+            "after_days": self.after.days if self.after else 0,
+            "directory": str(self.root),
+            "ip_buckets": self.buckets,
+            "segments": len(committed),
+            "pending_segments": len(self.segments) - len(committed),
+            "rows": sum(segment.rows for segment in committed),
+            "bytes": sum(segment.bytes for segment in committed),
+            "oldest_day": days[0] if days else None,
+            "newest_day": days[-1] if days else None,
+            "runs": self.runs,
+            "archived": self.archived,
+            "reads": self.reads,
+            "segments_read": self.segments_read,
+            "last_run": self.last_run,
+        }
+
+
+log_archive = LogArchive(
+    LOG_ARCHIVE_DIR,
+    after_days=LOG_ARCHIVE_AFTER_DAYS,
+    buckets=LOG_ARCHIVE_IP_BUCKETS,
+    batch_size=LOG_ARCHIVE_BATCH_SIZE,
+    row_group_size=LOG_ARCHIVE_ROW_GROUP_SIZE,
+    compression=LOG_ARCHIVE_COMPRESSION,
+)
+
+
+async def run_log_archiver():
+    while True:
+        try:
+            moved = await log_archive.run()
+            if moved:
+                print(f"[archive] moved {moved} logs to {log_archive.root}")
+        except Exception as exc:
+            print(f"[archive] archiving failed: {exc}")
+        await asyncio.sleep(LOG_ARCHIVE_INTERVAL_MINUTES * 60)
@@ -0,0 +1,160 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import ML_FOREST_MAX_SAMPLES, ML_MODEL_DIR, ML_TRAIN_N_JOBS
+from app.ml.anomaly import FEATURE_NAMES, anomaly_model
+from app.ml.training import fit_artifact
+from app.services.feature_builder import TrainingWindow, build_feature_matrix, load_training_window
+
+
+class ModelTrainer:
+    # Feature building runs in a thread and IsolationForest.fit in a separate
+    # process, so ingest and WebSockets keep running while a model trains.
+    # The serving model is only replaced once a new artifact has loaded.
+    def __init__(self, n_jobs: int = 1, max_samples: str = "auto", model_dir: str = ML_MODEL_DIR):
+        self.n_jobs = n_jobs
+        self.max_samples = max_samples
+        self.model_dir = model_dir
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = asyncio.Lock()
+        self._window: TrainingWindow | None = None
+
+        self.phase = "idle"
+        self.started_at = None
+        self.phase_started = 0.0
+        self.samples = 0
+        self.runs = 0
+        self.failures = 0
+        self.skipped_overlap = 0
+        self.last_error = None
+        self.last_run = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs an event loop and driver
+            # threads is not safe
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _enter(self, phase: str, timings: dict):
+        now = time.perf_counter()
+        if self.phase not in ("idle", phase):
+            timings[f"{self.phase}_seconds"] = round(now - self.phase_started, 3)
+        self.phase = phase
+        self.phase_started = now
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def run(self, days: int, limit: int) -> dict:
+        if self._lock.locked():
+            # A run is already in flight; the serving model stays as it is
+            self.skipped_overlap += 1
+            return {"status": "already_running", **self.progress()}
+
+        async with self._lock:
+            started = time.perf_counter()
+            self.started_at = datetime.now(timezone.utc).isoformat()
+            self.samples = 0
+            timings = {}
+            loop = asyncio.get_running_loop()
+            try:
+                since = datetime.now(timezone.utc) - timedelta(days=days)
+                self._enter("scanning", timings)
+                self._window = TrainingWindow()
+                await load_training_window(since, self._window, limit)
+
+                self._enter("features", timings)
+                features = await asyncio.to_thread(build_feature_matrix, self._window, since, limit)
+                self._window = None
+                self.samples = len(features)
+                if not self.samples:
+                    raise ValueError("no logs in the training window")
+
+                self._enter("fitting", timings)
+                try:
+                    artifact = await loop.run_in_executor(
+                        self._executor(), fit_artifact,
+                        features, FEATURE_NAMES, self.model_dir, self.n_jobs, self.max_samples,
+                    )
+                except BrokenProcessPool:
+                    self._pool = None
+                    raise
+
+                self._enter("swapping", timings)
+                loaded = await asyncio.to_thread(anomaly_model.read_artifact, artifact["path"])
+                anomaly_model.swap(loaded)
+                anomaly_model.promote(artifact["path"])
+                self._enter("idle", timings)
+            except Exception as exc:
+                self._enter("idle", timings)
+                self._window = None
+                self.failures += 1
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                self.last_run = {
+                    "status": "failed",
+                    "started_at": self.started_at,
+                    "duration_seconds": round(time.perf_counter() - started, 3),
+                    "error": self.last_error,
+                    **timings,
+                }
+                print(f"[ml] training failed, keeping model {anomaly_model.model_version}: {self.last_error}")
+                raise
+
+            self.runs += 1
+            self.last_error = None
+            self.last_run = {
+                "status": "trained",
+                "started_at": self.started_at,
+                "duration_seconds": round(time.perf_counter() - started, 3),
+                "samples": self.samples,
+                "model_version": anomaly_model.model_version,
+                "fit_seconds": round(artifact["fit_seconds"], 3),
+                **timings,
+            }
+            return self.last_run
+
+    async def follow(self) -> bool:
+        # Nodes that do not train pick up the artifact another node promoted
+        path = anomaly_model.promoted_path()
+        if path is None or self.running or str(path) == anomaly_model.artifact_path or not path.exists():
+            return False
+        loaded = await asyncio.to_thread(anomaly_model.read_artifact, path)
+        anomaly_model.swap(loaded)
+        print(f"[ml] now serving promoted model {anomaly_model.model_version}")
+        return True
+
+    def progress(self) -> dict:
+        progress = {"phase": self.phase}
+        if self.phase != "idle":
+            progress["started_at"] = self.started_at
+            progress["phase_elapsed_seconds"] = round(time.perf_counter() - self.phase_started, 3)
+            if self._window is not None:
+                progress["rows_scanned"] = len(self._window)
+            if self.samples:
+                progress["samples"] = self.samples
+        return progress
+
+    def stats(self) -> dict:
+        return {
+            **self.progress(),
+            "n_jobs": self.n_jobs,
+            "max_samples": self.max_samples,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped_overlap": self.skipped_overlap,
+            "last_run": self.last_run,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+model_trainer = ModelTrainer(ML_TRAIN_N_JOBS, ML_FOREST_MAX_SAMPLES)
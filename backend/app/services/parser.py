@@ -1,38 +1,381 @@
+import json
 import re
-from datetime import datetime, timezone
-
-PATTERNS = [
-    {
-        "regex": re.compile(
-            r"Failed password for (?P<user>\w+) from (?P<ip>\d+\.\d+\.\d+\.\d+)"
-        ),
-        "event_type": "ssh_failed_login"
-    },
-    {
-        "regex": re.compile(
-            r"Invalid user (?P<user>\w+) from (?P<ip>\d+\.\d+\.\d+\.\d+)"
-        ),
-        "event_type": "ssh_invalid_user"
-    },
-    {
-        "regex": re.compile(
-            r"Accepted password for (?P<user>\w+) from (?P<ip>\d+\.\d+\.\d+\.\d+)"
-        ),
-        "event_type": "ssh_success_login"
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from app.core.config import LOG_TIMEZONE
+
+IP = r"(?P<ip>\d{1,3}(?:\.\d{1,3}){3}|[0-9A-Fa-f]*:[0-9A-Fa-f:.]+)"
+USER = r"(?P<user>[\w.@$-]+)"
+
+IP_RE = re.compile(IP)
+
+# Plain RFC3164 ("Oct 18 14:22:01 host prog[pid]: msg"), by far the most
+# common header, gets a pattern of its own. It also takes the sshd
+# authentication results, the bulk of auth.log, in the same match: a regex
+# call costs about as much as the characters it matches, so matching header
+# and message separately only adds a call per line.
+RFC3164_HEADER = re.compile(
+    r"(?P<stamp>[A-Z][a-z]{2} +\d{1,2} \d\d:\d\d:\d\d) (?P<host>\S+) (?P<prog>[^\s:\[]+)(?:\[\d+\])?: "
+    r"(?:(?:(?P<verb>Failed|Accepted) (?:password|publickey) for (?:invalid user )?|Invalid user )"
+    + USER + r" from " + IP + r")?"
+)
+SSHD_VERBS = {"Failed": "ssh_failed_login", "Accepted": "ssh_success_login", None: "ssh_invalid_user"}
+
+# RFC3164 or an ISO-8601 stamp in the same position (rsyslog high-precision
+# format), optionally behind a <PRI>.
+SYSLOG_HEADER = re.compile(
+    r"(?:<\d{1,3}>)?"
+    r"(?P<stamp>[A-Z][a-z]{2} +\d{1,2} \d\d:\d\d:\d\d"
+    r"|\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?(?:Z|[+-]\d\d:?\d\d)?)"
+    r" (?P<host>\S+) (?P<prog>[^\s:\[]+)(?:\[\d+\])?: "
+)
+
+# RFC5424 ("<34>1 2026-10-18T14:22:01Z host app procid msgid [sd] msg")
+SYSLOG_5424_HEADER = re.compile(
+    r"<\d{1,3}>1 (?P<stamp>\S+) (?P<host>\S+) (?P<prog>\S+) \S+ \S+ "
+    r"(?:-|(?:\[[^\]]*\])+) ?"
+)
+
+MONTHS = {
+    name: index + 1
+    for index, name in enumerate(
+        ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    )
+}
+
+SSH_FAILED = re.compile(r"Failed (?:password|publickey) for (?:invalid user )?" + USER + r" from " + IP)
+SSH_INVALID = re.compile(r"Invalid user " + USER + r" from " + IP)
+SSH_ACCEPTED = re.compile(r"Accepted (?:password|publickey) for " + USER + r" from " + IP)
+
+PAM_MESSAGE = re.compile(r"pam_unix\((?P<service>[\w-]+):(?P<kind>auth|session)\): ")
+PAM_AUTH_FAILURE = "authentication failure"
+# pam_unix's own layout; anything else falls back to PAM_FIELDS
+PAM_AUTH_LAYOUT = re.compile(
+    r"authentication failure; logname=(?P<logname>\S*) uid=\S* euid=\S* tty=\S* "
+    r"ruser=(?P<ruser>\S*) rhost=(?P<rhost>\S*)(?: +user=(?P<user>\S*))?"
+)
+PAM_SESSION = re.compile(r"session (?P<state>opened|closed) for user " + USER)
+PAM_FIELDS = re.compile(r"(\w+)=(\S*)")
+
+SUDO_COMMAND = re.compile(
+    r"(?:sudo:)? *" + USER + r" : (?:(?P<attempts>\d+) incorrect password attempts? ; )?"
+    r"TTY=\S+ ; PWD=\S+ ; USER=(?P<target>\S+) ;(?: COMMAND=(?P<command>.*))?"
+)
+
+WINDOWS_EVENT_TYPES = {
+    4624: "win_success_login",
+    4625: "win_failed_login",
+    4648: "win_explicit_credentials",
+    4672: "win_special_privileges",
+    4720: "win_user_created",
+    4740: "win_account_lockout",
+}
+
+def source_timezone(name: str) -> tzinfo:
+    if name.upper() == "UTC":
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {name}")
+
+
+# Zone of header stamps without an offset, unless the caller passes one
+SOURCE_TZ = source_timezone(LOG_TIMEZONE)
+
+# tz -> {stamp: UTC datetime}
+_stamp_caches: dict[tzinfo, dict[str, datetime]] = {SOURCE_TZ: {}}
+_source_stamps = _stamp_caches[SOURCE_TZ]
+STAMP_CACHE_SIZE = 4096
+
+
+def _rfc3164_time(stamp: str, tz: tzinfo) -> datetime | None:
+    mon, day, hms = stamp.split()
+    month = MONTHS.get(mon)
+    if not month:
+        return None
+    now = datetime.now(tz)
+    hour, minute, second = (int(part) for part in hms.split(":"))
+    try:
+        value = datetime(now.year, month, int(day), hour, minute, second, tzinfo=tz)
+    except ValueError:
+        return None
+    # RFC3164 carries no year: a stamp in the future belongs to last year
+    if value - now > timedelta(days=1):
+        value = value.replace(year=now.year - 1)
+    return value.astimezone(timezone.utc)
+
+
+def _iso_time(value: str, tz: tzinfo = timezone.utc) -> datetime | None:
+    try:
+        stamp = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=tz)
+    return stamp.astimezone(timezone.utc)
+
+
+def _header_time(stamp: str, tz: tzinfo | None) -> datetime | None:
+    # Consecutive lines mostly share the same second, so parsed stamps are cached
+    if tz is None:
+        tz = SOURCE_TZ
+    cache = _stamp_caches.setdefault(tz, {})
+    cached = cache.get(stamp)
+    if cached is not None:
+        return cached
+
+    value = _iso_time(stamp, tz) if stamp[:1].isdigit() else _rfc3164_time(stamp, tz)
+    if value is None:
+        return None
+    if len(cache) >= STAMP_CACHE_SIZE:
+        cache.clear()
+    cache[stamp] = value
+    return value
+
+
+def _event(source: str, event_type: str, line: str, username=None, ip=None, **extra) -> dict:
+    event = {
+        "event_time": None,
+        "source": source,
+        "event_type": event_type,
+        "username": username,
+        "ip_address": ip,
+        "message": line.strip()
     }
-]
+    if extra:
+        event.update(extra)
+    return event
+
+
+# sshd messages of interest differ in their first character, so at most one
+# pattern runs per line
+SSHD_MESSAGES = {
+    "F": (SSH_FAILED, "ssh_failed_login"),
+    "I": (SSH_INVALID, "ssh_invalid_user"),
+    "A": (SSH_ACCEPTED, "ssh_success_login"),
+}
+
+
+def _parse_sshd(line: str, start: int) -> dict | None:
+    first = line[start:start + 1]
+    if first == "p":
+        return _parse_pam(line, start)
+    if first == "m":
+        # "message repeated 3 times: [ Failed password for ...]"
+        return _parse_keywords(line, start + 1)
+    entry = SSHD_MESSAGES.get(first)
+    if entry is None:
+        return None
+    pattern, event_type = entry
+    match = pattern.match(line, start)
+    if match is None:
+        return None
+    username, ip = match.groups()
+    return {
+        "event_time": None,
+        "source": "linux_auth",
+        "event_type": event_type,
+        "username": username,
+        "ip_address": ip,
+        "message": line.strip()
+    }
+
+
+def _parse_pam(line: str, start: int) -> dict | None:
+    header = PAM_MESSAGE.match(line, start)
+    if header is None:
+        return None
+    service, kind = header.groups()
+    start = header.end()
 
-def parse_auth_log(line: str):
-    for pattern in PATTERNS:
-        match = pattern["regex"].search(line)
+    if kind == "auth":
+        if not line.startswith(PAM_AUTH_FAILURE, start):
+            return None
+        match = PAM_AUTH_LAYOUT.match(line, start)
         if match:
+            logname, ruser, ip, username = match.groups()
+        else:
+            fields = dict(PAM_FIELDS.findall(line, start))
+            logname, ruser, ip, username = (fields.get(name) for name in ("logname", "ruser", "rhost", "user"))
+        if not ip:
+            found = IP_RE.search(line, start + len(PAM_AUTH_FAILURE))
+            ip = found.group("ip") if found else None
+        event_type = "sudo_auth_failure" if service == "sudo" else "pam_auth_failure"
+        return _event("linux_auth", event_type, line, username or ruser or logname or None, ip, service=service)
+
+    match = PAM_SESSION.match(line, start)
+    if match:
+        state, username = match.groups()
+        return _event("linux_auth", f"pam_session_{state}", line, username, service=service)
+    return None
+
+
+def _parse_sudo(line: str, start: int) -> dict | None:
+    pam_at = line.find("pam_unix(", start)
+    if pam_at != -1:
+        return _parse_pam(line, pam_at)
+
+    match = SUDO_COMMAND.match(line, start)
+    if not match:
+        return None
+    if match.group("attempts"):
+        return _event(
+            "linux_auth", "sudo_auth_failure", line, match.group("user"),
+            target_user=match.group("target"), attempts=int(match.group("attempts"))
+        )
+    return _event(
+        "linux_auth", "sudo_command", line, match.group("user"),
+        target_user=match.group("target"), command=match.group("command")
+    )
+
+
+def _windows_event(line: str, fields: dict) -> dict | None:
+    try:
+        event_id = int(fields.get("EventID"))
+    except (TypeError, ValueError):
+        return None
+
+    ip = fields.get("IpAddress")
+    if ip in ("-", "", None, "::1", "127.0.0.1"):
+        ip = None
+    username = fields.get("TargetUserName") or fields.get("SubjectUserName")
+    if username == "-":
+        username = None
+
+    event = _event(
+        "windows_security",
+        WINDOWS_EVENT_TYPES.get(event_id, f"win_event_{event_id}"),
+        line,
+        username,
+        ip,
+        event_id=event_id,
+        hostname=fields.get("Computer"),
+    )
+    stamp = fields.get("SystemTime") or fields.get("TimeCreated")
+    if isinstance(stamp, str):
+        # Windows emits 7 fractional digits; fromisoformat accepts at most 6
+        stamp = re.sub(r"(\.\d{6})\d+", r"\1", stamp)
+        event["event_time"] = _iso_time(stamp)
+    return event
+
+
+def _parse_windows_xml(line: str, start: int) -> dict | None:
+    try:
+        root = ET.fromstring(line[start:].strip())
+    except ET.ParseError:
+        return None
+
+    fields = {}
+    for element in root.iter():
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "Data" and element.get("Name"):
+            fields[element.get("Name")] = element.text
+        elif tag == "TimeCreated":
+            fields["SystemTime"] = element.get("SystemTime")
+        elif tag in ("EventID", "Computer"):
+            fields[tag] = element.text
+    return _windows_event(line, fields)
+
+
+def _flatten(data, into: dict) -> dict:
+    for key, value in data.items():
+        if isinstance(value, dict):
+            _flatten(value, into)
+        else:
+            into.setdefault(key, value)
+    return into
+
+
+def _parse_windows_json(line: str, start: int) -> dict | None:
+    brace = line.find("{")
+    if brace == -1:
+        return None
+    try:
+        data = json.loads(line[brace:])
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    fields = _flatten(data, {})
+    if "EventID" not in fields and "event_id" in fields:
+        fields["EventID"] = fields["event_id"]
+    return _windows_event(line, fields)
+
+
+# Literal keyword -> parser, for messages from programs without a dedicated
+# parser and lines without a syslog header. A substring test per keyword
+# screens the line before any regex runs.
+KEYWORD_PARSERS = (
+    ("pam_unix(", _parse_pam),
+    ("Failed ", _parse_sshd),
+    ("Invalid user ", _parse_sshd),
+    ("Accepted ", _parse_sshd),
+    ("sudo:", _parse_sudo),
+    ("<Event", _parse_windows_xml),
+    ('"EventID"', _parse_windows_json),
+    ('"event_id"', _parse_windows_json),
+)
+
+
+def _parse_keywords(line: str, start: int) -> dict | None:
+    for keyword, parse in KEYWORD_PARSERS:
+        if keyword in line:
+            at = line.find(keyword, start)
+            if at != -1:
+                parsed = parse(line, at)
+                if parsed is not None:
+                    return parsed
+    return None
+
+
+# Syslog program name -> parser for the message after the header
+PROGRAMS = {
+    "sshd": _parse_sshd,
+    "sshd-session": _parse_sshd,
+    "sudo": _parse_sudo,
+}
+
+
+def parse_auth_log(line: str, tz: tzinfo | None = None):
+    # tz: zone of header stamps without an offset (default SOURCE_TZ)
+    stamps = _source_stamps if tz is None else _stamp_caches.get(tz, {})
+    header = RFC3164_HEADER.match(line)
+    if header is not None:
+        stamp, host, prog, verb, username, ip = header.groups()
+        if username is not None:
             return {
-                "event_time": datetime.now(timezone.utc), 
+                "event_time": stamps.get(stamp) or _header_time(stamp, tz),
                 "source": "linux_auth",
-                "event_type": pattern["event_type"],
-                "username": match.group("user"),
-                "ip_address": match.group("ip"),
-                "message": line.strip()
+                "event_type": SSHD_VERBS[verb],
+                "username": username,
+                "ip_address": ip,
+                "message": line.strip(),
+                "hostname": host,
+                "process": prog
             }
-    return None
+    else:
+        header = SYSLOG_HEADER.match(line)
+        if header is None and line[:1] == "<":
+            header = SYSLOG_5424_HEADER.match(line)
+        if header is None:
+            return _parse_keywords(line, 0)
+        stamp, host, prog = header.groups()
+
+    parsed = PROGRAMS.get(prog, _parse_keywords)(line, header.end())
+    if parsed is None:
+        parsed = _event("syslog", "syslog_message", line)
+
+    if parsed["event_time"] is None:
+        parsed["event_time"] = stamps.get(stamp) or _header_time(stamp, tz)
+    if not parsed.get("hostname"):
+        parsed["hostname"] = host
+    parsed["process"] = prog
+    return parsed
+
 
+def parse_auth_logs(lines, tz: tzinfo | None = None) -> list[dict | None]:
+    return [parse_auth_log(line, tz) for line in lines]
@@ -0,0 +1,158 @@
+import asyncio
+import time
+import zlib
+
+from app.core.config import DETECTION_BATCH_SIZE, DETECTION_QUEUE_SIZE, DETECTION_WORKERS
+from app.core.metrics import EVENTS_TOTAL, count_mongo_ops, ops_per_event, stage
+from app.services.detection import process_events
+
+
+_QUEUED = EVENTS_TOTAL.labels("queued")
+_PROCESSED = EVENTS_TOTAL.labels("processed")
+_FAILED = EVENTS_TOTAL.labels("failed")
+_REJECTED = EVENTS_TOTAL.labels("rejected")
+_DETECTION_OPS = ops_per_event("detection")
+
+
+class _StageTimer:
+    # Running summary for /system/stats, mirrored into a /metrics histogram
+    __slots__ = ("count", "total", "max", "last", "histogram")
+
+    def __init__(self, name: str):
+        self.histogram = stage(name)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.max = max(self.max, seconds)
+        self.histogram.observe(seconds)
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(1000.0 * self.total / self.count, 3) if self.count else 0.0,
+            "max_ms": round(1000.0 * self.max, 3),
+            "last_ms": round(1000.0 * self.last, 3),
+        }
+
+
+class _Shard:
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+        self.processed = 0
+        self.failed = 0
+
+
+class DetectionPipeline:
+    # Events are sharded by IP so each IP's events are handled in order by a
+    # single worker, while different IPs are processed concurrently.
+    def __init__(self, workers: int = 4, queue_size: int = 10_000, batch_size: int = 100):
+        self.workers = max(1, workers)
+        self.shard_capacity = max(1, queue_size // self.workers)
+        self.batch_size = max(1, batch_size)
+        self.shards = [_Shard() for _ in range(self.workers)]
+        self.rejected = 0
+        self.queue_wait = _StageTimer("queue_wait")
+        self.detection = _StageTimer("detection_batch")
+        self.end_to_end = _StageTimer("enqueue_to_done")
+
+    def _shard_index(self, ip: str) -> int:
+        return zlib.crc32(ip.encode()) % self.workers
+
+    def can_accept(self, events: list[dict]) -> bool:
+        needed = [0] * self.workers
+        for event in events:
+            if event.get("ip_address"):
+                needed[self._shard_index(event["ip_address"])] += 1
+        return all(
+            shard.queue.qsize() + count <= self.shard_capacity
+            for shard, count in zip(self.shards, needed)
+        )
+
+    def reject(self, events: int = 0):
+        self.rejected += 1
+        _REJECTED.inc(events)
+
+    def submit(self, event: dict):
+        # Capacity is checked by the caller before the log is persisted, so an
+        # accepted event is always queued even if the shard filled up since.
+        shard = self.shards[self._shard_index(event["ip_address"])]
+        shard.queue.put_nowait((time.perf_counter(), event))
+        _QUEUED.inc()
+
+    def start(self):
+        for shard in self.shards:
+            if shard.task is None or shard.task.done():
+                shard.task = asyncio.create_task(self._worker(shard))
+
+    async def stop(self, timeout: float = 10.0):
+        # Let queued events and the batches already taken off the queues
+        # finish before cancelling the workers
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(shard.queue.join() for shard in self.shards if shard.task)), timeout
+            )
+        except asyncio.TimeoutError:
+            pending = sum(shard.queue.qsize() for shard in self.shards)
+            print(f"[pipeline] stopping with {pending} events still queued after {timeout}s")
+        for shard in self.shards:
+            if shard.task:
+                shard.task.cancel()
+
+    async def _worker(self, shard: _Shard):
+        while True:
+            batch = [await shard.queue.get()]
+            while len(batch) < self.batch_size and not shard.queue.empty():
+                batch.append(shard.queue.get_nowait())
+
+            started = time.perf_counter()
+            for enqueued_at, _ in batch:
+                self.queue_wait.observe(started - enqueued_at)
+
+            events = [event for _, event in batch]
+            try:
+                with count_mongo_ops(_DETECTION_OPS, len(events)):
+                    await process_events(events)
+                shard.processed += len(events)
+                _PROCESSED.inc(len(events))
+            except Exception as exc:
+                shard.failed += len(events)
+                _FAILED.inc(len(events))
+                print(f"[pipeline] detection failed for {len(events)} events: {exc}")
+
+            finished = time.perf_counter()
+            self.detection.observe(finished - started)
+            for enqueued_at, _ in batch:
+                self.end_to_end.observe(finished - enqueued_at)
+                shard.queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "shard_capacity": self.shard_capacity,
+            "queue_depth": sum(shard.queue.qsize() for shard in self.shards),
+            "rejected_requests": self.rejected,
+            "shards": [
+                {
+                    "depth": shard.queue.qsize(),
+                    "processed": shard.processed,
+                    "failed": shard.failed,
+                    "running": bool(shard.task and not shard.task.done()),
+                }
+                for shard in self.shards
+            ],
+            "stages": {
+                "queue_wait": self.queue_wait.stats(),
+                "detection_batch": self.detection.stats(),
+                "enqueue_to_done": self.end_to_end.stats(),
+            },
+        }
+
+
+detection_pipeline = DetectionPipeline(DETECTION_WORKERS, DETECTION_QUEUE_SIZE, DETECTION_BATCH_SIZE)
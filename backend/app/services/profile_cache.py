@@ -0,0 +1,178 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from pymongo import UpdateOne
+
+from app.core.config import PROFILE_CACHE_MAX_SIZE, PROFILE_FLUSH_INTERVAL_SECONDS
+from app.core.database import ueba_profiles_collection, ueba_user_profiles_collection
+
+
+class ProfileCache:
+    def __init__(self, collection, key_field: str, defaults, max_size: int = 50_000):
+        self.collection = collection
+        self.key_field = key_field
+        self.defaults = defaults
+        self.max_size = max_size
+        self.entries: OrderedDict[str, dict] = OrderedDict()
+        self.dirty: set[str] = set()
+        # Dirty profiles pushed out by LRU eviction, written on the next flush
+        self.evicted_dirty: dict[str, dict] = {}
+        self._flush_lock = asyncio.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.flushed_docs = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+
+    async def get(self, key: str) -> dict:
+        profile = self.entries.get(key)
+        if profile is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return profile
+
+        self.misses += 1
+        profile = self.evicted_dirty.pop(key, None)
+        if profile is None:
+            profile = await self.collection.find_one({self.key_field: key})
+            # Another task may have loaded the same key while we awaited
+            if key in self.entries:
+                return self.entries[key]
+            if profile is None:
+                profile = self.defaults(key)
+                self.dirty.add(key)
+        else:
+            self.dirty.add(key)
+
+        self.entries[key] = profile
+        self._evict()
+        return profile
+
+    def update(self, key: str, updates: dict):
+        profile = self.entries.get(key)
+        if profile is None:
+            profile = self.evicted_dirty.pop(key, None) or self.defaults(key)
+            self.entries[key] = profile
+            self._evict()
+        profile.update(updates)
+        self.dirty.add(key)
+
+    def _evict(self):
+        while len(self.entries) > self.max_size:
+            key, profile = self.entries.popitem(last=False)
+            self.evictions += 1
+            if key in self.dirty:
+                self.dirty.discard(key)
+                self.evicted_dirty[key] = profile
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            docs = dict(self.evicted_dirty)
+            for key in self.dirty:
+                if key in self.entries:
+                    docs[key] = self.entries[key]
+            self.evicted_dirty = {}
+            self.dirty = set()
+            if not docs:
+                return 0
+
+            operations = [
+                UpdateOne(
+                    {self.key_field: key},
+                    {"$set": {k: v for k, v in profile.items() if k != "_id"}},
+                    upsert=True
+                )
+                for key, profile in docs.items()
+            ]
+
+            started = time.perf_counter()
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+            except Exception:
+                # Keep the updates so the next flush retries them
+                self.flush_errors += 1
+                for key, profile in docs.items():
+                    if key in self.entries:
+                        self.dirty.add(key)
+                    else:
+                        self.evicted_dirty.setdefault(key, profile)
+                raise
+
+            self.flushes += 1
+            self.flushed_docs += len(operations)
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000.0, 3)
+            return len(operations)
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self.entries),
+            "max_size": self.max_size,
+            "dirty": len(self.dirty) + len(self.evicted_dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "flushes": self.flushes,
+            "flushed_docs": self.flushed_docs,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+def _ip_profile(ip: str) -> dict:
+    return {
+        "ip_address": ip,
+        "first_seen": None,
+        "last_seen": None,
+        "total_events": 0,
+        "failed_events": 0,
+        "invalid_events": 0,
+        "success_events": 0,
+        "avg_events_per_window": 0.0,
+        "avg_daily_events": 0.0,
+        "last_day": None,
+        "today_count": 0,
+        "current_session_start": None,
+        "current_session_events": 0,
+        "last_incident_at": None
+    }
+
+
+def _user_profile(username: str) -> dict:
+    return {
+        "username": username,
+        "first_seen": None,
+        "last_seen": None,
+        "total_events": 0,
+        "avg_daily_events": 0.0,
+        "last_day": None,
+        "today_count": 0,
+        "last_incident_at": None
+    }
+
+
+ip_profiles = ProfileCache(
+    ueba_profiles_collection, "ip_address", _ip_profile, PROFILE_CACHE_MAX_SIZE
+)
+user_profiles = ProfileCache(
+    ueba_user_profiles_collection, "username", _user_profile, PROFILE_CACHE_MAX_SIZE
+)
+
+
+async def flush_profiles() -> int:
+    written = 0
+    for cache in (ip_profiles, user_profiles):
+        try:
+            written += await cache.flush()
+        except Exception as exc:
+            print(f"[ueba] profile flush failed: {exc}")
+    return written
+
+
+async def run_profile_flusher():
+    while True:
+        await asyncio.sleep(PROFILE_FLUSH_INTERVAL_SECONDS)
+        await flush_profiles()
@@ -19,6 +19,12 @@ def recommend_actions(incident: str | None, counts: dict | None, enrichment: dic
     if counts and counts.get("invalid", 0) > 0:
         actions.append("Harden SSH: disable password auth where possible.")
 
+    reputation = (enrichment or {}).get("reputation") or {}
+    if reputation.get("verdict") == "block":
+        actions.append(f"Source is on local blocklist(s) {', '.join(reputation['lists'])}; block it at the perimeter.")
+    elif reputation.get("verdict") == "allow":
+        actions.append(f"Source is in allowlisted range(s) {', '.join(reputation['lists'])}; confirm the activity with its owner.")
+
     if enrichment and enrichment.get("is_private") is False:
         actions.append("Check IP reputation with external threat intel.")
 
@@ -1,11 +1,20 @@
-def calculate_risk(incident_type, event_count):
+from app.core.config import REPUTATION_ALLOW_RISK, REPUTATION_BLOCK_RISK
+
+REPUTATION_RISK = {"block": REPUTATION_BLOCK_RISK, "allow": REPUTATION_ALLOW_RISK}
+
+
+def calculate_risk(incident_type, event_count, reputation=None):
     base = {
         "Brute Force Attack": 7,
         "Credential Enumeration": 5,
-        "Privilege Escalation Attempt": 9
+        "Privilege Escalation Attempt": 9,
+        "Impossible Travel": 8
     }
 
     score = base.get(incident_type, 3)
     score += min(event_count // 3, 3)  # scale severity
+    if reputation:
+        # Local blocklist / allowlist match on the source IP
+        score += REPUTATION_RISK.get(reputation.get("verdict"), 0)
 
-    return min(score, 10)
+    return max(min(score, 10), 1)
@@ -1,5 +1,18 @@
 from app.core.database import logs_collection
+from app.services.activity_rollup import activity_rollups
+
+# Rollups are written before the caller queues detection, so UEBA windows
+# already include the logs being evaluated
 
 async def save_log(log_data: dict):
     result = await logs_collection.insert_one(log_data)
+    await activity_rollups.record([log_data])
     return str(result.inserted_id)
+
+
+async def save_logs(logs: list[dict]) -> list[str]:
+    if not logs:
+        return []
+    result = await logs_collection.insert_many(logs, ordered=True)
+    await activity_rollups.record(logs)
+    return [str(inserted_id) for inserted_id in result.inserted_ids]
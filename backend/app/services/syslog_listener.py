@@ -0,0 +1,226 @@
+import asyncio
+import socket
+import ssl
+
+from app.core.config import (
+    SYSLOG_BATCH_SIZE,
+    SYSLOG_FLUSH_MS,
+    SYSLOG_HOST,
+    SYSLOG_MAX_PENDING,
+    SYSLOG_MAX_MESSAGE_BYTES,
+    SYSLOG_RCVBUF_BYTES,
+    SYSLOG_TCP_PORT,
+    SYSLOG_TLS_CERT,
+    SYSLOG_TLS_KEY,
+    SYSLOG_TLS_PORT,
+    SYSLOG_UDP_PORT,
+)
+from app.services.ingestion import PipelineSaturated, ingest_lines
+
+
+class SyslogListener:
+    def __init__(self):
+        self.pending: list[str] = []
+        self._flush_timer: asyncio.TimerHandle | None = None
+        self._flushing: asyncio.Task | None = None
+        self._room = asyncio.Event()
+        self._room.set()
+        self._udp_transport = None
+        self._servers: list[asyncio.AbstractServer] = []
+
+        self.counters = {
+            "udp_received": 0,
+            "tcp_received": 0,
+            "tcp_connections": 0,
+            "stored": 0,
+            "unrecognized": 0,
+            "detection_failed": 0,
+            "dropped_buffer_full": 0,
+            "dropped_saturated": 0,
+            "failed": 0,
+            "framing_errors": 0,
+            "batches": 0,
+        }
+
+    # Buffering -----------------------------------------------------------
+
+    def _enqueue(self, line: str, source: str) -> bool:
+        self.counters[f"{source}_received"] += 1
+        if len(self.pending) >= SYSLOG_MAX_PENDING:
+            self.counters["dropped_buffer_full"] += 1
+            return False
+
+        self.pending.append(line)
+        if len(self.pending) >= SYSLOG_MAX_PENDING:
+            self._room.clear()
+        if len(self.pending) >= SYSLOG_BATCH_SIZE:
+            self._schedule_flush(0)
+        elif self._flush_timer is None:
+            self._schedule_flush(SYSLOG_FLUSH_MS / 1000.0)
+        return True
+
+    def _schedule_flush(self, delay: float):
+        if self._flushing and not self._flushing.done():
+            return
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._flush_timer = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_timer = None
+        if not self._flushing or self._flushing.done():
+            self._flushing = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        while self.pending:
+            batch = self.pending[:SYSLOG_BATCH_SIZE]
+            try:
+                result = await ingest_lines(batch)
+            except PipelineSaturated:
+                # Raised before anything is stored. Syslog has no way to push
+                # back on UDP senders; drop the batch rather than stall every
+                # connection behind it
+                self.counters["dropped_saturated"] += len(batch)
+            except Exception as exc:
+                print(f"[syslog] batch ingest failed: {exc!r}")
+                self.counters["failed"] += len(batch)
+            else:
+                # Stored even when some events missed the detection hand-off
+                self.counters["stored"] += result["stored"]
+                self.counters["unrecognized"] += result["unrecognized"]
+                self.counters["detection_failed"] += result["detection_failed"]
+                self.counters["batches"] += 1
+            del self.pending[:len(batch)]
+            self._room.set()
+
+            if len(self.pending) < SYSLOG_BATCH_SIZE:
+                break
+
+        if self.pending:
+            self._flushing = None
+            self._schedule_flush(SYSLOG_FLUSH_MS / 1000.0)
+
+    # UDP -----------------------------------------------------------------
+
+    class _UdpProtocol(asyncio.DatagramProtocol):
+        def __init__(self, listener: "SyslogListener"):
+            self.listener = listener
+
+        def datagram_received(self, data: bytes, addr):
+            # One datagram carries one message (RFC 5426)
+            line = data.decode("utf-8", errors="replace").rstrip("\r\n\x00")
+            if line:
+                self.listener._enqueue(line, "udp")
+
+    # TCP / TLS -----------------------------------------------------------
+
+    async def _read_frame(self, reader: asyncio.StreamReader) -> bytes | None:
+        # RFC 6587: octet counting ("<len> <msg>") or newline-terminated
+        # frames. A short digit run followed by a space is a length prefix;
+        # anything else (e.g. a line starting with an ISO date) is a line.
+        head = await reader.read(1)
+        if not head:
+            return None
+        while head.isdigit() and len(head) <= 10:
+            char = await reader.read(1)
+            if not char:
+                return head
+            if char == b" ":
+                length = int(head)
+                if length > SYSLOG_MAX_MESSAGE_BYTES:
+                    raise ValueError(f"frame of {length} bytes exceeds limit")
+                return await reader.readexactly(length)
+            head += char
+        if head.endswith(b"\n"):
+            return head
+        return head + await reader.readuntil(b"\n")
+
+    async def _handle_stream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.counters["tcp_connections"] += 1
+        try:
+            while True:
+                # Stop reading (TCP backpressure) while the buffer is full
+                await self._room.wait()
+                try:
+                    frame = await self._read_frame(reader)
+                except (ValueError, asyncio.LimitOverrunError):
+                    self.counters["framing_errors"] += 1
+                    break
+                except asyncio.IncompleteReadError as exc:
+                    frame = exc.partial or None
+                    if frame:
+                        self._enqueue(frame.decode("utf-8", errors="replace").rstrip("\r\n"), "tcp")
+                    break
+                if frame is None:
+                    break
+                line = frame.decode("utf-8", errors="replace").rstrip("\r\n")
+                if line:
+                    self._enqueue(line, "tcp")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # Lifecycle -----------------------------------------------------------
+
+    def _tune(self, sock: socket.socket):
+        if SYSLOG_RCVBUF_BYTES:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SYSLOG_RCVBUF_BYTES)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+
+        if SYSLOG_UDP_PORT:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._tune(sock)
+            sock.bind((SYSLOG_HOST, SYSLOG_UDP_PORT))
+            self._udp_transport, _ = await loop.create_datagram_endpoint(
+                lambda: self._UdpProtocol(self), sock=sock
+            )
+
+        if SYSLOG_TCP_PORT:
+            server = await asyncio.start_server(
+                self._handle_stream, SYSLOG_HOST, SYSLOG_TCP_PORT,
+                limit=SYSLOG_MAX_MESSAGE_BYTES
+            )
+            self._servers.append(server)
+
+        if SYSLOG_TLS_PORT and SYSLOG_TLS_CERT and SYSLOG_TLS_KEY:
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(SYSLOG_TLS_CERT, SYSLOG_TLS_KEY)
+            server = await asyncio.start_server(
+                self._handle_stream, SYSLOG_HOST, SYSLOG_TLS_PORT,
+                ssl=context, limit=SYSLOG_MAX_MESSAGE_BYTES
+            )
+            self._servers.append(server)
+
+        for server in self._servers:
+            for sock in server.sockets:
+                self._tune(sock)
+
+    async def stop(self):
+        if self._udp_transport:
+            self._udp_transport.close()
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._flushing:
+            await self._flushing
+        if self.pending:
+            await self._flush()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "pending": len(self.pending),
+            "udp_port": SYSLOG_UDP_PORT if self._udp_transport else None,
+            "tcp_ports": [sock.getsockname()[1] for server in self._servers for sock in server.sockets],
+        }
+
+
+syslog_listener = SyslogListener()
@@ -1,25 +1,254 @@
+import asyncio
 import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from ipaddress import ip_address
 
+from app.core.config import (
+    THREAT_INTEL_BATCH_SIZE,
+    THREAT_INTEL_CACHE_SIZE,
+    THREAT_INTEL_INLINE_WAIT_SECONDS,
+    THREAT_INTEL_MAX_CONNECTIONS,
+    THREAT_INTEL_NEGATIVE_TTL_SECONDS,
+    THREAT_INTEL_TIMEOUT_SECONDS,
+    THREAT_INTEL_TTL_SECONDS,
+    THREAT_INTEL_URL,
+)
 
-async def lookup_ip(ip: str) -> dict:
-    api_key = os.getenv("ABUSEIPDB_API_KEY")
-    if not api_key:
-        return {"status": "unconfigured"}
+try:
+    import httpx
+except Exception:
+    httpx = None
 
+
+def _is_public(ip: str | None) -> bool:
     try:
-        import httpx
-    except Exception:
-        return {"status": "missing_http_client"}
+        return bool(ip) and ip_address(ip).is_global
+    except ValueError:
+        return False
 
-    url = "https://api.abuseipdb.com/api/v2/check"
-    headers = {"Key": api_key, "Accept": "application/json"}
-    params = {"ipAddress": ip, "maxAgeInDays": 90}
 
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(url, headers=headers, params=params)
-            if resp.status_code != 200:
-                return {"status": "error", "code": resp.status_code}
-            return {"status": "ok", "data": resp.json().get("data", {})}
-    except Exception as exc:
-        return {"status": "error", "message": str(exc)}
+class ThreatIntelClient:
+    # One pooled HTTP client, a TTL + LRU cache (failures are cached for a
+    # shorter time), one in-flight request per IP, and a background worker
+    # that prefetches IPs from new incidents in small batches.
+    def __init__(self, url: str, ttl: float, negative_ttl: float, max_size: int,
+                 timeout: float, max_connections: int, batch_size: int):
+        self.url = url
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.max_connections = max(1, max_connections)
+        self.batch_size = max(1, batch_size)
+
+        self.cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.inflight: dict[str, asyncio.Task] = {}
+        self.pending: dict[str, None] = {}
+        self.backoff_until = 0.0
+        self._client = None
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+
+        self.counters = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "requests": 0,
+            "errors": 0,
+            "rate_limited": 0,
+            "evicted": 0,
+            "prefetch_queued": 0,
+            "inline_timeouts": 0,
+        }
+
+    def _api_key(self) -> str | None:
+        return os.getenv("ABUSEIPDB_API_KEY")
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    # Cache -----------------------------------------------------------------
+
+    def _cached(self, ip: str) -> dict | None:
+        entry = self.cache.get(ip)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self.cache[ip]
+            return None
+        self.cache.move_to_end(ip)
+        return result
+
+    def _store(self, ip: str, result: dict, ttl: float):
+        self.cache[ip] = (time.monotonic() + ttl, result)
+        self.cache.move_to_end(ip)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+            self.counters["evicted"] += 1
+
+    # Fetching --------------------------------------------------------------
+
+    async def _fetch(self, ip: str, api_key: str) -> tuple[dict, float]:
+        now = time.monotonic()
+        if now < self.backoff_until:
+            return {"status": "rate_limited"}, self.backoff_until - now
+
+        self.counters["requests"] += 1
+        try:
+            resp = await self._http().get(
+                self.url,
+                headers={"Key": api_key, "Accept": "application/json"},
+                params={"ipAddress": ip, "maxAgeInDays": 90},
+            )
+        except Exception as exc:
+            self.counters["errors"] += 1
+            return {"status": "error", "message": str(exc)}, self.negative_ttl
+
+        if resp.status_code == 429:
+            # Stop calling the API for everyone until the limit resets
+            self.counters["rate_limited"] += 1
+            try:
+                retry_after = float(resp.headers.get("Retry-After", 60))
+            except ValueError:
+                retry_after = 60.0
+            self.backoff_until = time.monotonic() + retry_after
+            return {"status": "rate_limited", "code": 429}, retry_after
+        if resp.status_code != 200:
+            self.counters["errors"] += 1
+            return {"status": "error", "code": resp.status_code}, self.negative_ttl
+        try:
+            payload = resp.json()
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            # e.g. an HTML page from a proxy or captive portal
+            self.counters["errors"] += 1
+            return {"status": "error", "code": resp.status_code, "message": "invalid JSON response"}, self.negative_ttl
+        return {
+            "status": "ok",
+            "data": payload.get("data", {}),
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+        }, self.ttl
+
+    async def _fetch_and_store(self, ip: str, api_key: str) -> dict:
+        result, ttl = await self._fetch(ip, api_key)
+        self._store(ip, result, ttl)
+        return result
+
+    def _start(self, ip: str, api_key: str) -> asyncio.Task:
+        task = self.inflight.get(ip)
+        if task is not None:
+            self.counters["coalesced"] += 1
+            return task
+        task = asyncio.create_task(self._fetch_and_store(ip, api_key))
+        self.inflight[ip] = task
+        task.add_done_callback(lambda _: self.inflight.pop(ip, None))
+        return task
+
+    def cached(self, ip: str) -> dict | None:
+        # Cache-only read for callers that must not trigger a request
+        return self._cached(ip)
+
+    async def lookup(self, ip: str, wait: float | None = None) -> dict:
+        api_key = self._api_key()
+        if not api_key:
+            return {"status": "unconfigured"}
+        if httpx is None:
+            return {"status": "missing_http_client"}
+
+        cached = self._cached(ip)
+        if cached is not None:
+            self.counters["hits" if cached["status"] == "ok" else "negative_hits"] += 1
+            return cached
+
+        self.counters["misses"] += 1
+        task = self._start(ip, api_key)
+        # shield: a caller giving up must not cancel the shared request
+        if wait is None:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), wait)
+        except asyncio.TimeoutError:
+            self.counters["inline_timeouts"] += 1
+            return {"status": "pending"}
+
+    # Background prefetch ---------------------------------------------------
+
+    def prefetch(self, ips):
+        if not self._api_key() or httpx is None:
+            return
+        for ip in ips:
+            if not _is_public(ip) or ip in self.pending or ip in self.inflight or self._cached(ip) is not None:
+                continue
+            self.pending[ip] = None
+            self.counters["prefetch_queued"] += 1
+        if self.pending:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.pending:
+                delay = self.backoff_until - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                api_key = self._api_key()
+                if not api_key:
+                    self.pending.clear()
+                    break
+                batch = list(self.pending)[:self.batch_size]
+                for ip in batch:
+                    del self.pending[ip]
+                await asyncio.gather(
+                    *(self._start(ip, api_key) for ip in batch if self._cached(ip) is None),
+                    return_exceptions=True,
+                )
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "cached": len(self.cache),
+            "inflight": len(self.inflight),
+            "pending": len(self.pending),
+            "backoff_seconds": round(max(0.0, self.backoff_until - time.monotonic()), 1),
+        }
+
+
+threat_intel = ThreatIntelClient(
+    THREAT_INTEL_URL,
+    ttl=THREAT_INTEL_TTL_SECONDS,
+    negative_ttl=THREAT_INTEL_NEGATIVE_TTL_SECONDS,
+    max_size=THREAT_INTEL_CACHE_SIZE,
+    timeout=THREAT_INTEL_TIMEOUT_SECONDS,
+    max_connections=THREAT_INTEL_MAX_CONNECTIONS,
+    batch_size=THREAT_INTEL_BATCH_SIZE,
+)
+
+
+async def lookup_ip(ip: str, wait: float | None = THREAT_INTEL_INLINE_WAIT_SECONDS) -> dict:
+    return await threat_intel.lookup(ip, wait=wait)
@@ -1,14 +1,20 @@
 from datetime import datetime, timedelta, timezone
 
+from pymongo import ReturnDocument, UpdateOne
+
 from app.core.database import (
-    logs_collection,
-    ueba_profiles_collection,
-    ueba_user_profiles_collection,
     ueba_sessions_collection,
     ueba_incidents_collection
 )
 from app.intel.mitre import get_mitre
+from app.core.config import IMPOSSIBLE_TRAVEL_MAX_KMH, IMPOSSIBLE_TRAVEL_MIN_KM
+from app.services.activity_rollup import activity_rollups
+from app.services.cluster import cluster
+from app.services.geoip import distance_km, geoip
+from app.services.ip_reputation import ip_reputation
+from app.services.profile_cache import ip_profiles, user_profiles
 from app.services.scoring import calculate_risk
+from app.services.threat_intel import threat_intel
 
 
 WINDOW_MINUTES = 10
@@ -21,111 +27,57 @@ BURST_THRESHOLD = 25
 
 EMA_ALPHA = 0.2
 
+# Incident risk drops by one point per 10 minutes without new activity
+DECAY_MINUTES_PER_POINT = 10.0
+
 
 KILL_CHAIN = {
     "UEBA: Persistent Brute Force": "Credential Access",
     "UEBA: Credential Enumeration": "Discovery",
     "UEBA: Abnormal Activity Burst": "Reconnaissance",
     "UEBA: Multi-Source User Activity": "Lateral Movement",
+    "UEBA: Impossible Travel": "Initial Access",
     "UEBA: Rare Entity Observed": "Reconnaissance"
 }
 
 
+# Profiles are served from a write-behind cache; dirty entries are written
+# back in bulk by profile_cache.run_profile_flusher and on shutdown.
 async def _get_profile(ip: str) -> dict:
-    profile = await ueba_profiles_collection.find_one({"ip_address": ip})
-    if profile:
-        return profile
-    profile = {
-        "ip_address": ip,
-        "first_seen": None,
-        "last_seen": None,
-        "total_events": 0,
-        "failed_events": 0,
-        "invalid_events": 0,
-        "success_events": 0,
-        "avg_events_per_window": 0.0,
-        "avg_daily_events": 0.0,
-        "last_day": None,
-        "today_count": 0,
-        "current_session_start": None,
-        "current_session_events": 0,
-        "last_incident_at": None
-    }
-    await ueba_profiles_collection.insert_one(profile)
-    return profile
+    return await ip_profiles.get(ip)
 
 
 async def _get_user_profile(username: str) -> dict:
-    profile = await ueba_user_profiles_collection.find_one({"username": username})
-    if profile:
-        return profile
-    profile = {
-        "username": username,
-        "first_seen": None,
-        "last_seen": None,
-        "total_events": 0,
-        "avg_daily_events": 0.0,
-        "last_day": None,
-        "today_count": 0,
-        "last_incident_at": None
-    }
-    await ueba_user_profiles_collection.insert_one(profile)
-    return profile
+    return await user_profiles.get(username)
 
 
 async def _update_profile(ip: str, updates: dict):
-    await ueba_profiles_collection.update_one(
-        {"ip_address": ip},
-        {"$set": updates}
-    )
+    ip_profiles.update(ip, updates)
 
 
 async def _update_user_profile(username: str, updates: dict):
-    await ueba_user_profiles_collection.update_one(
-        {"username": username},
-        {"$set": updates}
-    )
+    user_profiles.update(username, updates)
 
 
+# Windows are read from the per-minute activity rollups, so they cover whole
+# minutes (the oldest one in full)
 async def _window_counts(ip: str, window_start: datetime) -> dict:
-    pipeline = [
-        {"$match": {
-            "ip_address": ip,
-            "event_time": {"$gte": window_start}
-        }},
-        {"$group": {
-            "_id": "$event_type",
-            "count": {"$sum": 1}
-        }}
-    ]
-    counts = {"total": 0, "failed": 0, "invalid": 0, "success": 0}
-    async for row in logs_collection.aggregate(pipeline):
-        counts["total"] += row["count"]
-        if row["_id"] == "ssh_failed_login":
-            counts["failed"] = row["count"]
-        elif row["_id"] == "ssh_invalid_user":
-            counts["invalid"] = row["count"]
-        elif row["_id"] == "ssh_success_login":
-            counts["success"] = row["count"]
-    return counts
+    totals = await activity_rollups.window_counts("ip", ip, window_start)
+    return {
+        "total": totals["total"],
+        "failed": totals.get("ssh_failed_login", 0),
+        "invalid": totals.get("ssh_invalid_user", 0),
+        "success": totals.get("ssh_success_login", 0),
+    }
 
 
 async def _user_multi_source(username: str, window_start: datetime) -> int:
+    # Distinct source networks (ASNs when GeoIP ASN data is loaded), so a user
+    # hopping between addresses of one NAT or VPN pool is a single source
     if not username:
         return 0
-    pipeline = [
-        {"$match": {
-            "username": username,
-            "event_time": {"$gte": window_start}
-        }},
-        {"$group": {
-            "_id": "$ip_address"
-        }}
-    ]
-    count = 0
-    async for _ in logs_collection.aggregate(pipeline):
-        count += 1
-    return count
+    peers = await activity_rollups.distinct_peers("user", username, window_start)
+    return len({geoip.network_key(peer) for peer in peers})
 
 
 async def _roll_session(profile: dict, now: datetime):
@@ -156,14 +108,15 @@ async def _roll_session(profile: dict, now: datetime):
     return {}
 
 
-async def record_event(event: dict) -> dict | None:
+async def record_event(event: dict) -> list[dict]:
     ip = event.get("ip_address")
     username = event.get("username")
     if not ip:
-        return None
+        return []
 
     now = event.get("event_time") or datetime.now(timezone.utc)
     profile = await _get_profile(ip)
+    first_event = profile["total_events"] == 0
 
     updates = {
         "first_seen": profile["first_seen"] or now,
@@ -202,28 +155,17 @@ async def record_event(event: dict) -> dict | None:
 
     await _update_profile(ip, updates)
 
-    # Update user profile
-    if username:
-        user = await _get_user_profile(username)
-        user_day = user.get("last_day")
-        user_today = user.get("today_count", 0)
-        user_avg = user.get("avg_daily_events", 0.0)
-        if user_day and user_day != day_key:
-            user_avg = (1 - EMA_ALPHA) * user_avg + EMA_ALPHA * user_today
-            user_today = 0
-        user_today += 1
-        await _update_user_profile(username, {
-            "first_seen": user["first_seen"] or now,
-            "last_seen": now,
-            "total_events": user["total_events"] + 1,
-            "last_day": day_key,
-            "today_count": user_today,
-            "avg_daily_events": user_avg
-        })
+    # In partitioned mode the node owning the username keeps its profile;
+    # other nodes reach it through cluster.replicate_user
+    alerts = []
+    if username and cluster.owns_user(username):
+        travel_alert = await record_user_event(username, now, ip, event_type)
+        if travel_alert:
+            alerts.append(travel_alert)
 
     # Rare entity detection (first time seen)
-    if profile["total_events"] == 0:
-        return {
+    if first_event:
+        alerts.append({
             "alert_type": "ueba_rare_entity",
             "incident": "UEBA: Rare Entity Observed",
             "confidence": "medium",
@@ -234,45 +176,200 @@ async def record_event(event: dict) -> dict | None:
             "kill_chain_stage": KILL_CHAIN["UEBA: Rare Entity Observed"],
             "description": f"New IP observed: {ip}",
             "timestamp": datetime.now(timezone.utc)
-        }
+        })
 
+    return alerts
+
+
+def _location(ip: str | None, now: datetime) -> dict | None:
+    geo = geoip.lookup(ip)
+    if not geo or "latitude" not in geo or "longitude" not in geo:
+        return None
+    # Our own VPN egress says nothing about where the user is
+    reputation = ip_reputation.lookup(ip)
+    if reputation and reputation["verdict"] == "allow":
+        return None
+    location = {"ip": ip, "at": now}
+    for field in ("latitude", "longitude", "accuracy_km", "country", "city", "asn"):
+        if field in geo:
+            location[field] = geo[field]
+    return location
+
+
+async def _impossible_travel(username: str, previous: dict, current: dict) -> dict | None:
+    if previous.get("ip") == current["ip"]:
+        return None
+    # Each location is only known to within its accuracy radius
+    distance = distance_km(previous, current)
+    slack = (previous.get("accuracy_km") or 0) + (current.get("accuracy_km") or 0)
+    distance = max(0.0, distance - slack)
+    if distance < IMPOSSIBLE_TRAVEL_MIN_KM:
+        return None
+    hours = max((current["at"] - previous["at"]).total_seconds(), 0.0) / 3600.0
+    speed = distance / hours if hours else float("inf")
+    if speed <= IMPOSSIBLE_TRAVEL_MAX_KMH:
+        return None
+
+    incident = "UEBA: Impossible Travel"
+    ip = current["ip"]
+    reputation = ip_reputation.lookup(ip)
+    risk = calculate_risk("Impossible Travel", 0, reputation)
+    origin = previous.get("city") or previous.get("country") or previous["ip"]
+    destination = current.get("city") or current.get("country") or ip
+    payload = {
+        "alert_type": "ueba_incident",
+        "incident": incident,
+        "confidence": "high" if hours < 1 else "medium",
+        "risk_score": risk,
+        "mitre": get_mitre("Impossible Travel") or {},
+        "ip_address": ip,
+        "username": username,
+        "severity": "high" if risk >= 8 else "medium",
+        "kill_chain_stage": KILL_CHAIN[incident],
+        "description": (
+            f"{incident} for {username}: {origin} -> {destination} "
+            f"({distance:.0f} km in {hours * 60:.0f} min)"
+        ),
+        "travel": {
+            "from": previous,
+            "to": current,
+            "distance_km": round(distance, 1),
+            "speed_kmh": None if speed == float("inf") else round(speed, 1),
+        },
+        "last_seen": current["at"],
+        "timestamp": datetime.now(timezone.utc)
+    }
+    if reputation:
+        payload["reputation"] = reputation
+    return await _upsert_incident(f"{incident}:{username}", payload)
+
+
+async def record_user_event(username: str, now: datetime, ip: str | None = None,
+                            event_type: str | None = None) -> dict | None:
+    day_key = now.date().isoformat()
+    user = await _get_user_profile(username)
+    user_day = user.get("last_day")
+    user_today = user.get("today_count", 0)
+    user_avg = user.get("avg_daily_events", 0.0)
+    if user_day and user_day != day_key:
+        user_avg = (1 - EMA_ALPHA) * user_avg + EMA_ALPHA * user_today
+        user_today = 0
+    user_today += 1
+    updates = {
+        "first_seen": user["first_seen"] or now,
+        "last_seen": now,
+        "total_events": user["total_events"] + 1,
+        "last_day": day_key,
+        "today_count": user_today,
+        "avg_daily_events": user_avg
+    }
+
+    # Impossible travel between successful logins only: failures from a far
+    # away IP are someone guessing, not the user moving
+    location = _location(ip, now) if event_type == "ssh_success_login" else None
+    previous = user.get("last_location")
+    if location and (not previous or previous["at"] <= now):
+        updates["last_location"] = location
+
+    # Written before anything else is awaited: events of one user arrive on
+    # every detection shard, and a write after the incident upsert would
+    # overwrite what the other shards recorded meanwhile
+    await _update_user_profile(username, updates)
+    if location and previous and previous["at"] <= now:
+        return await _impossible_travel(username, previous, location)
     return None
 
 
 def _decay_risk(prev_risk: float, minutes: float) -> float:
-    return max(1.0, prev_risk - (minutes / 10.0))
+    return max(1.0, prev_risk - (minutes / DECAY_MINUTES_PER_POINT))
+
+
+def decay_anchor(risk: float, last_seen: datetime) -> float:
+    # decayed(t) = risk - (t - last_seen) / 10min = anchor - t / 10min, so
+    # ordering by the stored anchor is ordering by decayed risk at any time
+    # (above the 1.0 floor) without recomputing every incident
+    if last_seen.tzinfo is None:
+        last_seen = last_seen.replace(tzinfo=timezone.utc)
+    return risk + last_seen.timestamp() / (60.0 * DECAY_MINUTES_PER_POINT)
+
+
+def decayed_risk(incident: dict, now: datetime) -> float | None:
+    if incident.get("decay_anchor") is not None:
+        if now.tzinfo is None:
+            now = now.replace(tzinfo=timezone.utc)
+        return round(max(1.0, incident["decay_anchor"] - now.timestamp() / (60.0 * DECAY_MINUTES_PER_POINT)), 2)
+    last_seen = incident.get("last_seen") or incident.get("timestamp")
+    if not last_seen:
+        return None
+    if last_seen.tzinfo is None:
+        last_seen = last_seen.replace(tzinfo=timezone.utc)
+    minutes = (now - last_seen).total_seconds() / 60.0
+    return round(_decay_risk(incident.get("risk_score", 5), minutes), 2)
 
 
 async def _upsert_incident(incident_key: str, payload: dict) -> dict | None:
-    existing = await ueba_incidents_collection.find_one({"incident_key": incident_key})
-    now = payload["timestamp"]
+    # Besides the incident itself this maintains the read-model fields used by
+    # /api/incidents: decay_anchor (ordering) and updated_at (ETag, delta polls).
+    # One atomic upsert, as several detection shards can raise the same
+    # incident at once. decayed(t) of max(decayed old risk, new risk) is
+    # max(old anchor, new anchor) - t / 10min, so $max on the anchor keeps the
+    # decay exact; risk_score holds the peak risk.
+    seen = payload["last_seen"]
+    risk = payload.get("risk_score", 5)
+    update = {
+        "$setOnInsert": {
+            k: v for k, v in payload.items() if k not in ("risk_score", "last_seen", "event_count")
+        },
+        "$max": {"risk_score": risk, "last_seen": seen, "decay_anchor": decay_anchor(risk, seen)},
+        "$set": {"updated_at": datetime.now(timezone.utc)},
+    }
+    if "event_count" in payload:
+        update["$max"]["event_count"] = payload["event_count"]
+    else:
+        update["$inc"] = {"event_count": 1}
+
+    existing = await ueba_incidents_collection.find_one_and_update(
+        {"incident_key": incident_key}, update, upsert=True, return_document=ReturnDocument.BEFORE
+    )
+    payload["incident_key"] = incident_key
     if not existing:
-        payload["incident_key"] = incident_key
-        await ueba_incidents_collection.insert_one(payload)
+        # Warm the intel cache so the incident details view does not wait on it
+        threat_intel.prefetch([payload.get("ip_address")])
         return payload
 
     last = existing.get("last_seen") or existing.get("timestamp")
-    minutes = (now - last).total_seconds() / 60.0
-    risk = _decay_risk(existing.get("risk_score", 5), minutes)
-    risk = max(risk, payload.get("risk_score", 5))
-
-    await ueba_incidents_collection.update_one(
-        {"incident_key": incident_key},
-        {"$set": {
-            "last_seen": now,
-            "risk_score": risk,
-            "event_count": payload.get("event_count", existing.get("event_count", 0)) + 1
-        }}
-    )
-
-    if minutes < COOLDOWN_MINUTES:
+    if (seen - last).total_seconds() / 60.0 < COOLDOWN_MINUTES:
         return None
 
-    payload["risk_score"] = risk
-    payload["incident_key"] = incident_key
+    payload["risk_score"] = max(decayed_risk(existing, seen), risk)
     return payload
 
 
+async def backfill_incident_read_model(batch_size: int = 1000) -> int:
+    # Incidents written before the read-model fields existed
+    cursor = ueba_incidents_collection.find(
+        {"decay_anchor": {"$exists": False}},
+        {"risk_score": 1, "last_seen": 1, "timestamp": 1}
+    )
+    updates = []
+    written = 0
+    now = datetime.now(timezone.utc)
+    async for incident in cursor:
+        last_seen = incident.get("last_seen") or incident.get("timestamp") or now
+        updates.append(UpdateOne({"_id": incident["_id"]}, {"$set": {
+            "decay_anchor": decay_anchor(incident.get("risk_score", 5), last_seen),
+            "updated_at": now
+        }}))
+        if len(updates) >= batch_size:
+            await ueba_incidents_collection.bulk_write(updates, ordered=False)
+            written += len(updates)
+            updates = []
+    if updates:
+        await ueba_incidents_collection.bulk_write(updates, ordered=False)
+        written += len(updates)
+    return written
+
+
 async def evaluate(event: dict) -> dict | None:
     ip = event.get("ip_address")
     username = event.get("username")
@@ -321,7 +418,7 @@ async def evaluate(event: dict) -> dict | None:
         base_incident = "Brute Force Attack"
         confidence = "medium"
 
-    risk = calculate_risk(base_incident, max(counts["total"], counts["failed"]))
+    risk = calculate_risk(base_incident, max(counts["total"], counts["failed"]), event.get("reputation"))
     mitre = get_mitre(base_incident) or {}
     severity = "high" if risk >= 8 else "medium"
 
@@ -351,6 +448,8 @@ async def evaluate(event: dict) -> dict | None:
         "last_seen": now,
         "timestamp": datetime.now(timezone.utc)
     }
+    if event.get("reputation"):
+        payload["reputation"] = event["reputation"]
 
     incident_key = f"{incident}:{ip}"
     return await _upsert_incident(incident_key, payload)
@@ -1,18 +1,130 @@
-from fastapi import WebSocket, WebSocketDisconnect
+import asyncio
+import json
+import time
+
+from fastapi import WebSocket
+
+from app.core.config import WS_OVERFLOW_POLICY, WS_QUEUE_SIZE
+
+# drop_oldest: discard the oldest queued frame to make room
+# drop_newest: discard the frame being broadcast
+# disconnect:  close the slow client
+OVERFLOW_POLICIES = {"drop_oldest", "drop_newest", "disconnect"}
+
+
+class _Client:
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: asyncio.Task | None = None
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def stats(self) -> dict:
+        client = self.websocket.client
+        return {
+            "client": f"{client.host}:{client.port}" if client else None,
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "last_lag_ms": round(self.last_lag_ms, 3),
+            "max_lag_ms": round(self.max_lag_ms, 3),
+            "connected_for_s": round(time.time() - self.connected_at, 1),
+        }
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+    def __init__(self, queue_size: int = 256, overflow_policy: str = "drop_oldest"):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown websocket overflow policy: {overflow_policy}")
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.clients: dict[WebSocket, _Client] = {}
+        self.broadcasts = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+        # Close tasks for slow clients, kept so they are not garbage-collected
+        self._closing: set[asyncio.Task] = set()
+
+    @property
+    def active_connections(self) -> list[WebSocket]:
+        return list(self.clients)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = _Client(websocket, self.queue_size)
+        client.sender = asyncio.create_task(self._sender(client))
+        self.clients[websocket] = client
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client and client.sender and client.sender is not asyncio.current_task():
+            client.sender.cancel()
+
+    async def _sender(self, client: _Client):
+        try:
+            while True:
+                enqueued_at, text = await client.queue.get()
+                await client.websocket.send_text(text)
+                lag = (time.perf_counter() - enqueued_at) * 1000.0
+                client.sent += 1
+                client.last_lag_ms = lag
+                client.max_lag_ms = max(client.max_lag_ms, lag)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Dead or closed socket: stop sending to it
+            self.disconnect(client.websocket)
+
+    async def _close_slow(self, client: _Client):
+        try:
+            await client.websocket.close(code=1013)
+        except Exception:
+            pass
 
     async def broadcast(self, message: dict):
-        for conn in self.active_connections:
-            await conn.send_json(message)
+        # Serialize once, then hand the frame to each client's queue. Never
+        # waits on socket I/O, so a slow browser cannot stall ingest.
+        if not self.clients:
+            return
+        text = json.dumps(message, default=str)
+        item = (time.perf_counter(), text)
+        self.broadcasts += 1
+
+        for client in list(self.clients.values()):
+            try:
+                client.queue.put_nowait(item)
+                continue
+            except asyncio.QueueFull:
+                pass
+
+            client.dropped += 1
+            self.dropped += 1
+            if self.overflow_policy == "drop_oldest":
+                client.queue.get_nowait()
+                client.queue.put_nowait(item)
+            elif self.overflow_policy == "disconnect":
+                # Unregister now so later broadcasts skip it; only the close
+                # handshake is left to the task
+                self.disconnect(client.websocket)
+                self.slow_disconnects += 1
+                task = asyncio.create_task(self._close_slow(client))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.clients),
+            "queue_size": self.queue_size,
+            "overflow_policy": self.overflow_policy,
+            "broadcasts": self.broadcasts,
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "per_client": [client.stats() for client in self.clients.values()],
+        }
+
 
-manager = ConnectionManager()
+manager = ConnectionManager(WS_QUEUE_SIZE, WS_OVERFLOW_POLICY)
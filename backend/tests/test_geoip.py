@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import ueba
+from app.services.geoip import GeoIp, distance_km
+from app.services.ip_reputation import IpReputation
+from tools.make_geoip_db import SAMPLE, build
+
+NOW = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def geo(tmp_path):
+    build(SAMPLE, tmp_path / "City.mmdb", tmp_path / "ASN.mmdb")
+    return GeoIp(str(tmp_path / "City.mmdb"), str(tmp_path / "ASN.mmdb"))
+
+
+@pytest.fixture
+def travel(geo, tmp_path, monkeypatch):
+    # _impossible_travel up to the incident write, which returns the alert
+    async def upsert(incident_key, payload):
+        return {**payload, "incident_key": incident_key}
+
+    allow = tmp_path / "reputation" / "allow"
+    allow.mkdir(parents=True)
+    (allow / "corp_vpn.txt").write_text("203.0.113.0/24\n")
+    monkeypatch.setattr(ueba, "geoip", geo)
+    monkeypatch.setattr(ueba, "ip_reputation", IpReputation(str(tmp_path / "reputation"), 30))
+    monkeypatch.setattr(ueba, "_upsert_incident", upsert)
+
+    def check(previous: dict, current: dict):
+        return asyncio.run(ueba._impossible_travel("alice", previous, current))
+    return check
+
+
+def _at(location: dict, minutes: float) -> dict:
+    return {**location, "at": NOW + timedelta(minutes=minutes)}
+
+
+def test_lookup(geo):
+    assert geo.lookup("198.51.100.5") == {
+        "country": "DE", "city": "Frankfurt", "latitude": 50.11, "longitude": 8.68,
+        "accuracy_km": 20, "asn": 64500, "as_org": "Example Transit",
+    }
+    assert geo.lookup("198.51.100.200")["city"] == "Berlin"
+    assert geo.lookup("2001:db8::1")["city"] == "Tokyo"
+    assert geo.lookup("10.0.0.1") is None
+    assert geo.lookup("not-an-ip") is None
+    assert geo.lookup(None) is None
+
+
+def test_lookup_caches_misses(geo):
+    geo.lookup("10.0.0.1")
+    geo.lookup("10.0.0.1")
+    assert (geo.hits, geo.misses) == (1, 1)
+
+
+def test_lookup_without_asn_database(tmp_path):
+    build(SAMPLE, tmp_path / "City.mmdb", None)
+    geo = GeoIp(str(tmp_path / "City.mmdb"), str(tmp_path / "ASN.mmdb"))
+    assert geo.lookup("192.0.2.10")["city"] == "New York"
+    assert "asn" not in geo.lookup("192.0.2.10")
+    assert geo.network_key("192.0.2.10") == "192.0.2.10"
+
+
+def test_network_key(geo):
+    # Frankfurt and Berlin ranges belong to one ASN
+    assert geo.network_key("198.51.100.5") == "AS64500"
+    assert geo.network_key("198.51.100.200") == "AS64500"
+    assert geo.network_key("203.0.113.5") == "AS64511"
+    assert geo.network_key("10.0.0.1") == "10.0.0.1"
+
+
+def test_distance_km(geo):
+    frankfurt, berlin = geo.lookup("198.51.100.5"), geo.lookup("198.51.100.200")
+    assert distance_km(frankfurt, berlin) == pytest.approx(424, abs=2)
+    assert distance_km(frankfurt, berlin) == pytest.approx(distance_km(berlin, frankfurt))
+    assert distance_km(frankfurt, frankfurt) == 0
+    # One degree of latitude
+    assert distance_km({"latitude": 0, "longitude": 0}, {"latitude": 1, "longitude": 0}) == pytest.approx(111.19, abs=0.01)
+
+
+def test_impossible_travel(travel, geo):
+    new_york = _at({"ip": "192.0.2.10", **geo.lookup("192.0.2.10")}, 0)
+    frankfurt = _at({"ip": "198.51.100.5", **geo.lookup("198.51.100.5")}, 30)
+    alert = travel(new_york, frankfurt)
+    assert alert["incident_key"] == "UEBA: Impossible Travel:alice"
+    assert alert["ip_address"] == "198.51.100.5"
+    # Distance less both accuracy radii
+    assert alert["travel"]["distance_km"] == pytest.approx(distance_km(new_york, frankfurt) - 40, abs=0.1)
+
+
+def test_impossible_travel_slow_or_short(travel, geo):
+    new_york = _at({"ip": "192.0.2.10", **geo.lookup("192.0.2.10")}, 0)
+    # Under IMPOSSIBLE_TRAVEL_MAX_KMH
+    assert travel(new_york, _at({"ip": "198.51.100.5", **geo.lookup("198.51.100.5")}, 20 * 60)) is None
+    # Under IMPOSSIBLE_TRAVEL_MIN_KM, however fast
+    frankfurt = _at({"ip": "198.51.100.5", **geo.lookup("198.51.100.5")}, 0)
+    assert travel(frankfurt, _at({"ip": "198.51.100.200", **geo.lookup("198.51.100.200")}, 1)) is None
+
+
+def test_impossible_travel_accuracy_slack(travel):
+    # 556 km apart: reported with 20 km radii, not once the radii cover 60 km
+    near = {"ip": "192.0.2.1", "latitude": 0.0, "longitude": 0.0}
+    far = {"ip": "192.0.2.2", "latitude": 5.0, "longitude": 0.0}
+    assert travel(_at({**near, "accuracy_km": 20}, 0), _at({**far, "accuracy_km": 20}, 10)) is not None
+    assert travel(_at({**near, "accuracy_km": 30}, 0), _at({**far, "accuracy_km": 30}, 10)) is None
+
+
+def test_impossible_travel_same_ip(travel):
+    # One address resolving to far apart points (e.g. a database update)
+    assert travel(
+        _at({"ip": "192.0.2.1", "latitude": 0.0, "longitude": 0.0}, 0),
+        _at({"ip": "192.0.2.1", "latitude": 40.0, "longitude": 0.0}, 1),
+    ) is None
+
+
+def test_allowlisted_vpn_has_no_location(travel):
+    # The corp VPN egress (Sydney range on the allowlist) never moves a user
+    assert ueba._location("203.0.113.5", NOW) is None
+    location = ueba._location("192.0.2.10", NOW)
+    assert location["city"] == "New York"
+    assert location["at"] == NOW
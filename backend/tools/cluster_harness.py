@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+from load_generator import DEFAULT_MIX, LineSource, parse_metrics, parse_mix
+
+from app.services.correlation import WINDOW_SECONDS
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Runs the same corpus through one backend process and through N partitioned
+# nodes on this machine, then compares what detection produced. Both runs use
+# a fresh database on the same MongoDB.
+
+# Anomaly scores read per-user windows, which reach other nodes through the
+# asynchronous fan-out, so a few scores can land on the other side of the
+# threshold. Those differences are reported but do not fail the run.
+APPROXIMATE_TYPES = {"anomaly_detected"}
+
+
+class Node:
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.url = f"http://127.0.0.1:{port}"
+        self.port = port
+        self.process: subprocess.Popen | None = None
+        self.frames: dict[str, set] = {"new_alert": set(), "alert_update": set()}
+        self.listener: asyncio.Task | None = None
+
+
+def start_nodes(args, ports: list[int], database: str, log_dir: Path) -> list[Node]:
+    nodes = [Node(index, port) for index, port in enumerate(ports)]
+    token = secrets.token_hex(16)
+    for node in nodes:
+        env = {
+            **os.environ,
+            "MONGO_URL": args.mongo_url,
+            "MONGO_DB": database,
+            "CLUSTER_NODES": ",".join(n.url for n in nodes) if len(nodes) > 1 else "",
+            "CLUSTER_NODE_ID": str(node.index),
+            "CLUSTER_TOKEN": token,
+            # All nodes share this machine; a slow peer should not look lost
+            "CLUSTER_TIMEOUT_SECONDS": "30",
+            # No background model changes during the comparison
+            "ML_TRAIN_INTERVAL_HOURS": "0",
+            "ML_MODEL_POLL_SECONDS": "86400",
+            "SYSLOG_ENABLED": "0",
+        }
+        log = open(log_dir / f"{database}-node{node.index}.log", "w")
+        node.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", args.app, "--host", "127.0.0.1", "--port", str(node.port),
+             "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    return nodes
+
+
+def stop_nodes(nodes: list[Node]):
+    for node in nodes:
+        if node.process and node.process.poll() is None:
+            node.process.terminate()
+    for node in nodes:
+        if node.process:
+            try:
+                node.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                node.process.kill()
+
+
+async def wait_ready(client: httpx.AsyncClient, nodes: list[Node], timeout: float = 60.0):
+    deadline = time.perf_counter() + timeout
+    for node in nodes:
+        while True:
+            if node.process.poll() is not None:
+                raise RuntimeError(f"node {node.index} exited with {node.process.returncode}")
+            try:
+                if (await client.get(f"{node.url}/")).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"node {node.index} did not start")
+            await asyncio.sleep(0.25)
+
+
+async def listen(node: Node):
+    async with websockets.connect(f"ws://127.0.0.1:{node.port}/ws/alerts") as socket:
+        async for frame in socket:
+            message = json.loads(frame)
+            if message.get("type") in node.frames:
+                node.frames[message["type"]].add(message["data"]["_id"])
+
+
+async def metrics_totals(client: httpx.AsyncClient, nodes: list[Node]) -> tuple[float, float]:
+    depth = processed = 0.0
+    for node in nodes:
+        samples = parse_metrics((await client.get(f"{node.url}/metrics")).text)
+        for (name, labels), value in samples.items():
+            if name in ("sentinel_pipeline_queue_depth", "sentinel_cluster_fanout_pending"):
+                depth += value
+            elif name == "sentinel_events_total" and ("outcome", "processed") in labels:
+                processed += value
+    return depth, processed
+
+
+async def wait_drained(client: httpx.AsyncClient, nodes: list[Node], timeout: float):
+    deadline = time.perf_counter() + timeout
+    previous = None
+    while time.perf_counter() < deadline:
+        depth, processed = await metrics_totals(client, nodes)
+        if depth == 0 and processed == previous:
+            return processed
+        previous = processed
+        await asyncio.sleep(0.5)
+    raise RuntimeError("detection did not drain in time")
+
+
+async def ndjson(client: httpx.AsyncClient, url: str, params: dict) -> list[dict]:
+    response = await client.get(url, params=params)
+    response.raise_for_status()
+    return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+
+async def collect(client: httpx.AsyncClient, nodes: list[Node]) -> dict:
+    # Read through every node and de-duplicate, so nothing depends on which
+    # node a document was written from
+    alerts, incidents = {}, {}
+    for node in nodes:
+        for alert in await ndjson(client, f"{node.url}/api/alerts", {
+            "format": "ndjson", "fields": "alert_type,ip_address,incident,aggregation_key,count",
+        }):
+            alerts[alert["_id"]] = alert
+        for report in await ndjson(client, f"{node.url}/api/incidents/export", {"format": "ndjson"}):
+            incidents[report["incident"]["_id"]] = report["incident"]
+    return {"alerts": list(alerts.values()), "incidents": list(incidents.values())}
+
+
+async def run_mode(args, lines: list[list[str]], ports: list[int], database: str, log_dir: Path) -> dict:
+    nodes = start_nodes(args, ports, database, log_dir)
+    try:
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            await wait_ready(client, nodes)
+            if websockets is not None:
+                for node in nodes:
+                    node.listener = asyncio.create_task(listen(node))
+                await asyncio.sleep(0.5)
+
+            started = time.perf_counter()
+            queued = 0
+            for index, batch in enumerate(lines):
+                # Round-robin, as a load balancer in front of the nodes would;
+                # syslog stamps are refreshed so both runs see "recent" events
+                stamp = datetime.now().strftime("%b %d %H:%M:%S")
+                node = nodes[index % len(nodes)]
+                response = await client.post(f"{node.url}/api/ingest/batch",
+                                             json={"raw_logs": [stamp + line[15:] for line in batch]})
+                response.raise_for_status()
+                queued += response.json()["queued_for_detection"]
+            processed = await wait_drained(client, nodes, args.drain_timeout)
+            elapsed = time.perf_counter() - started
+            await asyncio.sleep(1.0)
+
+            result = await collect(client, nodes)
+            result.update({"nodes": len(nodes), "queued": queued, "processed": processed, "seconds": elapsed})
+            result["frames"] = [{kind: set(ids) for kind, ids in node.frames.items()} for node in nodes]
+            for node in nodes:
+                if node.listener:
+                    node.listener.cancel()
+            return result
+    finally:
+        stop_nodes(nodes)
+
+
+def aggregates(result: dict) -> dict[str, dict[str, int]]:
+    by_type: dict[str, dict[str, int]] = {}
+    for alert in result["alerts"]:
+        keys = by_type.setdefault(alert.get("alert_type", "?"), {})
+        key = alert.get("aggregation_key") or f"{alert.get('incident')}|{alert.get('ip_address')}"
+        keys[key] = keys.get(key, 0) + int(alert.get("count", 1))
+    return by_type
+
+
+def compare(single: dict, partitioned: dict) -> bool:
+    ok = True
+    print(f"events queued/processed: single {single['queued']}/{int(single['processed'])}, "
+          f"cluster {partitioned['queued']}/{int(partitioned['processed'])}")
+    if single["queued"] != partitioned["queued"] or single["processed"] != partitioned["processed"]:
+        ok = False
+
+    single_types, cluster_types = aggregates(single), aggregates(partitioned)
+    for alert_type in sorted(set(single_types) | set(cluster_types)):
+        a, b = single_types.get(alert_type, {}), cluster_types.get(alert_type, {})
+        missing = sorted(set(a) - set(b))
+        extra = sorted(set(b) - set(a))
+        counts = sorted(key for key in set(a) & set(b) if a[key] != b[key])
+        same = not (missing or extra or counts)
+        if alert_type in APPROXIMATE_TYPES:
+            status = "match" if same else "~"
+        else:
+            ok = ok and same
+            status = "match" if same else "DIFF"
+        print(f"  {alert_type:<20} {status:<5} aggregates={len(a)}/{len(b)} "
+              f"raised={sum(a.values())}/{sum(b.values())}")
+        for label, keys in (("only single", missing), ("only cluster", extra), ("count differs", counts)):
+            if keys:
+                print(f"      {label}: {keys[:5]}{' ...' if len(keys) > 5 else ''}")
+
+    single_incidents = {i["incident_key"] for i in single["incidents"]}
+    cluster_incidents = {i["incident_key"] for i in partitioned["incidents"]}
+    same = single_incidents == cluster_incidents
+    ok = ok and same
+    print(f"  {'ueba incidents':<20} {'match' if same else 'DIFF':<5} {len(single_incidents)}/{len(cluster_incidents)}")
+
+    if websockets is not None:
+        alert_ids = {alert["_id"] for alert in partitioned["alerts"]}
+        for index, frames in enumerate(partitioned["frames"]):
+            seen = frames["new_alert"] & alert_ids
+            complete = seen == alert_ids
+            ok = ok and complete
+            print(f"  websocket node {index}: {len(seen)}/{len(alert_ids)} new_alert frames, "
+                  f"{len(frames['alert_update'])} alerts updated")
+    else:
+        print("  websocket fan-out not checked (pip install websockets)")
+    return ok
+
+
+async def main_async(args):
+    source = LineSource(args.mix, args.seed)
+    lines = [source.take(args.batch) for _ in range(args.lines // args.batch)]
+    log_dir = Path(args.log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+    ports = [args.base_port + index for index in range(args.nodes + 1)]
+
+    print(f"[harness] {len(lines) * args.batch} lines, single process then {args.nodes} nodes")
+    single = await run_mode(args, lines, ports[:1], f"sentinel_harness_{run_id}_single", log_dir)
+    print(f"[harness] single: {single['seconds']:.1f}s")
+    partitioned = await run_mode(args, lines, ports[1:], f"sentinel_harness_{run_id}_cluster", log_dir)
+    print(f"[harness] cluster: {partitioned['seconds']:.1f}s")
+
+    ok = compare(single, partitioned)
+    if max(single["seconds"], partitioned["seconds"]) > WINDOW_SECONDS:
+        # Correlation windows follow the wall clock, so once a run outlasts
+        # one window its repeat counts depend on processing speed
+        print(f"[harness] a run took longer than the {WINDOW_SECONDS}s correlation window; "
+              "use fewer --lines for an exact comparison")
+    if not args.keep_db:
+        drop_databases(args.mongo_url, [f"sentinel_harness_{run_id}_single", f"sentinel_harness_{run_id}_cluster"])
+    print("[harness] detection results match" if ok else "[harness] detection results differ")
+    return ok
+
+
+def drop_databases(mongo_url: str, names: list[str]):
+    from pymongo import MongoClient
+
+    try:
+        client = MongoClient(mongo_url, serverSelectionTimeoutMS=3000)
+        for name in names:
+            client.drop_database(name)
+    except Exception as exc:
+        print(f"[harness] could not drop harness databases: {exc}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare partitioned multi-node detection with single-process mode")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--lines", type=int, default=10_000)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--base-port", type=int, default=8100)
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://127.0.0.1:27017"))
+    parser.add_argument("--app", default="app.main:app", help="ASGI app each node runs")
+    parser.add_argument("--drain-timeout", type=float, default=120.0)
+    parser.add_argument("--log-dir", default="harness-logs")
+    parser.add_argument("--keep-db", action="store_true")
+    args = parser.parse_args()
+    if args.nodes < 2:
+        parser.error("--nodes must be at least 2")
+
+    sys.exit(0 if asyncio.run(main_async(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+READ_CHUNK = 1024 * 1024
+FINGERPRINT_BYTES = 4096
+DEFAULT_CHECKPOINT = ".sentinel_import_checkpoint.json"
+
+
+# Checkpoints ---------------------------------------------------------------
+
+def file_id(stat: os.stat_result) -> str:
+    # Survives renames: logrotate moving auth.log to auth.log.1 keeps the
+    # device and inode, so its checkpoint follows it
+    return f"{stat.st_dev}:{stat.st_ino}"
+
+
+def fingerprint(path: str, handle=None, size: int = FINGERPRINT_BYTES) -> str | None:
+    # Survives copies: logrotate compressing auth.log.1 into auth.log.2.gz
+    # (or copytruncate) creates a new inode with the same content. Hash of
+    # the first FINGERPRINT_BYTES uncompressed bytes, prefixed with how many
+    # there were. An open plain file is read in place, since after rotation
+    # its path names a different file.
+    if handle is not None and not isinstance(handle, gzip.GzipFile):
+        head = os.pread(handle.fileno(), size, 0)
+    else:
+        with _open(path) as source:
+            head = source.read(size)
+    return f"{len(head)}:{hashlib.sha256(head).hexdigest()}" if head else None
+
+
+class Checkpoints:
+    # {"<dev>:<inode>": {"path": str, "offset": int, "fingerprint": str,
+    # "done": bool}} where offset is in uncompressed bytes and always sits on
+    # a line boundary, and done marks a file read to its end
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.data = {}
+        # Checkpoints written by older versions, keyed by path: matched by inode
+        self.legacy: dict[int, dict] = {}
+        if self.path.exists():
+            for key, entry in json.loads(self.path.read_text()).items():
+                if "inode" in entry:
+                    self.legacy[int(entry["inode"])] = entry
+                else:
+                    self.data[key] = entry
+        self.by_fingerprint = {entry["fingerprint"]: entry for entry in self.data.values() if entry.get("fingerprint")}
+
+    def find(self, identity: str, path: str) -> dict | None:
+        entry = self.data.get(identity) or self.legacy.get(int(identity.rsplit(":", 1)[1]))
+        key = entry.get("fingerprint") if entry else None
+        if key and fingerprint(path, size=int(key.split(":", 1)[0])) != key:
+            # The inode of a deleted log, reused by a new file
+            entry = None
+        if entry is None:
+            key = fingerprint(path)
+            entry = self.by_fingerprint.get(key) if key else None
+            if entry is not None:
+                print(f"[import] {path}: same content as {entry['path']}")
+        return entry
+
+    def save(self, identity: str, path: str, offset: int, handle=None, done: bool = False):
+        self.legacy.pop(int(identity.rsplit(":", 1)[1]), None)
+        key = (self.data.get(identity) or {}).get("fingerprint")
+        covered = int(key.split(":", 1)[0]) if key else 0
+        # Re-hashed only while the file is shorter than FINGERPRINT_BYTES, or
+        # after a truncation
+        if covered < FINGERPRINT_BYTES or offset < covered:
+            key = fingerprint(path, handle)
+        entry = {
+            "path": os.path.abspath(path),
+            "offset": offset,
+            "fingerprint": key,
+            "done": done,
+            "updated_at": time.time(),
+        }
+        self.data[identity] = entry
+        if key:
+            self.by_fingerprint[key] = entry
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.data, indent=2))
+        os.replace(tmp, self.path)
+
+
+# Reading -------------------------------------------------------------------
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_lines(handle, offset: int, final: bool = True):
+    # Yields (line, offset_after_line) for every complete line. A trailing
+    # line without a newline is yielded too when final, otherwise (follow
+    # mode) it is left for the next read
+    buffer = b""
+    while True:
+        chunk = handle.read(READ_CHUNK)
+        if not chunk:
+            break
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for raw in lines:
+            offset += len(raw) + 1
+            yield raw.decode("utf-8", errors="replace").rstrip("\r"), offset
+    if buffer and final:
+        offset += len(buffer)
+        yield buffer.decode("utf-8", errors="replace").rstrip("\r"), offset
+    elif buffer:
+        # Rewind so the partial line is re-read once it is complete
+        handle.seek(-len(buffer), os.SEEK_CUR)
+
+
+def batched(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rotation_order(paths: list[str]) -> list[str]:
+    # auth.log.3.gz, auth.log.2.gz, auth.log.1, auth.log: oldest first
+    def age(path: str) -> int:
+        match = re.search(r"\.(\d+)(?:\.gz)?$", path)
+        return int(match.group(1)) if match else 0
+    return sorted(paths, key=age, reverse=True)
+
+
+# Sinks ---------------------------------------------------------------------
+
+class MongoSink:
+    # Direct bulk insert; history imports skip live detection
+    def __init__(self, timezone: str | None = None):
+        from app.services.ingestion import store_lines
+        from app.services.parser import source_timezone
+        self.store_lines = store_lines
+        self.tz = source_timezone(timezone) if timezone else None
+
+    async def send(self, lines: list[str]) -> int:
+        return await self.store_lines(lines, self.tz)
+
+    async def close(self):
+        pass
+
+
+class ApiSink:
+    # Posts batches to a running backend so detection sees the events
+    def __init__(self, base_url: str, timezone: str | None = None):
+        import httpx
+        self.url = base_url.rstrip("/") + "/api/ingest/batch"
+        self.params = {"tz": timezone} if timezone else None
+        self.client = httpx.AsyncClient(timeout=60)
+
+    async def send(self, lines: list[str]) -> int:
+        delay = 0.5
+        while True:
+            resp = await self.client.post(
+                self.url,
+                params=self.params,
+                content="\n".join(lines).encode(),
+                headers={"Content-Type": "text/plain"}
+            )
+            if resp.status_code == 503:
+                await asyncio.sleep(float(resp.headers.get("Retry-After", delay)))
+                delay = min(delay * 2, 10)
+                continue
+            resp.raise_for_status()
+            return resp.json()["stored"]
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# Import / follow -------------------------------------------------------------
+
+class Progress:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.lines = 0
+        self.stored = 0
+        self.last_report = self.started
+
+    def add(self, lines: int, stored: int):
+        self.lines += lines
+        self.stored += stored
+        now = time.perf_counter()
+        if now - self.last_report >= 5:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(
+            f"[import] lines={self.lines} stored={self.stored} "
+            f"rate={self.lines / elapsed * 60:,.0f} lines/min"
+        )
+
+
+async def _drain(handle, path: str, identity: str, offset: int, sink, checkpoints, progress, batch_size: int,
+                 final: bool = True) -> int:
+    for batch in batched(read_lines(handle, offset, final), batch_size):
+        lines = [line for line, _ in batch if line]
+        stored = await sink.send(lines) if lines else 0
+        offset = batch[-1][1]
+        checkpoints.save(identity, path, offset, handle)
+        progress.add(len(batch), stored)
+    if final:
+        checkpoints.save(identity, path, offset, handle, done=True)
+    return offset
+
+
+async def import_file(path: str, sink, checkpoints: Checkpoints, progress: Progress, batch_size: int):
+    identity = file_id(os.stat(path))
+    entry = checkpoints.find(identity, path)
+    offset = int(entry.get("offset", 0)) if entry else 0
+    if entry and entry.get("done") and path.endswith(".gz"):
+        # Compressed files never grow; skip decompressing up to the offset
+        checkpoints.save(identity, path, offset, done=True)
+        print(f"[import] {path}: already imported")
+        return
+    with _open(path) as handle:
+        if offset:
+            # gzip seeks forward by decompressing; plain files seek directly
+            handle.seek(offset)
+            print(f"[import] {path}: resuming at byte {offset}")
+        await _drain(handle, path, identity, offset, sink, checkpoints, progress, batch_size)
+
+
+async def follow_file(path: str, sink, checkpoints: Checkpoints, progress: Progress,
+                      batch_size: int, interval: float):
+    handle = None
+    identity = None
+    offset = 0
+    while True:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+
+        if handle is None and stat is not None:
+            identity = file_id(stat)
+            entry = checkpoints.find(identity, path)
+            offset = int(entry.get("offset", 0)) if entry else 0
+            handle = _open(path)
+            handle.seek(offset)
+
+        if handle is not None:
+            # Once rotated away the old file gets no more writes, so its last
+            # unterminated line is final
+            rotated = stat is None or file_id(stat) != identity
+            offset = await _drain(handle, path, identity, offset, sink, checkpoints, progress, batch_size,
+                                  final=rotated)
+
+            truncated = stat is not None and not rotated and stat.st_size < offset
+            if rotated or truncated:
+                # The old handle was drained above; continue with the new file
+                print(f"[import] {path}: {'rotated' if rotated else 'truncated'}, reopening")
+                handle.close()
+                handle = None
+                if truncated:
+                    checkpoints.save(identity, path, 0)
+                continue
+
+        await asyncio.sleep(interval)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Stream auth.log / secure files into SentinelAI")
+    parser.add_argument("paths", nargs="+", help="log files (plain or .gz); rotated sets are read oldest first")
+    parser.add_argument("--follow", action="store_true", help="tail the last file and handle rotation")
+    parser.add_argument("--api", help="send batches to a running backend (e.g. http://127.0.0.1:8000) "
+                                      "instead of writing to MongoDB directly")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--interval", type=float, default=1.0, help="follow-mode poll interval in seconds")
+    parser.add_argument("--timezone", help="time zone the files' syslog timestamps were written in, e.g. "
+                                           "Europe/Berlin (default: the backend's LOG_TIMEZONE)")
+    args = parser.parse_args()
+
+    try:
+        sink = ApiSink(args.api, args.timezone) if args.api else MongoSink(args.timezone)
+    except ValueError as exc:
+        parser.error(str(exc))
+    checkpoints = Checkpoints(args.checkpoint)
+    progress = Progress()
+    paths = rotation_order(args.paths)
+
+    try:
+        for path in paths[:-1] if args.follow else paths:
+            await import_file(path, sink, checkpoints, progress, args.batch_size)
+        if args.follow:
+            await follow_file(paths[-1], sink, checkpoints, progress, args.batch_size, args.interval)
+    finally:
+        progress.report()
+        await sink.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,456 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+USERS = ["root", "admin", "alice", "bob", "oracle", "ubuntu", "deploy", "git", "postgres", "test"]
+HOSTS = ["web01", "web02", "db01", "bastion"]
+
+
+def _stamp() -> str:
+    return datetime.now().strftime("%b %d %H:%M:%S")
+
+
+def _public_ip(rng: random.Random) -> str:
+    while True:
+        first = rng.randint(11, 223)
+        if first not in (127, 169, 172, 192):
+            return f"{first}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+
+def _sshd(rng: random.Random, text: str) -> str:
+    return f"{_stamp()} {rng.choice(HOSTS)} sshd[{rng.randint(1000, 65000)}]: {text}"
+
+
+# Scenarios ----------------------------------------------------------------
+# Each scenario is an endless generator of raw lines. Attack scenarios keep
+# per-attacker state (one IP or one user for a run of lines) so the
+# correlator and UEBA windows see realistic bursts.
+
+def background_noise(rng: random.Random):
+    office = [f"10.0.{rng.randint(0, 3)}.{rng.randint(2, 250)}" for _ in range(40)]
+    while True:
+        ip = rng.choice(office)
+        user = rng.choice(USERS[2:])
+        roll = rng.random()
+        if roll < 0.45:
+            yield _sshd(rng, f"Accepted publickey for {user} from {ip} port {rng.randint(1024, 65535)} ssh2")
+        elif roll < 0.6:
+            yield _sshd(rng, f"Failed password for {user} from {ip} port {rng.randint(1024, 65535)} ssh2")
+        elif roll < 0.8:
+            yield (f"{_stamp()} {rng.choice(HOSTS)} sudo:   {user} : TTY=pts/0 ; PWD=/home/{user} ; "
+                   f"USER=root ; COMMAND=/usr/bin/systemctl restart nginx")
+        else:
+            yield (f"{_stamp()} {rng.choice(HOSTS)} CRON[{rng.randint(1000, 65000)}]: "
+                   f"pam_unix(cron:session): session opened for user root(uid=0) by (uid=0)")
+
+
+def brute_force(rng: random.Random):
+    while True:
+        ip = _public_ip(rng)
+        user = rng.choice(USERS[:3])
+        for _ in range(rng.randint(20, 80)):
+            yield _sshd(rng, f"Failed password for {user} from {ip} port {rng.randint(1024, 65535)} ssh2")
+        if rng.random() < 0.1:
+            yield _sshd(rng, f"Accepted password for {user} from {ip} port {rng.randint(1024, 65535)} ssh2")
+
+
+def enumeration(rng: random.Random):
+    while True:
+        ip = _public_ip(rng)
+        for _ in range(rng.randint(10, 40)):
+            user = f"{rng.choice(USERS)}{rng.randint(0, 999)}"
+            yield _sshd(rng, f"Invalid user {user} from {ip} port {rng.randint(1024, 65535)}")
+
+
+def multi_source(rng: random.Random):
+    # One account attacked from many addresses (password spraying / botnet)
+    while True:
+        user = rng.choice(USERS)
+        sources = [_public_ip(rng) for _ in range(rng.randint(5, 20))]
+        for _ in range(rng.randint(20, 60)):
+            ip = rng.choice(sources)
+            yield _sshd(rng, f"Failed password for {user} from {ip} port {rng.randint(1024, 65535)} ssh2")
+        yield _sshd(rng, f"Accepted password for {user} from {rng.choice(sources)} port {rng.randint(1024, 65535)} ssh2")
+
+
+SCENARIOS = {
+    "noise": background_noise,
+    "bruteforce": brute_force,
+    "enumeration": enumeration,
+    "multisource": multi_source,
+}
+
+DEFAULT_MIX = "noise=70,bruteforce=15,enumeration=10,multisource=5"
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LineSource:
+    def __init__(self, mix: dict[str, float], seed: int):
+        self.rng = random.Random(seed)
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.streams = {name: SCENARIOS[name](random.Random(f"{seed}:{name}")) for name in self.names}
+        self.sent = {name: 0 for name in self.names}
+
+    def take(self, count: int) -> list[str]:
+        name = self.rng.choices(self.names, self.weights)[0]
+        self.sent[name] += count
+        stream = self.streams[name]
+        return [next(stream) for _ in range(count)]
+
+
+# Metrics scraping -----------------------------------------------------------
+
+METRIC_LINE = re.compile(r'^(?P<name>[a-z_]+)(?:\{(?P<labels>[^}]*)\})? (?P<value>\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_metrics(text: str) -> dict:
+    samples = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            labels = tuple(sorted(LABEL.findall(match.group("labels") or "")))
+            samples[(match.group("name"), labels)] = float(match.group("value"))
+    return samples
+
+
+def _sum(samples: dict, name: str, **labels) -> float:
+    wanted = set(labels.items())
+    return sum(value for (metric, metric_labels), value in samples.items()
+               if metric == name and wanted <= set(metric_labels))
+
+
+def _by_label(samples: dict, name: str, label: str) -> dict[str, float]:
+    values = {}
+    for (metric, metric_labels), value in samples.items():
+        if metric == name:
+            key = dict(metric_labels).get(label)
+            values[key] = values.get(key, 0.0) + value
+    return values
+
+
+def histogram_quantile(before: dict, after: dict, stage: str, q: float) -> float | None:
+    # Quantile of the observations made between two scrapes (linear
+    # interpolation inside the bucket, as Prometheus does)
+    buckets = []
+    for (metric, labels), value in after.items():
+        label_map = dict(labels)
+        if metric == "sentinel_stage_seconds_bucket" and label_map.get("stage") == stage:
+            bound = float("inf") if label_map["le"] == "+Inf" else float(label_map["le"])
+            buckets.append((bound, value - before.get((metric, labels), 0.0)))
+    buckets.sort()
+    if not buckets or buckets[-1][1] <= 0:
+        return None
+    rank = q * buckets[-1][1]
+    lower, previous = 0.0, 0.0
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            if bound == float("inf"):
+                return lower
+            span = cumulative - previous
+            return lower + (bound - lower) * ((rank - previous) / span if span else 1.0)
+        lower, previous = bound, cumulative
+    return lower
+
+
+# Load loop ------------------------------------------------------------------
+
+class Results:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.statuses: dict[str, int] = {}
+        self.lines_accepted = 0
+        self.requests = 0
+        self.skipped = 0
+        self.max_send_lag = 0.0
+
+    def record(self, status: str, latency: float, lines: int):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latencies.append(latency)
+        if status == "200":
+            self.lines_accepted += lines
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_load(client: httpx.AsyncClient, source: LineSource, rate: float, duration: float,
+                   batch: int, poisson: bool, max_inflight: int, seed: int) -> Results:
+    # Open loop: request i is due at its scheduled time whether or not earlier
+    # requests have finished, and latency is measured from that scheduled
+    # time, so a slow server shows up as latency instead of a lower send rate.
+    results = Results()
+    rng = random.Random(seed)
+    inflight: set[asyncio.Task] = set()
+    path = "/api/ingest/batch" if batch > 1 else "/api/ingest"
+
+    async def send(lines: list[str], due: float):
+        payload = {"raw_logs": lines} if batch > 1 else {"raw_log": lines[0]}
+        try:
+            response = await client.post(path, json=payload)
+            status = str(response.status_code)
+        except httpx.HTTPError as exc:
+            status = type(exc).__name__
+        results.record(status, time.perf_counter() - due, len(lines))
+
+    started = time.perf_counter()
+    due = started
+    while due < started + duration:
+        lag = time.perf_counter() - due
+        if lag < 0:
+            await asyncio.sleep(-lag)
+        else:
+            results.max_send_lag = max(results.max_send_lag, lag)
+
+        results.requests += 1
+        if len(inflight) >= max_inflight:
+            # The client itself cannot keep up; counted instead of silently
+            # turning the run into a closed loop
+            results.skipped += 1
+        else:
+            task = asyncio.create_task(send(source.take(batch), due))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        due += rng.expovariate(rate) if poisson else 1.0 / rate
+
+    if inflight:
+        await asyncio.gather(*inflight)
+    results.elapsed = time.perf_counter() - started
+    return results
+
+
+async def scrape(client: httpx.AsyncClient) -> dict:
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return {}
+    return parse_metrics(response.text)
+
+
+async def wait_for_drain(client: httpx.AsyncClient, timeout: float) -> tuple[dict, float]:
+    # Detection is asynchronous: wait until the shards are empty and the
+    # processed counter has stopped moving
+    started = time.perf_counter()
+    previous = None
+    while True:
+        samples = await scrape(client)
+        done = _sum(samples, "sentinel_events_total", outcome="processed") + \
+            _sum(samples, "sentinel_events_total", outcome="failed")
+        depth = _sum(samples, "sentinel_pipeline_queue_depth")
+        if not samples or (depth == 0 and done == previous) or time.perf_counter() - started > timeout:
+            return samples, time.perf_counter() - started
+        previous = done
+        await asyncio.sleep(0.25)
+
+
+# Targets --------------------------------------------------------------------
+
+def use_local_mongo():
+    # Swap the Motor collections for an in-memory mongomock-motor database
+    # before any app module binds them
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("--in-process needs mongomock-motor (pip install mongomock-motor)")
+    import mongomock.collection
+
+    # pymongo >= 4.11 passes sort= for UpdateOne in bulk_write; mongomock
+    # predates it, and the profile flusher never sets it
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    mongomock.collection.BulkOperationBuilder.add_update = add_update_without_sort
+
+    import app.core.database as database
+
+    database.client = AsyncMongoMockClient(tz_aware=True)
+    database.db = database.client["sentinelai"]
+    for name, value in list(vars(database).items()):
+        if name.endswith("_collection"):
+            setattr(database, name, database.db[value.name])
+
+
+class InProcessTarget:
+    def __init__(self):
+        os.environ.setdefault("SYSLOG_ENABLED", "0")
+        use_local_mongo()
+        from app.main import app
+        from app.services.pipeline import detection_pipeline
+        from app.services.profile_cache import flush_profiles
+
+        self.app = app
+        self.pipeline = detection_pipeline
+        self.flush_profiles = flush_profiles
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        # Only what the ingest path needs: no syslog sockets, no training run
+        self.pipeline.start()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://load")
+        return self.client
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        await self.pipeline.stop()
+        await self.flush_profiles()
+
+
+class RemoteTarget:
+    def __init__(self, url: str, max_inflight: int):
+        self.url = url
+        self.limits = httpx.Limits(max_connections=max_inflight, max_keepalive_connections=max_inflight)
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        self.client = httpx.AsyncClient(base_url=self.url, limits=self.limits, timeout=30.0)
+        return self.client
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+
+# Report ---------------------------------------------------------------------
+
+def build_report(args, source: LineSource, results: Results, before: dict, after: dict, drain_seconds: float) -> dict:
+    def ms(value):
+        return None if value is None else round(1000.0 * value, 2)
+
+    alerts_before = _by_label(before, "sentinel_alerts_total", "alert_type")
+    alerts_after = _by_label(after, "sentinel_alerts_total", "alert_type")
+    alerts = {name: int(value - alerts_before.get(name, 0.0)) for name, value in alerts_after.items()}
+    suppressed = _sum(after, "sentinel_alerts_suppressed_total") - _sum(before, "sentinel_alerts_suppressed_total")
+    processed = _sum(after, "sentinel_events_total", outcome="processed") - \
+        _sum(before, "sentinel_events_total", outcome="processed")
+
+    return {
+        "target": "in-process" if args.in_process else args.url,
+        "rate": args.rate,
+        "batch": args.batch,
+        "duration_s": round(results.elapsed, 2),
+        "scenarios": source.sent,
+        "requests": results.requests,
+        "skipped_client_saturated": results.skipped,
+        "max_send_lag_ms": ms(results.max_send_lag),
+        "statuses": results.statuses,
+        "lines_accepted": results.lines_accepted,
+        "throughput_lines_per_s": round(results.lines_accepted / results.elapsed, 1) if results.elapsed else 0.0,
+        "ingest_latency_ms": {
+            "p50": ms(percentile(results.latencies, 0.50)),
+            "p95": ms(percentile(results.latencies, 0.95)),
+            "p99": ms(percentile(results.latencies, 0.99)),
+            "max": ms(max(results.latencies, default=None)),
+        },
+        "detection": {
+            "events_processed": int(processed),
+            "drain_s": round(drain_seconds, 2),
+            "enqueue_to_done_p50_ms": ms(histogram_quantile(before, after, "enqueue_to_done", 0.50)),
+            "enqueue_to_done_p99_ms": ms(histogram_quantile(before, after, "enqueue_to_done", 0.99)),
+        },
+        "alerts": alerts,
+        "alerts_total": sum(alerts.values()),
+        "alerts_suppressed": int(suppressed),
+    }
+
+
+def print_report(report: dict, baseline: dict | None):
+    def row(label: str, value, base=None):
+        change = ""
+        if isinstance(value, (int, float)) and isinstance(base, (int, float)) and base:
+            change = f"  ({100.0 * (value - base) / base:+.1f}% vs baseline)"
+        print(f"  {label:<28} {value}{change}")
+
+    base = baseline or {}
+    latency = report["ingest_latency_ms"]
+    base_latency = base.get("ingest_latency_ms", {})
+    print(f"target={report['target']} rate={report['rate']}/s batch={report['batch']} duration={report['duration_s']}s")
+    row("requests", report["requests"])
+    row("statuses", report["statuses"])
+    row("skipped (client saturated)", report["skipped_client_saturated"])
+    row("max send lag ms", report["max_send_lag_ms"])
+    row("throughput lines/s", report["throughput_lines_per_s"], base.get("throughput_lines_per_s"))
+    for key in ("p50", "p95", "p99", "max"):
+        row(f"ingest latency {key} ms", latency[key], base_latency.get(key))
+    row("events processed", report["detection"]["events_processed"])
+    row("detection p50 ms", report["detection"]["enqueue_to_done_p50_ms"],
+        base.get("detection", {}).get("enqueue_to_done_p50_ms"))
+    row("detection p99 ms", report["detection"]["enqueue_to_done_p99_ms"],
+        base.get("detection", {}).get("enqueue_to_done_p99_ms"))
+    row("alerts", report["alerts_total"], base.get("alerts_total"))
+    row("alerts folded into aggregates", report["alerts_suppressed"], base.get("alerts_suppressed"))
+    for name, count in sorted(report["alerts"].items()):
+        row(f"  {name}", count)
+
+
+async def main_async(args):
+    source = LineSource(args.mix, args.seed)
+    target = InProcessTarget() if args.in_process else RemoteTarget(args.url, args.max_inflight)
+
+    async with target as client:
+        before = await scrape(client)
+        if not before:
+            print("[load] /metrics not reachable: alert and detection figures will be empty")
+        results = await run_load(client, source, args.rate, args.duration, args.batch,
+                                 args.poisson, args.max_inflight, args.seed)
+        after, drain_seconds = await wait_for_drain(client, args.drain_timeout)
+
+    report = build_report(args, source, results, before, after, drain_seconds)
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    print_report(report, baseline)
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(report, indent=2))
+        print(f"[load] report written to {args.json_out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop ingest load generator")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="backend to load (ignored with --in-process)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="load the app in this process against an in-memory Mongo (mongomock-motor)")
+    parser.add_argument("--rate", type=float, default=200.0, help="requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--batch", type=int, default=1, help="lines per request (>1 uses /api/ingest/batch)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times instead of a fixed interval")
+    parser.add_argument("--max-inflight", type=int, default=1000)
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json-out", help="write the report as JSON")
+    parser.add_argument("--baseline", help="earlier --json-out report to compare against")
+    args = parser.parse_args()
+    if args.rate <= 0 or args.batch < 1:
+        parser.error("--rate must be positive and --batch at least 1")
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import csv
+import struct
+import time
+from ipaddress import ip_network
+from pathlib import Path
+
+# Writes small MaxMind-format databases (City and ASN layouts, as read by
+# app/services/geoip.py) from a CSV, for tests and demos without GeoLite2:
+#
+#   network,country,city,latitude,longitude,accuracy_radius,asn,as_org
+#   198.51.100.0/24,DE,Frankfurt,50.11,8.68,20,64500,Example Transit
+#
+# Only the subset of the MMDB format the reader needs is produced: an IPv6
+# search tree (IPv4 networks live under ::/96) with 32-bit records, and
+# maps, strings, doubles and unsigned integers in the data section.
+
+METADATA_MARKER = b"\xab\xcd\xefMaxMind.com"
+RECORD_SIZE = 32
+
+# (network, country, city, latitude, longitude, accuracy_radius, asn, as_org)
+SAMPLE = [
+    ("192.0.2.0/24", "US", "New York", 40.71, -74.01, 20, 64496, "Example Eyeball ISP"),
+    ("198.51.100.0/25", "DE", "Frankfurt", 50.11, 8.68, 20, 64500, "Example Transit"),
+    ("198.51.100.128/25", "DE", "Berlin", 52.52, 13.40, 20, 64500, "Example Transit"),
+    ("203.0.113.0/24", "AU", "Sydney", -33.87, 151.21, 50, 64511, "Example Mobile"),
+    ("100.64.0.0/10", "US", "Boston", 42.36, -71.06, 100, 64496, "Example Eyeball ISP"),
+    ("2001:db8::/32", "JP", "Tokyo", 35.68, 139.69, 100, 64510, "Example Cloud"),
+]
+
+
+def _control(type_id: int, size: int) -> bytes:
+    extended = type_id > 7
+    first = (0 if extended else type_id) << 5
+    if size < 29:
+        head, tail = bytes([first | size]), b""
+    elif size < 29 + 256:
+        head, tail = bytes([first | 29]), bytes([size - 29])
+    elif size < 285 + 65536:
+        head, tail = bytes([first | 30]), (size - 285).to_bytes(2, "big")
+    else:
+        head, tail = bytes([first | 31]), (size - 65821).to_bytes(3, "big")
+    return head + (bytes([type_id - 7]) if extended else b"") + tail
+
+
+class Uint:
+    # Unsigned integer of a fixed MMDB type; libmaxminddb checks the types of
+    # the metadata fields, not just their values
+    def __init__(self, value: int, type_id: int):
+        self.value = value
+        self.type_id = type_id
+
+
+def encode(value) -> bytes:
+    if isinstance(value, Uint):
+        data = value.value.to_bytes((value.value.bit_length() + 7) // 8, "big")
+        return _control(value.type_id, len(data)) + data
+    if isinstance(value, dict):
+        return _control(7, len(value)) + b"".join(encode(str(k)) + encode(v) for k, v in value.items())
+    if isinstance(value, list):
+        return _control(11, len(value)) + b"".join(encode(v) for v in value)
+    if isinstance(value, str):
+        data = value.encode("utf-8")
+        return _control(2, len(data)) + data
+    if isinstance(value, float):
+        return _control(3, 8) + struct.pack(">d", value)
+    if isinstance(value, int) and value >= 0:
+        return encode(Uint(value, 5 if value < 1 << 16 else 6 if value < 1 << 32 else 9))
+    raise TypeError(f"cannot encode {value!r}")
+
+
+class Writer:
+    def __init__(self, database_type: str):
+        self.database_type = database_type
+        # node index -> [left, right]; a record is None (empty), a node index
+        # (int) or ("data", offset)
+        self.nodes = [[None, None]]
+        self.data = bytearray()
+        self.offsets: dict[bytes, int] = {}
+
+    def _store(self, record: dict) -> tuple:
+        encoded = encode(record)
+        offset = self.offsets.get(encoded)
+        if offset is None:
+            offset = self.offsets[encoded] = len(self.data)
+            self.data += encoded
+        return ("data", offset)
+
+    def insert(self, network: str, record: dict):
+        net = ip_network(network, strict=False)
+        # As a 128-bit value an IPv4 address already sits under ::/96
+        bits = int(net.network_address)
+        prefix = net.prefixlen + (96 if net.version == 4 else 0)
+        value = self._store(record)
+        node = 0
+        for depth in range(prefix):
+            bit = (bits >> (127 - depth)) & 1
+            if depth == prefix - 1:
+                self.nodes[node][bit] = value
+                return
+            child = self.nodes[node][bit]
+            if not isinstance(child, int):
+                # Split an empty or data record; both halves keep its value
+                self.nodes.append([child, child])
+                child = self.nodes[node][bit] = len(self.nodes) - 1
+            node = child
+
+    def _record(self, record) -> int:
+        node_count = len(self.nodes)
+        if record is None:
+            return node_count
+        if isinstance(record, int):
+            return record
+        return node_count + 16 + record[1]
+
+    def write(self, path: Path):
+        tree = b"".join(struct.pack(">II", self._record(left), self._record(right)) for left, right in self.nodes)
+        metadata = {
+            "binary_format_major_version": Uint(2, 5),
+            "binary_format_minor_version": Uint(0, 5),
+            "build_epoch": Uint(int(time.time()), 9),
+            "database_type": self.database_type,
+            "description": {"en": f"{self.database_type} test database"},
+            "ip_version": Uint(6, 5),
+            "languages": ["en"],
+            "node_count": Uint(len(self.nodes), 6),
+            "record_size": Uint(RECORD_SIZE, 5),
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(tree + bytes(16) + bytes(self.data) + METADATA_MARKER + encode(metadata))
+
+
+def read_rows(path: str) -> list[tuple]:
+    rows = []
+    with open(path, newline="") as handle:
+        for row in csv.DictReader(handle):
+            rows.append((
+                row["network"], row.get("country") or None, row.get("city") or None,
+                float(row["latitude"]) if row.get("latitude") else None,
+                float(row["longitude"]) if row.get("longitude") else None,
+                int(row["accuracy_radius"]) if row.get("accuracy_radius") else None,
+                int(row["asn"]) if row.get("asn") else None, row.get("as_org") or None,
+            ))
+    return rows
+
+
+def build(rows: list[tuple], city_path: Path | None, asn_path: Path | None):
+    city = Writer("GeoLite2-City")
+    asn = Writer("GeoLite2-ASN")
+    # Shorter prefixes first so more specific networks override them
+    for network, country, city_name, lat, lon, radius, number, org in sorted(
+            rows, key=lambda row: ip_network(row[0], strict=False).prefixlen):
+        record = {}
+        if country:
+            record["country"] = {"iso_code": country}
+        if city_name:
+            record["city"] = {"names": {"en": city_name}}
+        if lat is not None and lon is not None:
+            record["location"] = {"latitude": lat, "longitude": lon}
+            if radius is not None:
+                record["location"]["accuracy_radius"] = radius
+        if record:
+            city.insert(network, record)
+        if number is not None:
+            asn.insert(network, {"autonomous_system_number": number, **({"autonomous_system_organization": org} if org else {})})
+    if city_path:
+        city.write(city_path)
+    if asn_path:
+        asn.write(asn_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write small GeoIP City / ASN .mmdb files for testing")
+    parser.add_argument("csv", nargs="?", help="network,country,city,latitude,longitude,accuracy_radius,asn,as_org "
+                                               "(default: a built-in sample of documentation ranges)")
+    parser.add_argument("--city", default="geoip/GeoLite2-City.mmdb", help="City database to write ('' skips it)")
+    parser.add_argument("--asn", default="geoip/GeoLite2-ASN.mmdb", help="ASN database to write ('' skips it)")
+    args = parser.parse_args()
+
+    rows = read_rows(args.csv) if args.csv else SAMPLE
+    build(rows, Path(args.city) if args.city else None, Path(args.asn) if args.asn else None)
+    print(f"wrote {len(rows)} networks to {args.city or '-'} and {args.asn or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.parser import parse_auth_log
+
+# The original three-regex parse_auth_log, verbatim, as the baseline
+LEGACY_PATTERNS = [
+    (re.compile(r"Failed password for (?P<user>\w+) from (?P<ip>\d+\.\d+\.\d+\.\d+)"), "ssh_failed_login"),
+    (re.compile(r"Invalid user (?P<user>\w+) from (?P<ip>\d+\.\d+\.\d+\.\d+)"), "ssh_invalid_user"),
+    (re.compile(r"Accepted password for (?P<user>\w+) from (?P<ip>\d+\.\d+\.\d+\.\d+)"), "ssh_success_login"),
+]
+
+
+def legacy_parse(line: str):
+    for regex, event_type in LEGACY_PATTERNS:
+        match = regex.search(line)
+        if match:
+            return {
+                "event_time": datetime.now(timezone.utc),
+                "source": "linux_auth",
+                "event_type": event_type,
+                "username": match.group("user"),
+                "ip_address": match.group("ip"),
+                "message": line.strip()
+            }
+    return None
+
+
+USERS = ["root", "admin", "alice", "bob", "oracle", "ubuntu", "deploy"]
+
+TEMPLATES = [
+    (30, "{ts} web01 sshd[{pid}]: Failed password for {user} from {ip} port {port} ssh2"),
+    (10, "{ts} web01 sshd[{pid}]: Failed password for invalid user {user} from {ip} port {port} ssh2"),
+    (10, "{ts} web01 sshd[{pid}]: Invalid user {user} from {ip} port {port}"),
+    (5, "{ts} web01 sshd[{pid}]: Accepted publickey for {user} from {ip} port {port} ssh2"),
+    (5, "{ts} web01 sshd[{pid}]: Accepted password for {user} from {ip} port {port} ssh2"),
+    (10, "{ts} web01 sshd[{pid}]: pam_unix(sshd:auth): authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost={ip}  user={user}"),
+    (5, "{ts} web01 sudo:   {user} : TTY=pts/0 ; PWD=/home/{user} ; USER=root ; COMMAND=/usr/bin/systemctl restart nginx"),
+    (5, "{ts} web01 CRON[{pid}]: pam_unix(cron:session): session opened for user root(uid=0) by (uid=0)"),
+    (10, "{ts} web01 sshd[{pid}]: Connection closed by authenticating user {user} {ip} port {port} [preauth]"),
+    (5, "{ts} web01 systemd[1]: Started Session {pid} of User {user}."),
+    (5, "{ts} web01 kernel: [UFW BLOCK] IN=eth0 OUT= SRC={ip} DST=10.0.0.1 PROTO=TCP DPT=23"),
+]
+
+
+def build_corpus(size: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in TEMPLATES]
+    templates = [template for _, template in TEMPLATES]
+    lines = []
+    for index in range(size):
+        template = rng.choices(templates, weights)[0]
+        second = index // 50
+        lines.append(template.format(
+            ts=f"Oct 18 {10 + second // 3600 % 10:02d}:{second // 60 % 60:02d}:{second % 60:02d}",
+            pid=rng.randint(1000, 65000),
+            user=rng.choice(USERS),
+            ip=f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            port=rng.randint(1024, 65535),
+        ))
+    return lines
+
+
+def compare(lines: list[str], rounds: int):
+    # Rounds alternate between the parsers so drift on a busy machine hits
+    # both alike; the best round of each is reported
+    parsers = {"legacy": legacy_parse, "registry": parse_auth_log}
+    best = dict.fromkeys(parsers, float("inf"))
+    recognized = {}
+    for _ in range(rounds):
+        for name, parse in parsers.items():
+            started = time.perf_counter()
+            recognized[name] = sum(1 for line in lines if parse(line) is not None)
+            best[name] = min(best[name], time.perf_counter() - started)
+
+    for name in parsers:
+        print(
+            f"{name:<9} {len(lines) / best[name]:>10,.0f} lines/s  {recognized[name] / best[name]:>10,.0f} events/s  "
+            f"recognized={recognized[name]}/{len(lines)}"
+        )
+    events = (recognized["registry"] / best["registry"]) / (recognized["legacy"] / best["legacy"])
+    print(f"registry / legacy: {best['legacy'] / best['registry']:.2f}x lines/s, {events:.2f}x events/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parser throughput benchmark")
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = build_corpus(args.lines)
+    print(f"corpus: {len(lines)} mixed auth/syslog lines")
+    compare(lines, args.rounds)
+
+    # Only the lines the legacy parser recognizes: the same events from both
+    ssh = [line for line in lines if legacy_parse(line) is not None]
+    print(f"\nssh subset: {len(ssh)} lines")
+    compare(ssh, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -40,6 +40,10 @@ function AlertsPage() {
       const msg = JSON.parse(event.data);
       if (msg.type === "new_alert") {
         setAlerts((prev) => [msg.data, ...prev]);
+      } else if (msg.type === "alert_update") {
+        setAlerts((prev) =>
+          prev.map((a) => (a._id === msg.data._id ? { ...a, ...msg.data } : a))
+        );
       }
     };
 
@@ -135,6 +139,7 @@ function AlertsPage() {
         <thead>
           <tr style={{ background: "#1e293b" }}>
             <th style={th}>Time</th>
+            <th style={th}>Count</th>
             <th style={th}>Type</th>
             <th style={th}>IP</th>
             <th style={th}>Severity</th>
@@ -150,6 +155,9 @@ function AlertsPage() {
           {alerts.map((a) => (
             <tr key={a._id} style={{ borderBottom: "1px solid #334155" }}>
               <td style={td}>{getTime(a)}</td>
+              <td style={td} title={a.last_seen ? `last seen ${new Date(a.last_seen).toLocaleString("en-US", { timeZone, hour12: true })}` : undefined}>
+                {a.count ?? 1}
+              </td>
               <td style={td}>
                 <span style={badgeStyle(a.alert_type)}>{getType(a)}</span>
               </td>
@@ -52,7 +52,16 @@ function IncidentDetailPage() {
             Enrichment: IP={details.enrichment?.ip ?? "-"}, private=
             {String(details.enrichment?.is_private ?? "-")}, reserved=
             {String(details.enrichment?.is_reserved ?? "-")}, global=
-            {String(details.enrichment?.is_global ?? "-")}
+            {String(details.enrichment?.is_global ?? "-")}, reputation=
+            {details.enrichment?.reputation
+              ? `${details.enrichment.reputation.verdict} (${details.enrichment.reputation.lists.join(", ")})`
+              : "-"}, location=
+            {details.enrichment?.geo
+              ? [details.enrichment.geo.city, details.enrichment.geo.country].filter(Boolean).join(", ") || "-"
+              : "-"}, ASN=
+            {details.enrichment?.geo?.asn
+              ? `AS${details.enrichment.geo.asn} ${details.enrichment.geo.as_org ?? ""}`.trim()
+              : "-"}
           </div>
           <div style={{ marginBottom: "12px" }}>
             Threat Intel: {details.threat_intel?.status || "unknown"}